@@ -18,8 +18,20 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
-    # Initialize extensions
-    db.init_app(app)
+    # orjson-backed jsonify()/get_json() (falls back to the stdlib encoder)
+    from json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
+
+    # Behind a reverse proxy, take the client address/scheme from its headers
+    # (rate-limit keys depend on it); TRUSTED_PROXIES is the number of hops
+    trusted_proxies = app.config.get("TRUSTED_PROXIES", 0)
+    if trusted_proxies:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies)
+
+    # Initialize extensions (pool sizing and statement timeouts: database.py)
+    from database import init_database
+    init_database(app, db)
     migrate.init_app(app, db)
     
     # CORS configuration - allow configurable frontend origins
@@ -27,9 +39,30 @@ def create_app(config_class=Config):
     frontend_origins = app.config.get('FRONTEND_ORIGINS', '*')
     cors.init_app(app, resources={r"/api/*": {"origins": frontend_origins}})
     
-    # Rate limiter configuration
+    # Request preprocessing - load authenticated user (registered before the
+    # limiter's own hook so limits can be keyed on the user)
+    @app.before_request
+    def load_current_user():
+        """Load authenticated user claims from session into g.current_user.
+
+        The ORM row is only queried when a handler needs more than the
+        user's id or admin status.
+        """
+        from flask import g
+        from session_claims import load_session_user
+        g.current_user = load_session_user()
+
+    # Rate limiter configuration: per-user keys and endpoint costs (ratelimit.py)
     limiter.init_app(app)
 
+    # Pub/sub broker for real-time message streams
+    from realtime import init_realtime
+    init_realtime(app)
+
+    # Full-text search indexes for db.create_all()
+    from search import init_search
+    init_search(app)
+
     # Import all model classes AFTER db.init_app
     from models import (
         Role, User, Community, CommunityMembership, 
@@ -37,23 +70,42 @@ def create_app(config_class=Config):
     )
 
     # Register blueprints
-    from routes import auth, users, posts, communities, messages
+    from routes import auth, users, posts, communities, messages, search, notifications, media
     app.register_blueprint(auth.bp, url_prefix='/api/auth')
     app.register_blueprint(users.bp, url_prefix='/api/users')
     app.register_blueprint(posts.bp, url_prefix='/api/posts')
     app.register_blueprint(communities.bp, url_prefix='/api/communities')
     app.register_blueprint(messages.bp, url_prefix='/api/messages')
-
-    # Request preprocessing - load authenticated user
-    @app.before_request
-    def load_current_user():
-        """Load authenticated user from session into g.current_user."""
-        from flask import session, g
-        user_id = session.get("user_id")
-        if user_id is not None:
-            g.current_user = User.query.get(user_id)
-        else:
-            g.current_user = None
+    app.register_blueprint(search.bp, url_prefix='/api/search')
+    app.register_blueprint(notifications.bp, url_prefix='/api/notifications')
+    app.register_blueprint(media.bp, url_prefix='/api/media')
+
+    # Tag-invalidated response cache for hot read endpoints
+    from cache import init_cache
+    init_cache(app)
+
+    # Accept-Encoding negotiated gzip/brotli/zstd for JSON bodies
+    from compression import init_compression
+    init_compression(app)
+
+    # Write-behind buffer for hot counters (off unless COUNTER_BUFFER_INTERVAL > 0)
+    from counters import init_counter_buffer, reconcile_counters_command
+    init_counter_buffer(app)
+
+    # Transactional outbox: background jobs run by in-process threads or `outbox-worker`
+    from outbox import init_outbox, outbox_status_command, outbox_worker_command
+    init_outbox(app)
+
+    # Maintenance CLI commands
+    from engagement import refresh_engagement_command
+    from trending import refresh_trending_command
+    from uploads import gc_uploads_command
+    app.cli.add_command(reconcile_counters_command)
+    app.cli.add_command(refresh_engagement_command)
+    app.cli.add_command(refresh_trending_command)
+    app.cli.add_command(gc_uploads_command)
+    app.cli.add_command(outbox_worker_command)
+    app.cli.add_command(outbox_status_command)
 
     # Structured error handlers for consistent API responses
     @app.errorhandler(400)
@@ -68,10 +120,29 @@ def create_app(config_class=Config):
     def forbidden(error):
         return jsonify({"error": "Forbidden", "message": "Access denied"}), 403
 
+    @app.errorhandler(413)
+    def payload_too_large(error):
+        return jsonify({"error": "Payload too large", "message": str(error.description)}), 413
+
+    @app.errorhandler(429)
+    def too_many_requests(error):
+        return jsonify({"error": "Too many requests", "message": str(error.description)}), 429
+
     @app.errorhandler(404)
     def not_found(error):
         return jsonify({"error": "Not found", "message": "Resource not found"}), 404
 
+    from sqlalchemy.exc import DBAPIError
+    from database import is_statement_timeout
+
+    @app.errorhandler(DBAPIError)
+    def database_error(error):
+        if is_statement_timeout(error):
+            resp = jsonify({"error": "Service unavailable", "message": "The query took too long, retry shortly"})
+            resp.headers["Retry-After"] = "1"
+            return resp, 503
+        raise error
+
     @app.errorhandler(500)
     def internal_error(error):
         return jsonify({"error": "Internal server error", "message": "An unexpected error occurred"}), 500
@@ -93,6 +164,8 @@ logger = logging.getLogger(__name__)
 
 
 if __name__ == "__main__":
+    # Flask's development server; in production run
+    #   gunicorn -c gunicorn.conf.py wsgi:app
     app = create_app()
     host = os.getenv("FLASK_HOST", "0.0.0.0")
     port = int(os.getenv("FLASK_PORT", 5000))
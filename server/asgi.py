@@ -0,0 +1,209 @@
+"""
+ASGI entry point for AgriLink backend.
+
+Serves `GET /api/messages/stream` natively on the event loop, so an idle
+stream costs a coroutine instead of a worker thread, and hands every other
+request to the Flask WSGI app. A stream request first goes through the
+Flask app itself as a pre-check (see `routes/messages.stream`), so rate
+limits, CORS headers, session handling and the route's own checks apply
+to it as to any other request; only once that answers 204 does the
+stream start here, carrying the pre-check's response headers.
+
+Usage (from Agrilink/server), with any ASGI server, e.g. uvicorn:
+  uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+Run more than one worker only with REALTIME_BACKEND=postgres, otherwise
+events published in one process never reach streams held by another.
+"""
+
+import asyncio
+import io
+import sys
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import create_app
+from extensions import db
+from realtime import (
+    KEEPALIVE, RESYNC, STREAM_PRECHECK, format_event, get_broker, missed_messages, stream_channels,
+)
+
+STREAM_PATH = "/api/messages/stream"
+# Pre-check response headers not carried over to the stream
+_BODY_HEADERS = {"content-type", "content-length"}
+
+def _environ(scope) -> dict:
+    """A WSGI environ (PEP 3333) for an ASGI HTTP scope, with an empty body."""
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    host, port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode().decode("latin-1"),
+        "PATH_INFO": path.encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": host,
+        "SERVER_PORT": str(port or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(b""),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"] = scope["client"][0]
+        environ["REMOTE_PORT"] = str(scope["client"][1])
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        key = name if name in ("CONTENT_TYPE", "CONTENT_LENGTH") else f"HTTP_{name}"
+        value = raw_value.decode("latin-1")
+        if key in environ:
+            value = environ[key] + ("; " if key == "HTTP_COOKIE" else ",") + value
+        environ[key] = value
+    return environ
+
+
+def _precheck(app, environ):
+    """Run the stream request through the Flask app in pre-check mode (in a
+    worker thread), so rate limits, CORS, sessions and the route's own
+    checks apply as for any other request.
+
+    Returns `(status, headers, body, params)`; `params` holds the user and
+    channels to stream when the route accepted the request, else None.
+    """
+    params = environ[STREAM_PRECHECK] = {}
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = headers
+
+    result = app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    accepted = started["status"] == 204 and "user_id" in params
+    return started["status"], started["headers"], body, params if accepted else None
+
+
+def _load_backlog(app, user_id, community_ids, last_event_id):
+    with app.app_context():
+        try:
+            return missed_messages(user_id, community_ids, last_event_id)
+        finally:
+            db.session.remove()
+
+
+def _encode_headers(headers) -> list:
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+
+async def stream_messages(app, scope, receive, send):
+    status, headers, body, params = await asyncio.to_thread(_precheck, app, _environ(scope))
+    if params is None:
+        await send({"type": "http.response.start", "status": status, "headers": _encode_headers(headers)})
+        await send({"type": "http.response.body", "body": body})
+        return
+    user_id, community_ids, last_event_id = params["user_id"], params["community_ids"], params["last_event_id"]
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue(maxsize=1000)
+    overflowed = asyncio.Event()
+
+    def put(event):
+        try:
+            events.put_nowait(event)
+        except asyncio.QueueFull:
+            overflowed.set()
+
+    sub = get_broker(app).subscribe(
+        stream_channels(user_id, community_ids),
+        deliver=lambda event: loop.call_soon_threadsafe(put, event),
+    )
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+                return
+
+    watcher = asyncio.create_task(watch_disconnect())
+    heartbeat = app.config.get("REALTIME_HEARTBEAT", 15)
+
+    async def emit(chunk):
+        await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+
+    try:
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+            *_encode_headers((name, value) for name, value in headers if name.lower() not in _BODY_HEADERS),
+        ]})
+        await emit("retry: 3000\n\n")
+        sent_up_to = last_event_id or 0
+        if last_event_id is not None:
+            backlog = await asyncio.to_thread(_load_backlog, app, user_id, community_ids, last_event_id)
+            if backlog is None:
+                await emit(RESYNC)
+                await send({"type": "http.response.body", "body": b""})
+                return
+            for event in backlog:
+                sent_up_to = event["id"]
+                await emit(format_event(event))
+
+        while not disconnected.is_set():
+            try:
+                event = await asyncio.wait_for(events.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                await emit(KEEPALIVE)
+                continue
+            if overflowed.is_set():
+                await emit(RESYNC)
+                break
+            if event["type"] != "message" or event["id"] > sent_up_to:
+                await emit(format_event(event))
+        await send({"type": "http.response.body", "body": b""})
+    except OSError:
+        pass
+    finally:
+        sub.close()
+        watcher.cancel()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+def create_asgi_app(flask_app):
+    """ASGI app serving the message stream natively and the rest via WSGI."""
+    wsgi_app = WsgiToAsgi(flask_app)
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            await lifespan(receive, send)
+        elif scope["type"] == "http" and scope["path"] == STREAM_PATH and scope["method"] == "GET":
+            await stream_messages(flask_app, scope, receive, send)
+        else:
+            await wsgi_app(scope, receive, send)
+
+    return app
+
+
+flask_app = create_app()
+app = create_asgi_app(flask_app)
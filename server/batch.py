@@ -0,0 +1,50 @@
+"""
+Multi-get helpers for the `/batch` endpoints.
+
+A screen that shows 20-100 posts would otherwise fetch each author or
+community with its own request. Batch endpoints take `?ids=1,2,3` (or
+repeated `ids` params), load every row with one `IN` query, return them in
+the order asked for and list ids that don't exist under `missing` instead
+of failing the whole request.
+"""
+
+from __future__ import annotations
+
+from flask import abort, current_app, request
+
+
+def requested_ids() -> list[int]:
+    """Parse `ids` from the query string, de-duplicated in request order.
+
+    Aborts with 400 on a non-integer id, no ids, or more than
+    `BATCH_MAX_IDS`.
+    """
+    ids = []
+    for value in request.args.getlist("ids"):
+        for part in value.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            try:
+                ids.append(int(part))
+            except ValueError:
+                abort(400, description=f"invalid id '{part}'")
+    ids = list(dict.fromkeys(ids))
+
+    limit = current_app.config.get("BATCH_MAX_IDS", 100)
+    if not ids:
+        abort(400, description="ids is required")
+    if len(ids) > limit:
+        abort(400, description=f"at most {limit} ids per request")
+    return ids
+
+
+def fetch_by_ids(query, model, ids: list[int]) -> tuple[list, list[int]]:
+    """Load `ids` through `query` in one statement.
+
+    Returns `(rows in the order of ids, ids that were not found)`.
+    """
+    by_id = {row.id: row for row in query.filter(model.id.in_(ids)).all()}
+    rows = [by_id[i] for i in ids if i in by_id]
+    missing = [i for i in ids if i not in by_id]
+    return rows, missing
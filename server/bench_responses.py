@@ -0,0 +1,89 @@
+"""
+Benchmark: JSON encoding time and bytes on the wire for a 100-post page.
+
+Seeds an in-memory SQLite database, then measures `GET /api/posts?per_page=100`
+style payloads with Flask's stdlib JSON provider vs `FastJSONProvider`, and
+the body size for each available `Content-Encoding`.
+
+Usage (from Agrilink/server):
+  python bench_responses.py [iterations]
+"""
+
+import statistics
+import sys
+import time
+
+from flask.json.provider import DefaultJSONProvider
+
+from app import create_app
+from compression import available_codecs
+from config import Config
+from extensions import db
+from json_provider import FastJSONProvider
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    RATELIMIT_ENABLED = False
+
+
+CONTENT = (
+    "Leaf rust showed up on the lower maize leaves after last week's rains. "
+    "Orange pustules, mostly on older leaves, spreading up the stalk. "
+    "Has anyone had luck with early fungicide or resistant varieties here? "
+)
+
+
+def seed(app, posts: int = 100) -> None:
+    from models import Post, PostImage, User
+
+    with app.app_context():
+        db.create_all()
+        author = User(username="bench", email="bench@example.com", password_hash="x", role="user")
+        db.session.add(author)
+        db.session.flush()
+        for i in range(posts):
+            post = Post(author_id=author.id, title=f"Maize leaf rust, plot {i}", content=CONTENT * 3,
+                        likes_count=i * 3, comments_count=i % 7)
+            post.images = [PostImage(image_url=f"https://cdn.example.com/posts/{i}/{n}.jpg") for n in range(2)]
+            db.session.add(post)
+        db.session.commit()
+
+
+def median_ms(func, iterations: int) -> float:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main(iterations: int = 200) -> None:
+    app = create_app(BenchConfig)
+    seed(app)
+
+    with app.test_request_context():
+        from models import Post
+        page = {"posts": [p.to_dict() for p in Post.query.order_by(Post.id.desc()).limit(100)],
+                "total": 100, "page": 1, "pages": 1, "per_page": 100}
+
+        print(f"100-post page, median of {iterations} runs")
+        print(f"{'provider':<12}{'encode ms':>12}{'bytes':>10}")
+        for name, provider in (("stdlib", DefaultJSONProvider(app)), ("orjson", FastJSONProvider(app))):
+            body = provider.response(page).get_data()
+            elapsed = median_ms(lambda: provider.response(page).get_data(), iterations)
+            print(f"{name:<12}{elapsed:>12.3f}{len(body):>10}")
+
+        body = FastJSONProvider(app).response(page).get_data()
+        print()
+        print(f"{'encoding':<12}{'compress ms':>12}{'bytes':>10}{'ratio':>8}")
+        print(f"{'identity':<12}{0:>12.3f}{len(body):>10}{1:>8.2f}")
+        for encoding, codec in available_codecs().items():
+            compressed = codec(body, app.config)
+            elapsed = median_ms(lambda: codec(body, app.config), iterations)
+            print(f"{encoding:<12}{elapsed:>12.3f}{len(compressed):>10}{len(body) / len(compressed):>8.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
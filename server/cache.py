@@ -0,0 +1,322 @@
+"""
+Response cache for hot read endpoints with tag-based invalidation.
+
+`@cached()` stores a view's 200 response keyed by endpoint, URL params and
+normalized query args. While rendering, the view names the data it used
+with `cache_tags("posts", "post:12", ...)`; write handlers call
+`invalidate("post:12")` after committing. The backend records when each
+tag was last invalidated, entries record when their view started reading,
+and a hit is only served if none of its tags was invalidated since, so a
+write drops exactly the pages that showed the changed rows. Because the
+start is taken before the view runs (its tags are only known after), a
+write that commits while a page is rendering also drops that page, and an
+entry that would already be stale is not stored at all. Times come from
+the backend's clock (`now()`), so processes on different hosts sharing a
+Redis server agree on them.
+
+Invalidations come from web workers, the outbox worker and CLI commands
+(`refresh-trending`), so the backend must be shared by all of them: the
+default is `filesystem`. `memory` is only correct when one process does
+everything; gunicorn refuses to start with it and more than one worker.
+
+Backends (`CACHE_BACKEND`):
+  memory      Per-process LRU with TTL, capped at `CACHE_MAX_ENTRIES`.
+              Invalidations only reach the process that made them.
+  filesystem  Pickle files under `CACHE_DIR`, shared by processes on a host.
+              Expired files are purged every `FileSystemBackend.PURGE_INTERVAL`.
+  redis       Any Redis-compatible server at `CACHE_REDIS_URL` (needs the
+              optional `redis` package); shared by every process.
+  null        Caching disabled.
+
+Tags used by the routes:
+  posts                     post list membership (create/delete)
+  post:<id>                 one post's content, counters and images
+  community-list            community list membership (create/delete)
+  community:<id>            one community's row and counters
+  community:<id>:posts      a community's post list membership
+  community:<id>:messages   a community channel's history
+  trending                  trending rankings (refresh-trending)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, make_response, request
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+_MISSING = object()
+
+# Invalidation times outlive every entry that can reference them: an entry
+# built before an invalidation must expire before the time can be dropped
+TAG_TTL = 24 * 3600
+
+
+class MemoryBackend:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return None
+            expires_at, value = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def get_many(self, keys) -> list:
+        return [self.get(key) for key in keys]
+
+    def now(self) -> float:
+        return time.time()
+
+    def set(self, key, value, ttl: float | None = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class FileSystemBackend:
+    """One pickle file per key under `path`; safe across processes.
+
+    Each file's mtime is set to its expiry, so `purge()` can drop expired
+    files with a directory scan and no unpickling.
+    """
+
+    PURGE_INTERVAL = 300
+    # Leaves files of a concurrent set() alone until it has stamped them
+    PURGE_GRACE = 60
+    _NEVER = 2 ** 31 - 1
+
+    def __init__(self, path: str):
+        self.path = path
+        self._next_purge = time.monotonic() + self.PURGE_INTERVAL
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key) -> str:
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._file(key), "rb") as fh:
+                expires_at, value = pickle.load(fh)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        return value
+
+    def get_many(self, keys) -> list:
+        return [self.get(key) for key in keys]
+
+    def now(self) -> float:
+        return time.time()
+
+    def set(self, key, value, ttl: float | None = None) -> None:
+        expires_at = time.time() + ttl if ttl else None
+        # Write then rename so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump((expires_at, value), fh, protocol=pickle.HIGHEST_PROTOCOL)
+        stamp = expires_at if expires_at is not None else self._NEVER
+        os.utime(tmp, (stamp, stamp))
+        os.replace(tmp, self._file(key))
+        if time.monotonic() >= self._next_purge:
+            self._next_purge = time.monotonic() + self.PURGE_INTERVAL
+            self.purge()
+
+    def purge(self) -> int:
+        """Delete expired entries (and abandoned temp files); returns how many."""
+        cutoff = time.time() - self.PURGE_GRACE
+        removed = 0
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def clear(self) -> None:
+        for name in os.listdir(self.path):
+            os.remove(os.path.join(self.path, name))
+
+
+class RedisBackend:
+    """Redis (or compatible) store; values are pickled."""
+
+    def __init__(self, url: str, prefix: str = "agrilink:cache:"):
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def get_many(self, keys) -> list:
+        if not keys:
+            return []
+        raws = self._client.mget([self.prefix + key for key in keys])
+        return [pickle.loads(raw) if raw is not None else None for raw in raws]
+
+    def now(self) -> float:
+        """The server's clock, shared by every host using it."""
+        seconds, microseconds = self._client.time()
+        return seconds + microseconds / 1e6
+
+    def set(self, key, value, ttl: float | None = None) -> None:
+        raw = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._client.set(self.prefix + key, raw, px=int(ttl * 1000) if ttl else None)
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter(self.prefix + "*"):
+            self._client.delete(key)
+
+
+class ResponseCache:
+    def __init__(self, backend, default_ttl: float):
+        self.backend = backend
+        self.default_ttl = default_ttl
+
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f"tag-invalidated:{tag}"
+
+    def now(self) -> float:
+        """Take before rendering a response to `store`."""
+        return self.backend.now()
+
+    def _invalidated_since(self, tags, started: float) -> bool:
+        times = self.backend.get_many([self._tag_key(tag) for tag in tags])
+        return any(at is not None and at >= started for at in times)
+
+    def lookup(self, key: str):
+        entry = self.backend.get(key)
+        if entry is None or "started" not in entry:  # missing, or stored by an older release
+            return None
+        if self._invalidated_since(entry["tags"], entry["started"]):
+            return None
+        return entry
+
+    def store(self, key: str, response, tags, started: float, ttl: float | None = None) -> None:
+        """Store `response`, rendered from data read after `started`."""
+        tags = sorted(tags)
+        if self._invalidated_since(tags, started):
+            return  # a write committed while it was rendering
+        self.backend.set(key, {
+            "tags": tags,
+            "started": started,
+            "body": response.get_data(),
+            "mimetype": response.mimetype,
+            "headers": [(k, v) for k, v in response.headers.items()
+                        if k in ("ETag", "Last-Modified", "Cache-Control")],
+        }, min(ttl or self.default_ttl, TAG_TTL))
+
+    def invalidate(self, *tags: str) -> None:
+        now = self.backend.now()
+        for tag in tags:
+            self.backend.set(self._tag_key(tag), now, TAG_TTL)
+
+
+def init_cache(app) -> None:
+    """Create the cache selected by `CACHE_BACKEND`."""
+    backend = app.config.get("CACHE_BACKEND", "filesystem")
+    if backend == "memory":
+        store = MemoryBackend(app.config.get("CACHE_MAX_ENTRIES", 2048))
+    elif backend == "filesystem":
+        store = FileSystemBackend(app.config.get("CACHE_DIR") or os.path.join(tempfile.gettempdir(), "agrilink-cache"))
+    elif backend == "redis":
+        store = RedisBackend(app.config["CACHE_REDIS_URL"])
+    elif backend == "null":
+        store = None
+    else:
+        raise ValueError(f"Unknown CACHE_BACKEND '{backend}'")
+    app.extensions["cache"] = ResponseCache(store, app.config.get("CACHE_DEFAULT_TTL", 60)) if store else None
+
+
+def get_cache() -> ResponseCache | None:
+    return current_app.extensions.get("cache")
+
+
+def _request_key() -> str:
+    args = sorted((k, v) for k, vs in request.args.lists() for v in vs)
+    raw = repr((request.view_args, args))
+    return f"resp:{request.endpoint}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+
+def cache_tags(*tags: str) -> None:
+    """Name the data the current cached view is rendering from."""
+    if "cache_tags" in g:
+        g.cache_tags.update(tags)
+
+
+def skip_cache() -> None:
+    """Don't store the current response (e.g. an uncommon variant)."""
+    g.cache_skip = True
+
+
+def invalidate(*tags: str) -> None:
+    """Drop cached responses tagged with any of `tags`. Call after commit."""
+    cache = get_cache()
+    if cache is not None and tags:
+        cache.invalidate(*tags)
+
+
+def cached(ttl: float | None = None):
+    """Cache a GET view's 200 responses. Apply below `@login_required`."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            if cache is None or request.method != "GET":
+                return view(*args, **kwargs)
+
+            key = _request_key()
+            entry = cache.lookup(key)
+            if entry is not None:
+                response = current_app.response_class(entry["body"], mimetype=entry["mimetype"])
+                for name, value in entry["headers"]:
+                    response.headers[name] = value
+                response.headers["X-Cache"] = "HIT"
+                return response.make_conditional(request)
+
+            g.cache_tags = set()
+            g.cache_skip = False
+            started = cache.now()
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not g.cache_skip and not response.is_streamed:
+                cache.store(key, response, g.cache_tags, started, ttl)
+                response.headers["X-Cache"] = "MISS"
+            return response
+        return wrapper
+    return decorator
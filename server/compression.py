@@ -0,0 +1,94 @@
+"""
+Negotiated response compression.
+
+JSON bodies at or above `COMPRESS_MIN_SIZE` bytes are compressed with the
+best codec the client lists in `Accept-Encoding`, preferring them in
+`COMPRESS_ALGORITHMS` order when the client weights them equally:
+  zstd  needs the optional `zstandard` package
+  br    needs the optional `brotli` package
+  gzip  always available
+Codecs whose package is missing are skipped. Streamed responses (SSE,
+file downloads) are never buffered for compression.
+"""
+
+from __future__ import annotations
+
+import gzip
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/plain", "text/html", "text/csv"}
+
+
+def _gzip(data: bytes, config) -> bytes:
+    return gzip.compress(data, compresslevel=config.get("COMPRESS_GZIP_LEVEL", 6), mtime=0)
+
+
+def _brotli(data: bytes, config) -> bytes:
+    return brotli.compress(data, quality=config.get("COMPRESS_BROTLI_QUALITY", 4))
+
+
+def _zstd(data: bytes, config) -> bytes:
+    return zstandard.ZstdCompressor(level=config.get("COMPRESS_ZSTD_LEVEL", 3)).compress(data)
+
+
+def available_codecs() -> dict:
+    codecs = {"gzip": _gzip}
+    if brotli is not None:
+        codecs["br"] = _brotli
+    if zstandard is not None:
+        codecs["zstd"] = _zstd
+    return codecs
+
+
+def compress_response(response):
+    """`after_request` hook: compress eligible bodies in place."""
+    config = current_app.config
+    if (
+        not config.get("COMPRESS_ENABLED", True)
+        or response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or "no-transform" in response.headers.get("Cache-Control", "")
+    ):
+        return response
+
+    # The body depends on Accept-Encoding from here on, compressed or not
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < config.get("COMPRESS_MIN_SIZE", 1024):
+        return response
+
+    codecs = available_codecs()
+    preferred = [
+        name.strip() for name in config.get("COMPRESS_ALGORITHMS", "zstd,br,gzip").split(",")
+        if name.strip() in codecs
+    ]
+    encoding = request.accept_encodings.best_match(preferred)
+    if encoding is None:
+        return response
+
+    response.set_data(codecs[encoding](data, config))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # Different bytes per encoding, so a strong validator would lie
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app) -> None:
+    app.after_request(compress_response)
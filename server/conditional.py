@@ -0,0 +1,74 @@
+"""
+Conditional GETs (ETag / Last-Modified -> 304 Not Modified).
+
+Read endpoints describe their current state with a small *version* tuple
+fetched by one cheap statement (timestamps, counters, `count(*)`/`max(id)`
+over an index range) instead of loading and serializing the response.
+The weak ETag is a hash of that version, the route, its normalized query
+args and anything viewer-specific, so a client revalidating an unchanged
+screen gets a 304 without the main query or `to_dict()` ever running.
+
+The ETag is the authoritative validator. `Last-Modified` is derived from
+row timestamps, which counter bumps and deletes don't move, so
+`If-Modified-Since` is only consulted when the client sent no
+`If-None-Match` (as RFC 9110 specifies).
+"""
+
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime, timezone
+
+from flask import make_response, request
+
+
+def compute_etag(version, vary=()) -> str:
+    """Weak ETag for `version` under the current route and query args."""
+    args = sorted((k, v) for k, vs in request.args.lists() for v in vs)
+    raw = repr((request.endpoint, request.view_args, args, tuple(vary), version))
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def _as_http_date(value: datetime | None) -> datetime | None:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)  # naive columns store UTC
+    return value.replace(microsecond=0)
+
+
+def _not_modified(etag: str, last_modified: datetime | None) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return since is not None and last_modified is not None and last_modified <= since
+
+
+def conditional(version, build, last_modified: datetime | None = None, vary=()):
+    """Return a 304 if the client's validators match `version`, else `build()`.
+
+    `build` is a zero-argument callable producing the full response (it is
+    not called on a 304). `vary` lists viewer-specific inputs that change
+    the body for the same version, e.g. whether private fields are shown.
+    """
+    etag = compute_etag(version, vary)
+    last_modified = _as_http_date(last_modified)
+
+    if _not_modified(etag, last_modified):
+        response = make_response("", 304)
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Bodies depend on the session (private fields, membership)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def latest(*values) -> datetime | None:
+    """The newest non-null timestamp among `values`."""
+    present = [v for v in values if v is not None]
+    return max(present) if present else None
@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv(
@@ -6,4 +7,113 @@ class Config:
         "postgresql://localhost/agrilink"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret")
\ No newline at end of file
+    SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret")
+
+    # Connection pool per process (see database.py; ignored for SQLite).
+    # gunicorn.conf.py sizes workers so all of them fit in DB_MAX_CONNECTIONS.
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 5))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 10))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", 80))
+    # Per-request Postgres statement timeout in ms (0 disables)
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 5000))
+
+    # Reverse proxies in front of the app whose X-Forwarded-* headers are trusted
+    TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", 0))
+
+    # Seconds session claims are trusted before being re-checked against the DB
+    SESSION_CLAIMS_TTL = int(os.getenv("SESSION_CLAIMS_TTL", 300))
+
+    # Password hashing (see hashing.py); WORKERS=0 hashes in the request thread
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 8))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", 5))
+
+    # Seconds to reuse a COUNT(*) for cursor-paginated lists (0 disables)
+    PAGINATION_TOTAL_TTL = int(os.getenv("PAGINATION_TOTAL_TTL", 60))
+
+    # Seconds to buffer like counts in memory before writing them in batches
+    # (see counters.py); 0 writes every like/unlike immediately
+    COUNTER_BUFFER_INTERVAL = float(os.getenv("COUNTER_BUFFER_INTERVAL", 0))
+
+    # Seconds between rebuilds of the in-memory follow graph used for
+    # suggestions (see follow_graph.py)
+    FOLLOW_GRAPH_TTL = int(os.getenv("FOLLOW_GRAPH_TTL", 600))
+
+    # Trending posts (see trending.py): likes/comments lose half their weight
+    # every TRENDING_HALF_LIFE_HOURS and stop counting after TRENDING_WINDOW_DAYS
+    TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", 24))
+    TRENDING_WINDOW_DAYS = int(os.getenv("TRENDING_WINDOW_DAYS", 7))
+
+    # Background jobs (see outbox.py). Runner threads per web process, each
+    # using one extra database connection; 0 leaves all jobs to
+    # `flask outbox-worker`
+    OUTBOX_WORKER_THREADS = int(os.getenv("OUTBOX_WORKER_THREADS", 1))
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+    # Seconds an idle runner waits before polling again
+    OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1.0))
+    # Seconds before a claimed job whose runner died is retried
+    OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", 60))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+
+    # Notifications of one kind on one target within this many seconds are
+    # merged into one row (see notifications.py)
+    NOTIFICATION_WINDOW_SECONDS = int(os.getenv("NOTIFICATION_WINDOW_SECONDS", 3600))
+
+    # Image uploads (see media.py). Files live under MEDIA_ROOT, named by
+    # content hash, and are served at MEDIA_URL_PREFIX; variants are WebP
+    # renditions at each width, rendered by MEDIA_PROCESS_WORKERS processes
+    # per runner process (0 = in the job runner's thread)
+    MEDIA_ROOT = os.getenv("MEDIA_ROOT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "media"))
+    MEDIA_URL_PREFIX = os.getenv("MEDIA_URL_PREFIX", "/api/media")
+    MEDIA_MAX_UPLOAD_BYTES = int(os.getenv("MEDIA_MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+    MEDIA_MAX_PIXELS = int(os.getenv("MEDIA_MAX_PIXELS", 40_000_000))
+    MEDIA_VARIANT_WIDTHS = [int(w) for w in os.getenv("MEDIA_VARIANT_WIDTHS", "320,640,1280").split(",") if w.strip()]
+    MEDIA_PROCESS_WORKERS = int(os.getenv("MEDIA_PROCESS_WORKERS", 2))
+    # Resumable uploads are deleted by `gc-uploads` this long after their last chunk
+    UPLOAD_SESSION_TTL_HOURS = float(os.getenv("UPLOAD_SESSION_TTL_HOURS", 24))
+
+    # Maximum ids accepted by the /batch lookup endpoints
+    BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", 100))
+
+    # Home timeline: audiences above this size are merged at read time
+    # instead of fanned out on write
+    TIMELINE_FANOUT_LIMIT = int(os.getenv("TIMELINE_FANOUT_LIMIT", 10000))
+    TIMELINE_BACKFILL_SIZE = int(os.getenv("TIMELINE_BACKFILL_SIZE", 50))
+
+    # Response compression (see compression.py); br/zstd need optional packages
+    COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "true").lower() == "true"
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    COMPRESS_ALGORITHMS = os.getenv("COMPRESS_ALGORITHMS", "zstd,br,gzip")
+    COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 4))
+    COMPRESS_ZSTD_LEVEL = int(os.getenv("COMPRESS_ZSTD_LEVEL", 3))
+
+    # Response cache (see cache.py): "filesystem", "redis", "memory" or "null".
+    # Must be shared by every process that serves or invalidates (web workers,
+    # outbox-worker, CLI), so "memory" only suits a single process
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "filesystem")
+    CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", 60))
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 2048))
+    CACHE_DIR = os.getenv("CACHE_DIR")
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+    # Rate limiting (see ratelimit.py). The store must be shared by all workers:
+    # sqlite:///<path> (one host), redis://... (many hosts), memory:// (one process)
+    RATELIMIT_STORAGE_URI = os.getenv(
+        "RATELIMIT_STORAGE_URI", "sqlite:///" + os.path.join(tempfile.gettempdir(), "agrilink-ratelimit.db")
+    )
+    # One budget per user (per IP when anonymous) shared by all endpoints, each
+    # drawing ratelimit.ENDPOINT_COSTS units
+    RATELIMIT_APPLICATION = os.getenv("RATELIMIT_APPLICATION", "300 per minute")
+    RATELIMIT_HEADERS_ENABLED = True
+    # Keep serving (with per-process counters) if the store is unreachable
+    RATELIMIT_SWALLOW_ERRORS = True
+    RATELIMIT_IN_MEMORY_FALLBACK_ENABLED = True
+
+    # Real-time message streams: "local" (single process) or "postgres"
+    REALTIME_BACKEND = os.getenv("REALTIME_BACKEND", "local")
+    # Seconds between SSE keepalive comments on idle streams
+    REALTIME_HEARTBEAT = int(os.getenv("REALTIME_HEARTBEAT", 15))
@@ -0,0 +1,46 @@
+import tempfile
+
+import pytest
+
+from app import create_app
+from config import Config
+from extensions import db
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    RATELIMIT_ENABLED = False
+    PASSWORD_HASH_WORKERS = 0
+    OUTBOX_WORKER_THREADS = 0
+    MEDIA_ROOT = tempfile.mkdtemp(prefix="agrilink-media-")
+    MEDIA_PROCESS_WORKERS = 0
+    CACHE_BACKEND = "memory"
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        from seed_roles import seed_default_roles
+        db.create_all()
+        seed_default_roles()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def register(client, username):
+    """Register (and log in as) a user, returning its id."""
+    resp = client.post("/api/auth/register", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": "secret123",
+    })
+    assert resp.status_code == 201, resp.get_json()
+    return resp.get_json()["user"]["id"]
@@ -0,0 +1,324 @@
+"""
+Conversation index maintenance.
+
+Every message belongs to a `Conversation` (one per user pair, one per
+community channel). The write handlers keep each conversation's last
+message up to date, so listing a user's threads never has to group the
+`messages` table. Direct threads also copy `last_message_at` to both
+participant rows, making a user's direct threads one index range read;
+community channels don't, since that would be a write per member on every
+message, and `list_threads` reads their recency from the conversation
+instead (a user belongs to few communities).
+
+Read state is a per-participant cursor (`last_read_message_id`). In
+direct threads it comes with an `unread_count` of the other user's
+messages after it, rolled up into `User.unread_messages_count` for the app
+badge: sending bumps the recipient's counters, `mark_read` moves a cursor
+forward and subtracts what it passed. Community channels keep only the
+cursor; their unread counts are counted when read (`community_unread`),
+capped at `COMMUNITY_UNREAD_CAP` so a long-unread busy channel stays one
+short index range read, instead of a counter write per member per message.
+"""
+
+from __future__ import annotations
+
+from sqlalchemy import case, func, select, tuple_
+from sqlalchemy.orm import joinedload
+from sqlalchemy.exc import IntegrityError
+
+from counters import bump, bump_where
+from extensions import db
+from pagination import encode_cursor
+
+# Community unread counts stop here ("99+")
+COMMUNITY_UNREAD_CAP = 100
+
+
+def _get_or_create(model, **key):
+    row = model.query.filter_by(**key).first()
+    if row is not None:
+        return row
+    try:
+        # Savepoint so a concurrent insert of the same key doesn't abort
+        # the caller's transaction
+        with db.session.begin_nested():
+            row = model(**key)
+            db.session.add(row)
+    except IntegrityError:
+        row = model.query.filter_by(**key).one()
+    return row
+
+
+def direct_conversation(user_id: int, other_id: int):
+    from models import Conversation, ConversationParticipant
+
+    user_a_id, user_b_id = sorted((user_id, other_id))
+    conversation = _get_or_create(Conversation, kind="direct", user_a_id=user_a_id, user_b_id=user_b_id)
+    for participant_id in {user_a_id, user_b_id}:
+        _get_or_create(ConversationParticipant, conversation_id=conversation.id, user_id=participant_id)
+    return conversation
+
+
+def community_conversation(community_id: int):
+    from models import Conversation
+
+    return _get_or_create(Conversation, kind="community", community_id=community_id)
+
+
+def add_participant(community_id: int, user_id: int) -> None:
+    """Add a community member to the community channel's participants."""
+    from models import ConversationParticipant
+
+    conversation = community_conversation(community_id)
+    participant = _get_or_create(ConversationParticipant, conversation_id=conversation.id, user_id=user_id)
+    if participant.last_read_message_id is None:
+        # New members start with the channel's history already read
+        participant.last_read_message_id = conversation.last_message_id
+
+
+def remove_participant(community_id: int, user_id: int) -> None:
+    from models import Conversation, ConversationParticipant, User
+
+    conversation = Conversation.query.filter_by(community_id=community_id).first()
+    if conversation is None:
+        return
+    participant = ConversationParticipant.query.filter_by(
+        conversation_id=conversation.id, user_id=user_id
+    ).first()
+    if participant is not None:
+        db.session.delete(participant)
+
+
+def _set_last_message(conversation, message) -> None:
+    from models import ConversationParticipant
+
+    conversation.last_message_id = message.id if message else None
+    conversation.last_message_at = message.created_at if message else None
+    if conversation.kind == "direct":
+        ConversationParticipant.query.filter_by(conversation_id=conversation.id).update(
+            {ConversationParticipant.last_message_at: conversation.last_message_at},
+            synchronize_session=False,
+        )
+
+
+def record_message(message) -> None:
+    """Attach a flushed message to its conversation and bump thread recency."""
+    if message.community_id:
+        conversation = community_conversation(message.community_id)
+    else:
+        conversation = direct_conversation(message.sender_id, message.receiver_id)
+    message.conversation_id = conversation.id
+    _set_last_message(conversation, message)
+    _count_unread(message, 1)
+    sender = participant_for(conversation.id, message.sender_id)
+    if sender is not None:
+        mark_read(sender, message.id)
+
+
+def _count_unread(message, delta: int) -> None:
+    """Add `delta` to the unread counters of the recipient of a direct message."""
+    from models import ConversationParticipant, User
+
+    if message.community_id is not None:
+        return
+    unread_for = (
+        (ConversationParticipant.conversation_id == message.conversation_id)
+        & (ConversationParticipant.user_id != message.sender_id)
+        & (func.coalesce(ConversationParticipant.last_read_message_id, 0) < message.id)
+    )
+    if delta < 0:
+        unread_for = unread_for & (ConversationParticipant.unread_count > 0)
+    readers = db.select(ConversationParticipant.user_id).where(unread_for)
+    # Users first: the participant update below can change who matches
+    bump_where(User.unread_messages_count, User.id.in_(readers), delta)
+    bump_where(ConversationParticipant.unread_count, unread_for, delta)
+
+
+def list_threads(user_id: int, per_page: int, position=None) -> tuple[list, str | None]:
+    """Return `(participants, next_cursor)` for a user's threads, most recent first.
+
+    `position` is a decoded `(last_message_at, conversation_id)` cursor or
+    None for the first page. Direct threads come from the participant index;
+    the user's community channels are read whole and merged in.
+    """
+    from models import Conversation, ConversationParticipant
+
+    direct = (
+        select(ConversationParticipant.last_message_at, ConversationParticipant.conversation_id)
+        .where(ConversationParticipant.user_id == user_id, ConversationParticipant.last_message_at.isnot(None))
+        .order_by(ConversationParticipant.last_message_at.desc(), ConversationParticipant.conversation_id.desc())
+        .limit(per_page + 1)
+    )
+    if position is not None:
+        direct = direct.where(
+            tuple_(ConversationParticipant.last_message_at, ConversationParticipant.conversation_id) < tuple_(*position)
+        )
+    keys = {tuple(row) for row in db.session.execute(direct)}
+
+    channels = db.session.execute(
+        select(Conversation.last_message_at, Conversation.id)
+        .join(ConversationParticipant, ConversationParticipant.conversation_id == Conversation.id)
+        .where(
+            ConversationParticipant.user_id == user_id,
+            Conversation.kind == "community",
+            Conversation.last_message_at.isnot(None),
+        )
+    )
+    keys.update(tuple(row) for row in channels if position is None or tuple(row) < tuple(position))
+
+    ordered = sorted(keys, reverse=True)[:per_page + 1]
+    page = ordered[:per_page]
+    participants = {
+        p.conversation_id: p
+        for p in ConversationParticipant.query.filter(
+            ConversationParticipant.user_id == user_id,
+            ConversationParticipant.conversation_id.in_([conversation_id for _, conversation_id in page]),
+        ).options(joinedload(ConversationParticipant.conversation).joinedload(Conversation.last_message))
+    }
+    items = [participants[conversation_id] for _, conversation_id in page if conversation_id in participants]
+
+    next_cursor = None
+    if len(ordered) > per_page and page:
+        next_cursor = encode_cursor(*page[-1])
+    return items, next_cursor
+
+
+def community_unread(user_id: int, conversation_ids=None) -> dict[int, int]:
+    """Unread messages per community channel of `user_id`, capped at
+    `COMMUNITY_UNREAD_CAP`; channels with none are omitted.
+
+    Limited to `conversation_ids` if given.
+    """
+    from models import Conversation, ConversationParticipant, Message
+
+    read_up_to = func.coalesce(ConversationParticipant.last_read_message_id, 0)
+    unread = (
+        select(Message.id)
+        .where(
+            Message.conversation_id == ConversationParticipant.conversation_id,
+            Message.id > read_up_to,
+            Message.sender_id != user_id,
+        )
+        .limit(COMMUNITY_UNREAD_CAP)
+        .correlate(ConversationParticipant)
+        .subquery()
+    )
+    query = (
+        select(ConversationParticipant.conversation_id, select(func.count()).select_from(unread).scalar_subquery())
+        .join(Conversation, Conversation.id == ConversationParticipant.conversation_id)
+        .where(
+            ConversationParticipant.user_id == user_id,
+            Conversation.kind == "community",
+            # Skip channels with nothing after the cursor without touching messages
+            Conversation.last_message_id > read_up_to,
+        )
+    )
+    if conversation_ids is not None:
+        query = query.where(ConversationParticipant.conversation_id.in_(conversation_ids))
+    return {conversation_id: count for conversation_id, count in db.session.execute(query) if count}
+
+
+def unread_counts(participants) -> dict[int, int]:
+    """Unread count per conversation for one user's `participants` rows."""
+    counts = {p.conversation_id: p.unread_count for p in participants if p.conversation.kind == "direct"}
+    channels = [p for p in participants if p.conversation.kind == "community"]
+    if channels:
+        computed = community_unread(channels[0].user_id, [p.conversation_id for p in channels])
+        counts.update({p.conversation_id: computed.get(p.conversation_id, 0) for p in channels})
+    return counts
+
+
+def total_unread(user_id: int) -> int:
+    """The app badge: direct messages from the counter plus community channels."""
+    from models import User
+
+    direct = db.session.scalar(select(User.unread_messages_count).where(User.id == user_id)) or 0
+    return direct + sum(community_unread(user_id).values())
+
+
+def participant_for(conversation_id: int, user_id: int):
+    from models import ConversationParticipant
+
+    return ConversationParticipant.query.filter_by(
+        conversation_id=conversation_id, user_id=user_id
+    ).first()
+
+
+def mark_read(participant, up_to_id: int) -> bool:
+    """Move `participant`'s read cursor forward to message `up_to_id`.
+
+    In direct threads, subtracts the other user's messages passed over from
+    the participant's and the user's unread counters. Cursors never move
+    backwards; returns False if there was nothing to advance.
+    """
+    from models import ConversationParticipant, Message, User
+
+    previous = participant.last_read_message_id or 0
+    if up_to_id <= previous:
+        return False
+    if participant.conversation.kind == "community":
+        moved = db.session.execute(
+            db.update(ConversationParticipant)
+            .where(
+                ConversationParticipant.id == participant.id,
+                func.coalesce(ConversationParticipant.last_read_message_id, 0) == previous,
+            )
+            .values(last_read_message_id=up_to_id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.refresh(participant)
+        return bool(moved)
+    passed = (
+        db.session.query(func.count(Message.id))
+        .filter(
+            Message.conversation_id == participant.conversation_id,
+            Message.id > previous,
+            Message.id <= up_to_id,
+            Message.sender_id != participant.user_id,
+        )
+        .scalar()
+    )
+    # Compare-and-set on the old cursor so concurrent mark-reads of the
+    # same range subtract it only once
+    moved = db.session.execute(
+        db.update(ConversationParticipant)
+        .where(
+            ConversationParticipant.id == participant.id,
+            func.coalesce(ConversationParticipant.last_read_message_id, 0) == previous,
+        )
+        .values(
+            last_read_message_id=up_to_id,
+            unread_count=case(
+                (ConversationParticipant.unread_count < passed, 0),
+                else_=ConversationParticipant.unread_count - passed,
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.refresh(participant)
+    if not moved:
+        return False
+    if passed:
+        bump(User.unread_messages_count, participant.user_id, -passed)
+    return True
+
+
+def forget_message(message) -> None:
+    """Drop `message` from unread counters and point the conversation at its
+    previous message, before `message` is deleted."""
+    from models import Conversation, Message
+
+    if message.conversation_id is None:
+        return
+    _count_unread(message, -1)
+    conversation = db.session.get(Conversation, message.conversation_id)
+    if conversation is None or conversation.last_message_id != message.id:
+        return
+    previous = (
+        Message.query.filter(Message.conversation_id == conversation.id, Message.id != message.id)
+        .order_by(Message.id.desc())
+        .first()
+    )
+    _set_last_message(conversation, previous)
+    # Release the foreign key before the message row goes away
+    db.session.flush()
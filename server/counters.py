@@ -0,0 +1,210 @@
+"""
+Denormalized engagement counters.
+
+Counter columns (`Post.likes_count`, `Community.members_count`, ...) are
+kept in step by the write handlers with single `UPDATE ... SET n = n + 1`
+statements, so serializers never have to load child rows to count them.
+`reconcile_counters` recomputes every counter from the source tables to
+repair any drift.
+
+Hot counters (likes on a viral post) can instead go through `bump_later`:
+with `COUNTER_BUFFER_INTERVAL` > 0 each process sums its deltas in memory
+and a background thread applies them every interval, one `UPDATE ... WHERE
+id IN (...)` per distinct delta, so a burst of a thousand likes becomes a
+handful of statements instead of a thousand contended row locks. Counts
+lag by up to one interval, deltas still buffered when a process dies are
+lost, and reconciling while deltas are pending can count them twice;
+`reconcile-counters` repairs both.
+
+Usage (from Agrilink/server):
+  flask --app app:create_app reconcile-counters
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import case, func, select
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+
+def preserve_updated_at(model) -> dict:
+    """Counter writes are not content edits; keep `updated_at` untouched."""
+    if "updated_at" in model.__table__.c:
+        return {model.__table__.c.updated_at: model.__table__.c.updated_at}
+    return {}
+
+
+def bump(column, row_id: int, delta: int = 1) -> None:
+    """Atomically add `delta` to a counter column on one row, never below 0.
+
+    The update joins the caller's transaction; commit as usual.
+    """
+    bump_where(column, column.class_.id == row_id, delta)
+
+
+def bump_where(column, condition, delta=1) -> None:
+    """Like `bump`, for every row matching `condition` in one statement.
+
+    `delta` may be a column expression of the same table.
+    """
+    model = column.class_
+    new_value = case((column + delta < 0, 0), else_=column + delta)
+    db.session.execute(
+        db.update(model)
+        .where(condition)
+        .values({column: new_value, **preserve_updated_at(model)})
+    )
+
+
+class CounterBuffer:
+    """Per-process write-behind buffer of counter deltas."""
+
+    def __init__(self, app, interval: float):
+        self.app = app
+        self.interval = interval
+        self._deltas = defaultdict(int)
+        self._tags = set()
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def add(self, column, row_id: int, delta: int, tags=()) -> None:
+        with self._lock:
+            self._deltas[(column.class_, column.key, row_id)] += delta
+            self._tags.update(tags)
+            # Threads don't survive a fork, so (re)start lazily in each worker
+            if self._flusher is None or not self._flusher.is_alive():
+                self._flusher = threading.Thread(target=self._run, name="counter-flusher", daemon=True)
+                self._flusher.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("counter flush failed, retrying next interval")
+
+    def flush(self) -> None:
+        """Apply and commit every buffered delta, then invalidate their cache tags."""
+        from cache import invalidate
+
+        with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(int)
+            tags, self._tags = self._tags, set()
+        groups = defaultdict(list)
+        for (model, key, row_id), delta in deltas.items():
+            if delta:
+                groups[(model, key, delta)].append(row_id)
+        if not groups:
+            return
+
+        with self.app.app_context():
+            try:
+                for (model, key, delta), row_ids in groups.items():
+                    bump_where(getattr(model, key), model.id.in_(row_ids), delta)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    for key, delta in deltas.items():
+                        self._deltas[key] += delta
+                    self._tags.update(tags)
+                raise
+            invalidate(*tags)
+
+
+def init_counter_buffer(app) -> None:
+    """Enable `bump_later` buffering when `COUNTER_BUFFER_INTERVAL` > 0."""
+    interval = app.config.get("COUNTER_BUFFER_INTERVAL", 0)
+    if interval > 0:
+        buffer = CounterBuffer(app, interval)
+        atexit.register(buffer.flush)
+        app.extensions["counter_buffer"] = buffer
+
+
+def bump_later(column, row_id: int, delta: int = 1, tags=()) -> None:
+    """`bump`, deferred to the write-behind buffer when one is enabled.
+
+    `tags` are cache tags to invalidate once the buffered delta is written;
+    callers still invalidate as usual after their own commit.
+    """
+    buffer = current_app.extensions.get("counter_buffer")
+    if buffer is None:
+        bump(column, row_id, delta)
+    else:
+        buffer.add(column, row_id, delta, tags)
+
+
+def reconcile_counters() -> None:
+    """Recompute every counter column from the underlying rows in bulk."""
+    from models import (
+        Comment, Community, CommunityMembership, Conversation, ConversationParticipant, Follow, Like, Message,
+        Post, User,
+    )
+
+    def count_of(model, fk, parent_id):
+        return (
+            select(func.count(model.id))
+            .where(fk == parent_id)
+            .correlate_except(model)
+            .scalar_subquery()
+        )
+
+    db.session.execute(db.update(Post).values({
+        Post.likes_count: count_of(Like, Like.post_id, Post.id),
+        Post.comments_count: count_of(Comment, Comment.post_id, Post.id),
+        **preserve_updated_at(Post),
+    }))
+    db.session.execute(db.update(Community).values({
+        Community.members_count: count_of(CommunityMembership, CommunityMembership.community_id, Community.id),
+        Community.posts_count: count_of(Post, Post.community_id, Community.id),
+    }))
+    db.session.execute(db.update(User).values({
+        User.followers_count: count_of(Follow, Follow.followed_id, User.id),
+        User.following_count: count_of(Follow, Follow.follower_id, User.id),
+        **preserve_updated_at(User),
+    }))
+    unread = (
+        select(func.count(Message.id))
+        .where(
+            Message.conversation_id == ConversationParticipant.conversation_id,
+            Message.id > func.coalesce(ConversationParticipant.last_read_message_id, 0),
+            Message.sender_id != ConversationParticipant.user_id,
+        )
+        .correlate_except(Message)
+        .scalar_subquery()
+    )
+    # Community channels count unread messages when read (see conversations.py)
+    direct = ConversationParticipant.conversation_id.in_(
+        select(Conversation.id).where(Conversation.kind == "direct")
+    )
+    db.session.execute(db.update(ConversationParticipant).values({
+        ConversationParticipant.unread_count: case((direct, unread), else_=0),
+    }))
+    db.session.execute(db.update(User).values({
+        User.unread_messages_count: (
+            select(func.coalesce(func.sum(ConversationParticipant.unread_count), 0))
+            .where(ConversationParticipant.user_id == User.id)
+            .correlate_except(ConversationParticipant)
+            .scalar_subquery()
+        ),
+        **preserve_updated_at(User),
+    }))
+    db.session.commit()
+
+
+@click.command("reconcile-counters")
+@with_appcontext
+def reconcile_counters_command():
+    """Recompute denormalized engagement counters."""
+    reconcile_counters()
+    click.echo("Counters reconciled.")
@@ -0,0 +1,78 @@
+"""
+SQLAlchemy engine options and per-request statement timeouts.
+
+`engine_options()` turns the `DB_*` settings into
+`SQLALCHEMY_ENGINE_OPTIONS` for server databases: a bounded pool
+(`DB_POOL_SIZE` + `DB_MAX_OVERFLOW` connections per process, waiting at
+most `DB_POOL_TIMEOUT` seconds for a free one), `pool_pre_ping` so
+connections dropped by Postgres or a pooler are replaced transparently,
+and `DB_POOL_RECYCLE` to retire long-lived connections. SQLite URIs keep
+Flask-SQLAlchemy's defaults, since its pools take none of these options.
+
+On Postgres every transaction started while handling a request runs
+`SET LOCAL statement_timeout`, so one runaway query is cancelled instead
+of holding a pooled connection (and a worker thread) indefinitely. The
+limit is `DB_STATEMENT_TIMEOUT_MS` unless the view is decorated with
+`@statement_timeout(ms)`; a cancelled request answers 503. CLI commands
+and migrations are not limited.
+"""
+
+from __future__ import annotations
+
+from functools import wraps
+
+from flask import current_app, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError
+
+
+def engine_options(config) -> dict:
+    """Pool options for `config["SQLALCHEMY_DATABASE_URI"]`."""
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() == "sqlite":
+        return {}
+    options = {
+        "pool_size": config.get("DB_POOL_SIZE", 5),
+        "max_overflow": config.get("DB_MAX_OVERFLOW", 5),
+        "pool_timeout": config.get("DB_POOL_TIMEOUT", 10),
+        "pool_recycle": config.get("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": True,
+    }
+    if url.get_backend_name() == "postgresql":
+        options["connect_args"] = {"application_name": config.get("DB_APPLICATION_NAME", "agrilink")}
+    return options
+
+
+def statement_timeout(ms: int):
+    """Give one view a different statement timeout than `DB_STATEMENT_TIMEOUT_MS`."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.statement_timeout_ms = ms
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _apply_statement_timeout(session, transaction, connection) -> None:
+    if not has_request_context() or connection.dialect.name != "postgresql":
+        return
+    ms = g.get("statement_timeout_ms", current_app.config.get("DB_STATEMENT_TIMEOUT_MS", 0))
+    if ms:
+        # SET doesn't take bind parameters; ms is always an int
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(ms)}")
+
+
+def is_statement_timeout(error: DBAPIError) -> bool:
+    """True if Postgres cancelled the statement (SQLSTATE 57014)."""
+    return getattr(error.orig, "pgcode", None) == "57014"
+
+
+def init_database(app, db) -> None:
+    """Fill in engine options before `db.init_app` and install the timeout hook."""
+    if not app.config.get("SQLALCHEMY_ENGINE_OPTIONS"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+    db.init_app(app)
+    if not event.contains(db.session, "after_begin", _apply_statement_timeout):
+        event.listen(db.session, "after_begin", _apply_statement_timeout)
@@ -0,0 +1,146 @@
+"""
+Precomputed engagement score used to rank expert listings.
+
+    engagement_score = 5 * followers + 2 * comments written + likes received
+
+Computing that per request would aggregate `posts` and `comments` for
+every candidate before the list could be sorted. Instead the score is
+stored on `users` and covered by the (role_id, [location,]
+engagement_score, id) indexes, so "Follow experts" is one index range
+read.
+
+`refresh-engagement` keeps the column current incrementally: it records
+(in `job_state`) the highest like, comment and follow id it has seen, and
+on each run recomputes only the users those newer rows touched: authors
+of newly liked posts, new commenters and newly followed users. The first
+run, and `--full`, recompute everyone. Ids are handed out when a row is
+inserted but become visible when its transaction commits, so on Postgres
+a row can appear below a watermark already recorded; each run therefore
+re-reads the last `ID_OVERLAP` ids below it, which is harmless because a
+score is recomputed from scratch rather than incremented. Unlikes,
+unfollows and deleted comments leave no new row to find (nor does a
+straggler beyond the overlap), so schedule a daily `--full` run next to
+the frequent incremental one.
+
+Usage (from Agrilink/server):
+  flask --app app:create_app refresh-engagement          # e.g. every 5 minutes
+  flask --app app:create_app refresh-engagement --full   # e.g. nightly
+"""
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, select
+
+from counters import preserve_updated_at
+from extensions import db
+
+FOLLOWER_WEIGHT = 5
+COMMENT_WEIGHT = 2
+LIKE_WEIGHT = 1
+
+# Users recomputed per UPDATE statement
+BATCH_SIZE = 500
+
+# Ids re-read below each recorded position, for rows committed out of id order
+ID_OVERLAP = 1000
+
+
+def _score():
+    """Correlated SQL expression for a `users` row's engagement score."""
+    from models import Comment, Post, User
+
+    likes_received = (
+        select(func.coalesce(func.sum(Post.likes_count), 0))
+        .where(Post.author_id == User.id)
+        .correlate_except(Post)
+        .scalar_subquery()
+    )
+    comments_written = (
+        select(func.count(Comment.id))
+        .where(Comment.user_id == User.id)
+        .correlate_except(Comment)
+        .scalar_subquery()
+    )
+    return (
+        User.followers_count * FOLLOWER_WEIGHT
+        + comments_written * COMMENT_WEIGHT
+        + likes_received * LIKE_WEIGHT
+    )
+
+
+def recompute_scores(user_ids=None) -> None:
+    """Recompute `engagement_score` for `user_ids` (every user if None).
+
+    Joins the caller's transaction; commit as usual.
+    """
+    from models import User
+
+    values = {User.engagement_score: _score(), **preserve_updated_at(User)}
+    if user_ids is None:
+        db.session.execute(db.update(User).values(values))
+        return
+    user_ids = sorted(user_ids)
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        batch = user_ids[start:start + BATCH_SIZE]
+        db.session.execute(db.update(User).where(User.id.in_(batch)).values(values))
+
+
+def _sources():
+    """(job name, source model, query of users affected by rows in an id range)."""
+    from models import Comment, Follow, Like, Post
+
+    return [
+        ("engagement:likes", Like,
+         lambda lo, hi: select(Post.author_id).join(Like, Like.post_id == Post.id)
+         .where(Like.id > lo, Like.id <= hi)),
+        ("engagement:comments", Comment,
+         lambda lo, hi: select(Comment.user_id).where(Comment.id > lo, Comment.id <= hi)),
+        ("engagement:follows", Follow,
+         lambda lo, hi: select(Follow.followed_id).where(Follow.id > lo, Follow.id <= hi)),
+    ]
+
+
+def refresh_engagement(full: bool = False) -> int | None:
+    """Bring engagement scores up to date and commit.
+
+    Returns the number of users recomputed, or None after a full refresh.
+    """
+    from models import JobState
+
+    sources = _sources()
+    states = {
+        state.name: state
+        for state in JobState.query.filter(JobState.name.in_([name for name, _, _ in sources]))
+    }
+    # Fix the upper bounds first so rows inserted meanwhile wait for the next run
+    highs = {name: db.session.scalar(select(func.coalesce(func.max(model.id), 0))) for name, model, _ in sources}
+
+    if full or len(states) < len(sources):
+        recompute_scores()
+        touched = None
+    else:
+        touched = set()
+        for name, _model, affected in sources:
+            low = max(states[name].position - ID_OVERLAP, 0)
+            if highs[name] > low:
+                touched.update(db.session.scalars(affected(low, highs[name])))
+        recompute_scores(touched)
+
+    for name, _model, _affected in sources:
+        state = states.get(name) or JobState(name=name)
+        state.position = highs[name]
+        db.session.add(state)
+    db.session.commit()
+    return None if touched is None else len(touched)
+
+
+@click.command("refresh-engagement")
+@click.option("--full", is_flag=True, help="Recompute every user instead of only recently engaged ones.")
+@with_appcontext
+def refresh_engagement_command(full):
+    """Update the engagement scores used to rank experts."""
+    touched = refresh_engagement(full=full)
+    if touched is None:
+        click.echo("Engagement scores recomputed for all users.")
+    else:
+        click.echo(f"Engagement scores recomputed for {touched} users.")
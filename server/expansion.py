@@ -0,0 +1,154 @@
+"""
+Sparse fieldsets and relationship expansion for list/detail endpoints.
+
+  ?fields=id,title,created_at    only these columns are loaded and returned
+  ?expand=author,images          embed related rows, eager-loaded per page
+
+Expansions use `selectinload`, so a page costs one extra query per
+requested relation no matter how many rows it has, and `fields` becomes a
+`load_only` so unrequested columns never leave the database. Without
+either parameter an endpoint returns its usual `to_dict()` shape.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+
+from flask import abort, request
+from sqlalchemy.orm import load_only, selectinload
+
+# Always loaded, even when not requested: row identity and cursor position
+_ALWAYS_LOADED = ("id", "created_at")
+
+
+@dataclass(frozen=True)
+class Relation:
+    attr: str
+    # Local columns the relationship loader needs (foreign keys)
+    columns: tuple[str, ...] = ()
+    many: bool = False
+
+
+@dataclass(frozen=True)
+class Spec:
+    fields: tuple[str, ...]
+    relations: dict[str, Relation]
+    # Relations embedded by the model's default `to_dict()` shape
+    default_expand: tuple[str, ...] = ()
+    to_dict_kwargs: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class Shape:
+    model: type
+    fields: tuple[str, ...] | None
+    expand: tuple[str, ...]
+
+
+@lru_cache(maxsize=None)
+def _specs() -> dict:
+    from models import Community, CommunityMembership, Message, Post
+
+    return {
+        Post: Spec(
+            fields=("id", "author_id", "community_id", "title", "content", "likes_count",
+                    "comments_count", "created_at", "updated_at"),
+            relations={
+                "author": Relation("author", ("author_id",)),
+                "community": Relation("community", ("community_id",)),
+                "images": Relation("images", many=True),
+            },
+            default_expand=("images",),
+            to_dict_kwargs={"include_relations": False},
+        ),
+        Community: Spec(
+            fields=("id", "name", "description", "image_url", "created_by", "members_count",
+                    "posts_count", "created_at"),
+            relations={"creator": Relation("creator", ("created_by",))},
+        ),
+        CommunityMembership: Spec(
+            fields=("id", "user_id", "community_id", "created_at"),
+            relations={
+                "user": Relation("user", ("user_id",)),
+                "community": Relation("community", ("community_id",)),
+            },
+        ),
+        Message: Spec(
+            fields=("id", "sender_id", "receiver_id", "community_id", "conversation_id",
+                    "content", "created_at"),
+            relations={
+                "sender": Relation("sender", ("sender_id",)),
+                "receiver": Relation("receiver", ("receiver_id",)),
+                "community": Relation("community", ("community_id",)),
+            },
+        ),
+    }
+
+
+def _names(param: str, allowed, what: str) -> tuple[str, ...]:
+    names = tuple(dict.fromkeys(n.strip() for n in request.args.get(param, "").split(",") if n.strip()))
+    for name in names:
+        if name not in allowed:
+            abort(400, description=f"unknown {what} '{name}'; expected one of: {', '.join(allowed)}")
+    return names
+
+
+def requested_shape(model) -> Shape:
+    """Read `fields` and `expand` for `model` from the request args.
+
+    Unknown names abort with 400. An empty `expand=` turns off the model's
+    default embedded relations.
+    """
+    spec = _specs()[model]
+    fields = _names("fields", spec.fields, "field") if "fields" in request.args else None
+    if "expand" in request.args:
+        expand = _names("expand", spec.relations, "expansion")
+    else:
+        expand = spec.default_expand
+    return Shape(model=model, fields=fields or None, expand=expand)
+
+
+def only_default_relations(shape: Shape) -> bool:
+    """True if `shape` embeds nothing beyond the model's default relations.
+
+    Conditional GETs only version those; responses embedding other rows
+    (authors, communities, ...) are always sent in full.
+    """
+    return set(shape.expand) <= set(_specs()[shape.model].default_expand)
+
+
+def apply_shape(query, shape: Shape):
+    """Add the loader options `shape` needs to an ORM query on its model."""
+    spec = _specs()[shape.model]
+    options = []
+    if shape.fields is not None:
+        columns = set(shape.fields) | (set(_ALWAYS_LOADED) & set(spec.fields))
+        for name in shape.expand:
+            columns.update(spec.relations[name].columns)
+        options.append(load_only(*[getattr(shape.model, c) for c in sorted(columns)]))
+    for name in shape.expand:
+        options.append(selectinload(getattr(shape.model, spec.relations[name].attr)))
+    return query.options(*options) if options else query
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def serialize(obj, shape: Shape) -> dict:
+    """Serialize `obj` with only the requested fields and expansions."""
+    spec = _specs()[shape.model]
+    if shape.fields is None:
+        data = obj.to_dict(**spec.to_dict_kwargs)
+    else:
+        data = {name: _plain(getattr(obj, name)) for name in shape.fields}
+    for name in shape.expand:
+        relation = spec.relations[name]
+        value = getattr(obj, relation.attr)
+        if relation.many:
+            data[name] = [item.to_dict() for item in value]
+        else:
+            data[name] = value.to_dict() if value is not None else None
+    return data
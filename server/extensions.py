@@ -2,10 +2,15 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
+
+from ratelimit import is_exempt, rate_limit_key, request_cost
 
 db = SQLAlchemy()
 migrate = Migrate()
 # CORS and Limiter will be initialized in create_app() with app context
 cors = CORS()
-limiter = Limiter(key_func=get_remote_address)
+limiter = Limiter(
+    key_func=rate_limit_key,
+    application_limits_cost=request_cost,
+    application_limits_exempt_when=is_exempt,
+)
@@ -0,0 +1,121 @@
+"""
+In-memory follow graph for "people you may know" suggestions.
+
+Friends-of-friends as SQL is a self-join of `follows` that fans out to
+(following x their following) rows per request. Instead each process
+keeps a compact adjacency structure in compressed sparse row form: one
+`array('l')` of offsets indexed by user id and one of followed ids sorted
+by follower, about 8 bytes per follow edge and no per-edge Python objects.
+Walking two hops is then pure array slicing.
+
+The graph is rebuilt from one covering-index scan of `follows` at most
+every `FOLLOW_GRAPH_TTL` seconds, lazily by the first request that finds
+it stale while other requests keep using the previous copy. Suggestions
+seed from the viewer's live following list, so follows made since the
+last rebuild shape (and are excluded from) their suggestions right away.
+"""
+
+from __future__ import annotations
+
+import heapq
+import threading
+import time
+from array import array
+from collections import Counter
+
+from flask import current_app
+from sqlalchemy import select
+
+from extensions import db
+
+# Second-hop neighbours read per followed user, so following a prolific
+# account can't make one request walk a huge adjacency list
+MAX_NEIGHBOURS = 500
+
+
+class FollowGraph:
+    """Immutable CSR snapshot of follower -> followed edges."""
+
+    def __init__(self, offsets: array, targets: array, built_at: float):
+        self.offsets = offsets
+        self.targets = targets
+        self.built_at = built_at
+
+    @classmethod
+    def build(cls) -> FollowGraph:
+        from models import Follow
+
+        rows = db.session.execute(
+            select(Follow.follower_id, Follow.followed_id).order_by(Follow.follower_id, Follow.followed_id)
+        )
+        offsets = array("l", [0])
+        targets = array("l")
+        current = 0
+        for follower_id, followed_id in rows:
+            while current < follower_id:
+                offsets.append(len(targets))
+                current += 1
+            targets.append(followed_id)
+        offsets.append(len(targets))
+        return cls(offsets, targets, time.monotonic())
+
+    def following(self, user_id: int, limit: int | None = None) -> array:
+        if user_id + 1 >= len(self.offsets):
+            return array("l")
+        start, end = self.offsets[user_id], self.offsets[user_id + 1]
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.targets[start:end]
+
+    def friends_of_friends(self, user_id: int, following) -> Counter:
+        """Count, per candidate, how many of `following` follow them."""
+        excluded = set(following)
+        excluded.add(user_id)
+        counts = Counter()
+        for followed_id in following:
+            for candidate in self.following(followed_id, MAX_NEIGHBOURS):
+                if candidate not in excluded:
+                    counts[candidate] += 1
+        return counts
+
+
+_lock = threading.Lock()
+_rebuilding = False
+
+
+def get_follow_graph() -> FollowGraph:
+    """The current snapshot, rebuilding it first if none exists yet.
+
+    A stale snapshot is rebuilt by exactly one caller; concurrent callers
+    keep using the old one meanwhile.
+    """
+    global _rebuilding
+    extensions = current_app.extensions
+    graph = extensions.get("follow_graph")
+    ttl = current_app.config.get("FOLLOW_GRAPH_TTL", 600)
+    if graph is not None and time.monotonic() - graph.built_at < ttl:
+        return graph
+
+    with _lock:
+        if graph is not None and _rebuilding:
+            return graph
+        _rebuilding = True
+    try:
+        graph = extensions["follow_graph"] = FollowGraph.build()
+    finally:
+        with _lock:
+            _rebuilding = False
+    return graph
+
+
+def suggest_users(user_id: int, limit: int) -> tuple[list[tuple[int, int]], list[int]]:
+    """Friends-of-friends of `user_id`, most shared follows first.
+
+    Returns `(up to limit (candidate_id, mutual_count) pairs, ids the user
+    already follows)`.
+    """
+    from models import Follow
+
+    following = db.session.scalars(select(Follow.followed_id).where(Follow.follower_id == user_id)).all()
+    counts = get_follow_graph().friends_of_friends(user_id, following)
+    return heapq.nsmallest(limit, counts.items(), key=lambda item: (-item[1], item[0])), following
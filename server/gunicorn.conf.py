@@ -0,0 +1,74 @@
+"""
+gunicorn settings for production.
+
+Usage (from Agrilink/server):
+  gunicorn -c gunicorn.conf.py wsgi:app
+
+Workers are threaded (`gthread`): requests mostly wait on Postgres, so a
+few threads per process serve more requests per MB than extra processes.
+Each worker gets `DB_POOL_SIZE` threads, so every thread can hold a pooled
+connection without queueing, and the worker count is the smaller of
+2 x CPUs + 1 and what fits in `DB_MAX_CONNECTIONS` at
+`DB_POOL_SIZE + DB_MAX_OVERFLOW` connections per worker. `WEB_CONCURRENCY`
+and `GUNICORN_THREADS` override both. Startup fails if `CACHE_BACKEND` is
+`memory` with more than one worker.
+
+The app is imported once in the master (`preload_app`) and forked, which
+halves startup time and memory per worker; `post_fork` drops any database
+connections inherited from the master. `kill -HUP <master>` re-reads this
+file and replaces workers gracefully, finishing in-flight requests (up to
+`graceful_timeout`); because the code is preloaded, deploy new code with
+`kill -USR2 <master>` (starts a new master) then `kill -QUIT <old master>`.
+"""
+
+import os
+
+from config import Config
+
+_cpus = os.cpu_count() or 1
+_connections_per_worker = Config.DB_POOL_SIZE + Config.DB_MAX_OVERFLOW
+
+bind = os.getenv("GUNICORN_BIND", f"{os.getenv('FLASK_HOST', '0.0.0.0')}:{os.getenv('FLASK_PORT', 5000)}")
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", Config.DB_POOL_SIZE))
+workers = int(os.getenv(
+    "WEB_CONCURRENCY",
+    max(1, min(2 * _cpus + 1, Config.DB_MAX_CONNECTIONS // _connections_per_worker)),
+))
+
+preload_app = True
+# Seconds a worker may stay silent before it is killed and replaced (gthread
+# heartbeats from its main thread, so long-lived message streams are fine)
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to cap memory growth; jitter avoids all
+# of them restarting at once
+max_requests = 5000
+max_requests_jitter = 500
+
+if os.path.isdir("/dev/shm"):
+    # Heartbeat files on tmpfs, so a slow disk can't stall workers
+    worker_tmp_dir = "/dev/shm"
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    # Per-process caches would miss other workers' invalidations
+    if Config.CACHE_BACKEND == "memory" and server.cfg.workers > 1:
+        raise RuntimeError(
+            "CACHE_BACKEND=memory cannot be used with more than one worker; "
+            "use filesystem or redis"
+        )
+
+
+def post_fork(server, worker):
+    from extensions import db
+    from wsgi import app
+
+    with app.app_context():
+        # Pooled connections must not be shared with the master or siblings
+        db.engine.dispose(close=False)
@@ -0,0 +1,89 @@
+"""
+Password hashing off the request thread.
+
+scrypt/pbkdf2 are deliberately CPU-heavy, so a burst of logins or
+registrations can pin every worker. Hashes are computed in a small process
+pool instead, and at most `PASSWORD_HASH_MAX_PENDING` hash jobs may be in
+flight per server process; callers that cannot get a slot within
+`PASSWORD_HASH_QUEUE_TIMEOUT` seconds get `HashingBusy` (503 from the auth
+blueprint) instead of queueing forever.
+
+`PASSWORD_HASH_METHOD` is any Werkzeug method string, e.g.
+`scrypt:32768:8:1` or `pbkdf2:sha256:1000000`. Stored hashes created with
+other parameters are upgraded transparently at the next successful login.
+Set `PASSWORD_HASH_WORKERS = 0` to hash inline (tests, tiny deployments).
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+_executor: ProcessPoolExecutor | None = None
+_executor_workers = 0
+_slots: threading.BoundedSemaphore | None = None
+_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    """Raised when no hashing slot frees up within the queue timeout."""
+
+
+def _pool() -> tuple[ProcessPoolExecutor | None, threading.BoundedSemaphore]:
+    global _executor, _executor_workers, _slots
+    workers = current_app.config.get("PASSWORD_HASH_WORKERS", 2)
+    with _lock:
+        if _slots is None or workers != _executor_workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = (
+                ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+                if workers else None
+            )
+            _executor_workers = workers
+            _slots = threading.BoundedSemaphore(
+                current_app.config.get("PASSWORD_HASH_MAX_PENDING", 8)
+            )
+        return _executor, _slots
+
+
+def _run(func, *args):
+    executor, slots = _pool()
+    timeout = current_app.config.get("PASSWORD_HASH_QUEUE_TIMEOUT", 5.0)
+    if not slots.acquire(timeout=timeout):
+        raise HashingBusy()
+    try:
+        if executor is None:
+            return func(*args)
+        return executor.submit(func, *args).result()
+    finally:
+        slots.release()
+
+
+def hash_password(password: str) -> str:
+    """Hash `password` with the configured method."""
+    method = current_app.config.get("PASSWORD_HASH_METHOD", "scrypt")
+    return _run(generate_password_hash, password, method)
+
+
+def verify_password(pwhash: str, password: str) -> bool:
+    """Check `password` against a stored Werkzeug hash."""
+    return _run(check_password_hash, pwhash, password)
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method: str) -> str:
+    # Werkzeug expands defaults ("scrypt" -> "scrypt:32768:8:1"), so derive
+    # the canonical prefix from a real hash once per method.
+    return generate_password_hash("", method).split("$", 1)[0]
+
+
+def needs_rehash(pwhash: str) -> bool:
+    """Return True if `pwhash` was made with parameters other than the configured ones."""
+    method = current_app.config.get("PASSWORD_HASH_METHOD", "scrypt")
+    return pwhash.split("$", 1)[0] != _method_prefix(method)
@@ -0,0 +1,56 @@
+"""
+Fast JSON provider for API responses.
+
+Plugs orjson into Flask's `app.json`, so `jsonify()` and `request.get_json()`
+keep working unchanged while encoding runs in native code and writes the
+response body as bytes (no intermediate `str`). orjson serializes `UUID`
+and dataclasses natively, the same way Flask does. Dates and datetimes
+are passed through to Flask's default hook, which writes them as HTTP
+dates (as the default provider did, rather than orjson's ISO 8601), and
+so is anything else orjson can't encode, such as `Decimal`.
+
+Without orjson installed, this behaves exactly like Flask's default
+provider.
+"""
+
+from __future__ import annotations
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """`DefaultJSONProvider` backed by orjson when it is available."""
+
+    def _options(self, pretty: bool = False) -> int:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs) -> str:
+        # Callers passing stdlib json options get the stdlib encoder
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(
+            obj, default=self.default, option=self._options(pretty) | orjson.OPT_APPEND_NEWLINE
+        )
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,250 @@
+"""
+Image uploads: streaming ingestion, content-addressed storage and variants.
+
+Uploads are parsed from the request stream straight into a temporary file
+under `MEDIA_ROOT/tmp`, hashing (SHA-256) and counting bytes as they are
+written, so no upload is held in memory and one over
+`MEDIA_MAX_UPLOAD_BYTES` is cut off as soon as it crosses the limit.
+Pillow then checks that the file is a JPEG, PNG, WebP or GIF under
+`MEDIA_MAX_PIXELS`, and the file is renamed to
+`MEDIA_ROOT/<h[:2]>/<h[2:4]>/<h>.<ext>`. The same image uploaded twice is
+stored once.
+Resumable uploads (see uploads.py) end in the same `store_upload`.
+
+WebP variants at each of `MEDIA_VARIANT_WIDTHS` (never upscaled) and at
+full size, with EXIF orientation applied and metadata dropped, are rendered by an outbox job
+(see outbox.py) that hands the work to a process pool of
+`MEDIA_PROCESS_WORKERS`, so neither the request nor the job runner's
+thread spends CPU on it. `PostImage.variants` lists them once ready.
+
+Files are served by `GET /api/media/<name>` with Range support and, since
+a name never changes content, a one-year immutable `Cache-Control`. In
+production a proxy can serve `MEDIA_ROOT` directly at the same path.
+Blobs are never deleted, because other posts may share them.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from PIL import Image, ImageOps, UnidentifiedImageError
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import FormDataParser
+
+from cache import invalidate
+from extensions import db
+from outbox import subscriber
+
+# Pillow format -> (file extension, MIME type)
+FORMATS = {
+    "JPEG": ("jpg", "image/jpeg"),
+    "PNG": ("png", "image/png"),
+    "WEBP": ("webp", "image/webp"),
+    "GIF": ("gif", "image/gif"),
+}
+VARIANT_QUALITY = 80
+
+# <sha256>.<ext> for originals, <sha256>_<width>.webp for variants
+NAME = re.compile(r"^(?P<hash>[0-9a-f]{64})(?:_\d+)?\.(?:jpg|png|webp|gif)$")
+
+_executor: ProcessPoolExecutor | None = None
+_executor_workers = 0
+_lock = threading.Lock()
+
+
+class InvalidImage(ValueError):
+    """The upload is not an accepted image."""
+
+
+class _HashingFile:
+    """Temporary file that hashes and size-checks everything written to it."""
+
+    def __init__(self, directory: str, limit: int):
+        self._file = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+        self.name = self._file.name
+        self.limit = limit
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data) -> int:
+        self.size += len(data)
+        if self.size > self.limit:
+            raise RequestEntityTooLarge()
+        self.sha256.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+def media_root() -> str:
+    return current_app.config["MEDIA_ROOT"]
+
+
+def blob_path(name: str) -> str:
+    """Absolute path of a stored file name (original or variant)."""
+    return os.path.join(media_root(), name[:2], name[2:4], name)
+
+
+def parse_upload(request, field: str = "image"):
+    """Stream the multipart file `field` of `request` to a temporary file.
+
+    Returns the `_HashingFile`, or None if the field is missing. Other
+    parts are discarded; the temporary files of extra file parts are removed.
+    """
+    limit = current_app.config.get("MEDIA_MAX_UPLOAD_BYTES", 10 * 1024 * 1024)
+    if request.content_length is not None and request.content_length > limit + 64 * 1024:
+        raise RequestEntityTooLarge()
+    spool = os.path.join(media_root(), "tmp")
+    os.makedirs(spool, exist_ok=True)
+    created = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        created.append(_HashingFile(spool, limit))
+        return created[-1]
+
+    try:
+        _stream, _form, files = FormDataParser(
+            stream_factory=stream_factory, max_form_memory_size=64 * 1024, max_form_parts=10,
+        ).parse(request.stream, request.mimetype, request.content_length, request.mimetype_params)
+    except Exception:
+        for upload in created:
+            upload.close()
+            os.unlink(upload.name)
+        raise
+
+    upload = files[field].stream if field in files else None
+    for other in created:
+        other.close()
+        if other is not upload:
+            os.unlink(other.name)
+    return upload
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file on disk, read in blocks."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def store_upload(path: str, content_hash: str, size: int) -> dict:
+    """Validate an uploaded file and move it into content-addressed storage.
+
+    `path` is consumed either way. Returns the image's metadata; raises
+    InvalidImage if it is not an accepted image.
+    """
+    try:
+        try:
+            with Image.open(path) as image:
+                image_format = image.format
+                width, height = image.size
+                image.verify()
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as exc:
+            raise InvalidImage("not a valid image") from exc
+        if image_format not in FORMATS:
+            raise InvalidImage(f"unsupported image format {image_format}")
+        if width * height > current_app.config.get("MEDIA_MAX_PIXELS", 40_000_000):
+            raise InvalidImage("image dimensions too large")
+    except InvalidImage:
+        os.unlink(path)
+        raise
+
+    extension, mime_type = FORMATS[image_format]
+    name = f"{content_hash}.{extension}"
+    target = blob_path(name)
+    if os.path.exists(target):
+        os.unlink(path)  # already stored
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.chmod(path, 0o644)
+        os.replace(path, target)
+    return {
+        "url": media_url(name),
+        "content_hash": content_hash,
+        "mime_type": mime_type,
+        "size_bytes": size,
+        "width": width,
+        "height": height,
+    }
+
+
+def media_url(name: str) -> str:
+    return f"{current_app.config.get('MEDIA_URL_PREFIX', '/api/media')}/{name}"
+
+
+def original_name(content_hash: str, mime_type: str) -> str:
+    extension = next(ext for ext, mime in FORMATS.values() if mime == mime_type)
+    return f"{content_hash}.{extension}"
+
+
+def render_variants(source: str, directory: str, content_hash: str, widths: list[int]) -> list[dict]:
+    """Write WebP variants of `source` at each of `widths` narrower than it,
+    plus one at its own size; returns their metadata.
+
+    Runs in a pool process. Variants already on disk are reused.
+    """
+    variants = []
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+        for width in sorted({width for width in widths if width < image.width} | {image.width}):
+            height = max(1, round(image.height * width / image.width))
+            name = f"{content_hash}_{width}.webp"
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                resized = image.resize((width, height), Image.Resampling.LANCZOS)
+                fd, tmp = tempfile.mkstemp(dir=directory)
+                with os.fdopen(fd, "wb") as fh:
+                    resized.save(fh, "WEBP", quality=VARIANT_QUALITY, method=4)
+                os.chmod(tmp, 0o644)
+                os.replace(tmp, path)
+            variants.append({"name": name, "width": width, "height": height})
+    return variants
+
+
+def _pool() -> ProcessPoolExecutor | None:
+    global _executor, _executor_workers
+    workers = current_app.config.get("MEDIA_PROCESS_WORKERS", 2)
+    with _lock:
+        if workers != _executor_workers or (workers and _executor is None):
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = (
+                ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+                if workers else None
+            )
+            _executor_workers = workers
+        return _executor
+
+
+@subscriber("post_image.uploaded")
+def generate_variants(image_id: int) -> None:
+    """Render an uploaded image's variants and record them on the PostImage."""
+    from models import PostImage
+
+    image = db.session.get(PostImage, image_id)
+    if image is None or image.content_hash is None:
+        return
+    source = blob_path(original_name(image.content_hash, image.mime_type))
+    args = (source, os.path.dirname(source), image.content_hash, current_app.config.get("MEDIA_VARIANT_WIDTHS", []))
+    executor = _pool()
+    variants = render_variants(*args) if executor is None else executor.submit(render_variants, *args).result()
+    image.variants = [
+        {"url": media_url(variant["name"]), "width": variant["width"], "height": variant["height"]}
+        for variant in variants
+    ]
+    # Commit here (the job's deletion follows separately; re-running is
+    # harmless) so the cached post is only dropped once the variants are visible
+    db.session.commit()
+    invalidate(f"post:{image.post_id}")
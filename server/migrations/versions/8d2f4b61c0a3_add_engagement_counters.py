@@ -0,0 +1,61 @@
+"""Add denormalized engagement counters
+
+Revision ID: 8d2f4b61c0a3
+Revises: 56c7f3c212fa
+Create Date: 2026-10-18 09:12:40.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f4b61c0a3'
+down_revision = '56c7f3c212fa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('likes_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('comments_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('communities', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('members_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('posts_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('followers_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('following_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from existing rows
+    op.execute(
+        "UPDATE posts SET "
+        "likes_count = (SELECT COUNT(*) FROM likes WHERE likes.post_id = posts.id), "
+        "comments_count = (SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id)"
+    )
+    op.execute(
+        "UPDATE communities SET "
+        "members_count = (SELECT COUNT(*) FROM community_memberships m WHERE m.community_id = communities.id), "
+        "posts_count = (SELECT COUNT(*) FROM posts WHERE posts.community_id = communities.id)"
+    )
+    op.execute(
+        "UPDATE users SET "
+        "followers_count = (SELECT COUNT(*) FROM follows WHERE follows.followed_id = users.id), "
+        "following_count = (SELECT COUNT(*) FROM follows WHERE follows.follower_id = users.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('following_count')
+        batch_op.drop_column('followers_count')
+
+    with op.batch_alter_table('communities', schema=None) as batch_op:
+        batch_op.drop_column('posts_count')
+        batch_op.drop_column('members_count')
+
+    with op.batch_alter_table('posts', schema=None) as batch_op:
+        batch_op.drop_column('comments_count')
+        batch_op.drop_column('likes_count')
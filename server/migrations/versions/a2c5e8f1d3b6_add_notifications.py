@@ -0,0 +1,46 @@
+"""Add aggregated notifications
+
+Revision ID: a2c5e8f1d3b6
+Revises: f4b8d2e7c5a9
+Create Date: 2026-10-18 20:58:04.116592
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2c5e8f1d3b6'
+down_revision = 'f4b8d2e7c5a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'notifications',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('target_id', sa.Integer(), nullable=False),
+        sa.Column('window_start', sa.DateTime(), nullable=False),
+        sa.Column('count', sa.Integer(), server_default='1', nullable=False),
+        sa.Column('last_actor_id', sa.Integer(), nullable=True),
+        sa.Column('last_event_at', sa.DateTime(), nullable=False),
+        sa.Column('read_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['last_actor_id'], ['users.id'], ondelete='SET NULL'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'kind', 'target_id', 'window_start', name='unique_notification_window'),
+    )
+    op.create_index(
+        'ix_notifications_user_id_last_event_at_id', 'notifications', ['user_id', 'last_event_at', 'id'],
+    )
+    op.create_index('ix_notifications_user_id_read_at', 'notifications', ['user_id', 'read_at'])
+
+
+def downgrade():
+    op.drop_index('ix_notifications_user_id_read_at', table_name='notifications')
+    op.drop_index('ix_notifications_user_id_last_event_at_id', table_name='notifications')
+    op.drop_table('notifications')
@@ -0,0 +1,84 @@
+"""Add full-text search indexes
+
+Revision ID: a8d3f5c2e914
+Revises: f1a6c3e8d027
+Create Date: 2026-10-18 15:12:40.618273
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d3f5c2e914'
+down_revision = 'f1a6c3e8d027'
+branch_labels = None
+depends_on = None
+
+
+# table -> [(column, weight), ...], as in search.INDEXED
+INDEXED = {
+    'posts': [('title', 'A'), ('content', 'B')],
+    'communities': [('name', 'A'), ('description', 'B')],
+    'users': [('username', 'A'), ('bio', 'B')],
+    'messages': [('content', 'A')],
+}
+
+
+def _upgrade_postgresql():
+    for table, columns in INDEXED.items():
+        vector = ' || '.join(
+            f"setweight(to_tsvector('english', coalesce({name}, '')), '{weight}')"
+            for name, weight in columns
+        )
+        # Generated columns are filled for existing rows when added
+        op.execute(
+            f'ALTER TABLE {table} ADD COLUMN search_vector tsvector '
+            f'GENERATED ALWAYS AS ({vector}) STORED'
+        )
+    with op.get_context().autocommit_block():
+        for table in INDEXED:
+            op.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_search_vector '
+                f'ON {table} USING GIN (search_vector)'
+            )
+
+
+def _upgrade_sqlite():
+    for table, columns in INDEXED.items():
+        fts = f'{table}_fts'
+        cols = ', '.join(name for name, _weight in columns)
+        new_values = ', '.join(f'new.{name}' for name, _weight in columns)
+        old_values = ', '.join(f'old.{name}' for name, _weight in columns)
+        delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values});"
+        insert = f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values});'
+        op.execute(
+            f'CREATE VIRTUAL TABLE {fts} USING fts5({cols}, '
+            f"content='{table}', content_rowid='id', tokenize='porter unicode61')"
+        )
+        op.execute(f'CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN {insert} END')
+        op.execute(f'CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN {delete} END')
+        op.execute(
+            f'CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {table} '
+            f'BEGIN {delete} {insert} END'
+        )
+        op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        _upgrade_postgresql()
+    elif dialect == 'sqlite':
+        _upgrade_sqlite()
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table in INDEXED:
+        if dialect == 'postgresql':
+            op.execute(f'DROP INDEX IF EXISTS ix_{table}_search_vector')
+            op.execute(f'ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector')
+        elif dialect == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{suffix}')
+            op.execute(f'DROP TABLE IF EXISTS {table}_fts')
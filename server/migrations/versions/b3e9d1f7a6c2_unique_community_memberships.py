@@ -0,0 +1,47 @@
+"""Make community memberships unique per user and community
+
+Revision ID: b3e9d1f7a6c2
+Revises: a8d3f5c2e914
+Create Date: 2026-10-18 17:40:22.184519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e9d1f7a6c2'
+down_revision = 'a8d3f5c2e914'
+branch_labels = None
+depends_on = None
+
+
+INDEX = 'ix_community_memberships_community_id_user_id'
+
+
+def upgrade():
+    # Joins used to be SELECT-then-INSERT, so double taps may have left
+    # duplicates; keep the earliest membership of each pair.
+    op.execute(sa.text(
+        """
+        DELETE FROM community_memberships
+        WHERE id NOT IN (
+            SELECT min(id) FROM community_memberships GROUP BY community_id, user_id
+        )
+        """
+    ))
+    op.execute(sa.text(
+        """
+        UPDATE communities SET members_count = (
+            SELECT count(*) FROM community_memberships
+            WHERE community_memberships.community_id = communities.id
+        )
+        """
+    ))
+    op.drop_index(INDEX, table_name='community_memberships')
+    op.create_index(INDEX, 'community_memberships', ['community_id', 'user_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index(INDEX, table_name='community_memberships')
+    op.create_index(INDEX, 'community_memberships', ['community_id', 'user_id'], unique=False)
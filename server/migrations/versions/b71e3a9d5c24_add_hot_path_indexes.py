@@ -0,0 +1,53 @@
+"""Add indexes for hot foreign-key and sort paths
+
+Revision ID: b71e3a9d5c24
+Revises: 8d2f4b61c0a3
+Create Date: 2026-10-18 10:05:11.730912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71e3a9d5c24'
+down_revision = '8d2f4b61c0a3'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_posts_created_at_id', 'posts', ['created_at', 'id']),
+    ('ix_posts_community_id_created_at_id', 'posts', ['community_id', 'created_at', 'id']),
+    ('ix_posts_author_id', 'posts', ['author_id']),
+    ('ix_post_images_post_id', 'post_images', ['post_id']),
+    ('ix_likes_post_id', 'likes', ['post_id']),
+    ('ix_comments_post_id', 'comments', ['post_id']),
+    ('ix_follows_followed_id', 'follows', ['followed_id']),
+    ('ix_community_memberships_community_id_user_id', 'community_memberships', ['community_id', 'user_id']),
+    ('ix_messages_sender_id_receiver_id_created_at_id', 'messages', ['sender_id', 'receiver_id', 'created_at', 'id']),
+    ('ix_messages_receiver_id_created_at_id', 'messages', ['receiver_id', 'created_at', 'id']),
+    ('ix_messages_community_id_created_at_id', 'messages', ['community_id', 'created_at', 'id']),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction on Postgres;
+    # building outside one keeps the tables writable while indexes build.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _columns in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table,
+                if_exists=True,
+                postgresql_concurrently=True,
+            )
@@ -0,0 +1,36 @@
+"""Add uploaded image metadata to post_images
+
+Revision ID: b8d3f6a2c4e1
+Revises: a2c5e8f1d3b6
+Create Date: 2026-10-18 22:14:37.508213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d3f6a2c4e1'
+down_revision = 'a2c5e8f1d3b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post_images', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('mime_type', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('size_bytes', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('width', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('height', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('variants', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('post_images', schema=None) as batch_op:
+        batch_op.drop_column('variants')
+        batch_op.drop_column('height')
+        batch_op.drop_column('width')
+        batch_op.drop_column('size_bytes')
+        batch_op.drop_column('mime_type')
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,41 @@
+"""Add resumable upload sessions
+
+Revision ID: c3e7a1d5f9b2
+Revises: b8d3f6a2c4e1
+Create Date: 2026-10-18 23:02:51.377460
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e7a1d5f9b2'
+down_revision = 'b8d3f6a2c4e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'upload_sessions',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('image_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['image_id'], ['post_images.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_upload_sessions_user_id_expires_at', 'upload_sessions', ['user_id', 'expires_at'])
+    op.create_index('ix_upload_sessions_expires_at', 'upload_sessions', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_upload_sessions_expires_at', table_name='upload_sessions')
+    op.drop_index('ix_upload_sessions_user_id_expires_at', table_name='upload_sessions')
+    op.drop_table('upload_sessions')
@@ -0,0 +1,59 @@
+"""Add timeline_entries for the home feed
+
+Revision ID: c4a9e07b3f18
+Revises: b71e3a9d5c24
+Create Date: 2026-10-18 11:20:47.104552
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a9e07b3f18'
+down_revision = 'b71e3a9d5c24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('timeline_entries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'post_id', name='unique_timeline_user_post')
+    )
+    with op.batch_alter_table('timeline_entries', schema=None) as batch_op:
+        batch_op.create_index('ix_timeline_entries_user_id_created_at_post_id', ['user_id', 'created_at', 'post_id'], unique=False)
+        batch_op.create_index('ix_timeline_entries_post_id', ['post_id'], unique=False)
+
+    with op.batch_alter_table('community_memberships', schema=None) as batch_op:
+        batch_op.create_index('ix_community_memberships_user_id', ['user_id'], unique=False)
+
+    # Deliver existing posts to their current audiences
+    op.execute(
+        "INSERT INTO timeline_entries (user_id, post_id, created_at) "
+        "SELECT audience.user_id, posts.id, posts.created_at FROM posts JOIN ("
+        "  SELECT posts.id AS post_id, posts.author_id AS user_id FROM posts"
+        "  UNION SELECT posts.id, follows.follower_id FROM posts"
+        "    JOIN follows ON follows.followed_id = posts.author_id"
+        "  UNION SELECT posts.id, m.user_id FROM posts"
+        "    JOIN community_memberships m ON m.community_id = posts.community_id"
+        ") audience ON audience.post_id = posts.id "
+        "WHERE posts.created_at IS NOT NULL"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('community_memberships', schema=None) as batch_op:
+        batch_op.drop_index('ix_community_memberships_user_id')
+
+    with op.batch_alter_table('timeline_entries', schema=None) as batch_op:
+        batch_op.drop_index('ix_timeline_entries_post_id')
+        batch_op.drop_index('ix_timeline_entries_user_id_created_at_post_id')
+
+    op.drop_table('timeline_entries')
@@ -0,0 +1,53 @@
+"""Add indexes for paginated follow lists and suggestions
+
+Revision ID: c7f2a9e4d1b5
+Revises: b3e9d1f7a6c2
+Create Date: 2026-10-18 18:25:09.402716
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7f2a9e4d1b5'
+down_revision = 'b3e9d1f7a6c2'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_follows_followed_id_created_at_id', 'follows', ['followed_id', 'created_at', 'id']),
+    ('ix_follows_follower_id_created_at_id', 'follows', ['follower_id', 'created_at', 'id']),
+    ('ix_users_followers_count_id', 'users', ['followers_count', 'id']),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+            )
+        # Superseded by ix_follows_followed_id_created_at_id (same leading column)
+        op.drop_index(
+            'ix_follows_followed_id', table_name='follows',
+            if_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_follows_followed_id', 'follows', ['followed_id'],
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+        for name, table, _columns in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table,
+                if_exists=True,
+                postgresql_concurrently=True,
+            )
@@ -0,0 +1,33 @@
+"""Stop copying community channel recency to participant rows
+
+Revision ID: d4f8b2a6e0c3
+Revises: c3e7a1d5f9b2
+Create Date: 2026-10-19 09:41:12.286104
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f8b2a6e0c3'
+down_revision = 'c3e7a1d5f9b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Community channels are now ordered by conversations.last_message_at
+    op.execute(
+        "UPDATE conversation_participants SET last_message_at = NULL "
+        "WHERE conversation_id IN (SELECT id FROM conversations WHERE kind = 'community')"
+    )
+
+
+def downgrade():
+    op.execute(
+        "UPDATE conversation_participants SET last_message_at = "
+        "(SELECT c.last_message_at FROM conversations c "
+        "WHERE c.id = conversation_participants.conversation_id) "
+        "WHERE conversation_id IN (SELECT id FROM conversations WHERE kind = 'community')"
+    )
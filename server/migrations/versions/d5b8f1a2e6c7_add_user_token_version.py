@@ -0,0 +1,26 @@
+"""Add users.token_version for session claim revocation
+
+Revision ID: d5b8f1a2e6c7
+Revises: c4a9e07b3f18
+Create Date: 2026-10-18 12:02:19.447310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5b8f1a2e6c7'
+down_revision = 'c4a9e07b3f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token_version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('token_version')
@@ -0,0 +1,68 @@
+"""Add expert role, engagement score and expert listing indexes
+
+Revision ID: d9e4b2c8a1f3
+Revises: c7f2a9e4d1b5
+Create Date: 2026-10-18 19:02:47.551830
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9e4b2c8a1f3'
+down_revision = 'c7f2a9e4d1b5'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_users_role_id_engagement_score_id', 'users', ['role_id', 'engagement_score', 'id']),
+    ('ix_users_role_id_location_engagement_score_id', 'users', ['role_id', 'location', 'engagement_score', 'id']),
+    ('ix_comments_user_id', 'comments', ['user_id']),
+]
+
+
+def upgrade():
+    op.execute(sa.text(
+        "INSERT INTO roles (name) SELECT 'expert' WHERE NOT EXISTS (SELECT 1 FROM roles WHERE name = 'expert')"
+    ))
+    # Legacy rows only carry the role string; point them at the matching role
+    op.execute(sa.text(
+        """
+        UPDATE users SET role_id = (SELECT roles.id FROM roles WHERE roles.name = users.role)
+        WHERE role_id IS NULL
+        """
+    ))
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('engagement_score', sa.Integer(), server_default='0', nullable=False))
+    op.create_table(
+        'job_state',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('position', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    # Scores start at 0; the first `flask refresh-engagement` run fills them in
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns,
+                if_not_exists=True,
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _columns in reversed(INDEXES):
+            op.drop_index(
+                name, table_name=table,
+                if_exists=True,
+                postgresql_concurrently=True,
+            )
+    op.drop_table('job_state')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('engagement_score')
+    # The expert role and backfilled role_ids are left in place
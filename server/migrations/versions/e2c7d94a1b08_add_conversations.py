@@ -0,0 +1,102 @@
+"""Add conversations and conversation_participants
+
+Revision ID: e2c7d94a1b08
+Revises: d5b8f1a2e6c7
+Create Date: 2026-10-18 13:41:06.281937
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2c7d94a1b08'
+down_revision = 'd5b8f1a2e6c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('conversations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('user_a_id', sa.Integer(), nullable=True),
+    sa.Column('user_b_id', sa.Integer(), nullable=True),
+    sa.Column('community_id', sa.Integer(), nullable=True),
+    sa.Column('last_message_id', sa.Integer(), nullable=True),
+    sa.Column('last_message_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['community_id'], ['communities.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['last_message_id'], ['messages.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_a_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['user_b_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('community_id', name='unique_conversation_community'),
+    sa.UniqueConstraint('user_a_id', 'user_b_id', name='unique_conversation_users')
+    )
+    op.create_table('conversation_participants',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('conversation_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('last_message_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['conversation_id'], ['conversations.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('conversation_id', 'user_id', name='unique_conversation_participant')
+    )
+    with op.batch_alter_table('conversation_participants', schema=None) as batch_op:
+        batch_op.create_index('ix_conversation_participants_user_id_last_message_at', ['user_id', 'last_message_at', 'conversation_id'], unique=False)
+
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('conversation_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_messages_conversation_id', 'conversations', ['conversation_id'], ['id'])
+        batch_op.create_index('ix_messages_conversation_id_id', ['conversation_id', 'id'], unique=False)
+
+    # Backfill threads from existing messages and memberships
+    op.execute(
+        "INSERT INTO conversations (kind, user_a_id, user_b_id) "
+        "SELECT DISTINCT 'direct', "
+        "CASE WHEN sender_id < receiver_id THEN sender_id ELSE receiver_id END, "
+        "CASE WHEN sender_id < receiver_id THEN receiver_id ELSE sender_id END "
+        "FROM messages WHERE receiver_id IS NOT NULL"
+    )
+    op.execute(
+        "INSERT INTO conversations (kind, community_id) "
+        "SELECT 'community', id FROM communities"
+    )
+    op.execute(
+        "UPDATE messages SET conversation_id = (SELECT c.id FROM conversations c WHERE "
+        "(messages.community_id IS NOT NULL AND c.community_id = messages.community_id) OR "
+        "(messages.community_id IS NULL AND "
+        " c.user_a_id = CASE WHEN messages.sender_id < messages.receiver_id THEN messages.sender_id ELSE messages.receiver_id END AND "
+        " c.user_b_id = CASE WHEN messages.sender_id < messages.receiver_id THEN messages.receiver_id ELSE messages.sender_id END))"
+    )
+    op.execute(
+        "UPDATE conversations SET last_message_id = "
+        "(SELECT MAX(m.id) FROM messages m WHERE m.conversation_id = conversations.id)"
+    )
+    op.execute(
+        "UPDATE conversations SET last_message_at = "
+        "(SELECT m.created_at FROM messages m WHERE m.id = conversations.last_message_id)"
+    )
+    op.execute(
+        "INSERT INTO conversation_participants (conversation_id, user_id, last_message_at) "
+        "SELECT id, user_a_id, last_message_at FROM conversations WHERE kind = 'direct' "
+        "UNION SELECT id, user_b_id, last_message_at FROM conversations WHERE kind = 'direct' "
+        "UNION SELECT c.id, m.user_id, c.last_message_at FROM conversations c "
+        "JOIN community_memberships m ON m.community_id = c.community_id"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_messages_conversation_id_id')
+        batch_op.drop_constraint('fk_messages_conversation_id', type_='foreignkey')
+        batch_op.drop_column('conversation_id')
+
+    with op.batch_alter_table('conversation_participants', schema=None) as batch_op:
+        batch_op.drop_index('ix_conversation_participants_user_id_last_message_at')
+
+    op.drop_table('conversation_participants')
+    op.drop_table('conversations')
@@ -0,0 +1,42 @@
+"""Add materialized trending scores for posts
+
+Revision ID: e6a1c4f9b2d7
+Revises: d9e4b2c8a1f3
+Create Date: 2026-10-18 19:41:15.208364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a1c4f9b2d7'
+down_revision = 'd9e4b2c8a1f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # New and empty, so the indexes are built with the table; the first
+    # `flask refresh-trending` run fills it from the last week's activity
+    op.create_table(
+        'post_trending_scores',
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('community_id', sa.Integer(), nullable=True),
+        sa.Column('score', sa.Float(), server_default='0', nullable=False),
+        sa.Column('last_engaged_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['community_id'], ['communities.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('post_id'),
+    )
+    op.create_index('ix_post_trending_scores_score_post_id', 'post_trending_scores', ['score', 'post_id'])
+    op.create_index(
+        'ix_post_trending_scores_community_id_score_post_id', 'post_trending_scores',
+        ['community_id', 'score', 'post_id'],
+    )
+
+
+def downgrade():
+    op.drop_index('ix_post_trending_scores_community_id_score_post_id', table_name='post_trending_scores')
+    op.drop_index('ix_post_trending_scores_score_post_id', table_name='post_trending_scores')
+    op.drop_table('post_trending_scores')
@@ -0,0 +1,47 @@
+"""Count community channel unread messages at read time
+
+Revision ID: e7a2c9f4b1d8
+Revises: d4f8b2a6e0c3
+Create Date: 2026-10-19 10:26:48.903517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a2c9f4b1d8'
+down_revision = 'd4f8b2a6e0c3'
+branch_labels = None
+depends_on = None
+
+COMMUNITY_PARTICIPANTS = (
+    "conversation_id IN (SELECT id FROM conversations WHERE kind = 'community')"
+)
+
+
+def upgrade():
+    # users.unread_messages_count now only counts direct messages
+    op.execute(
+        "UPDATE users SET unread_messages_count = unread_messages_count - "
+        "(SELECT COALESCE(SUM(p.unread_count), 0) FROM conversation_participants p "
+        "JOIN conversations c ON c.id = p.conversation_id "
+        "WHERE p.user_id = users.id AND c.kind = 'community')"
+    )
+    op.execute(f"UPDATE conversation_participants SET unread_count = 0 WHERE {COMMUNITY_PARTICIPANTS}")
+
+
+def downgrade():
+    op.execute(
+        "UPDATE conversation_participants SET unread_count = "
+        "(SELECT COUNT(*) FROM messages m "
+        "WHERE m.conversation_id = conversation_participants.conversation_id "
+        "AND m.id > COALESCE(conversation_participants.last_read_message_id, 0) "
+        "AND m.sender_id != conversation_participants.user_id) "
+        f"WHERE {COMMUNITY_PARTICIPANTS}"
+    )
+    op.execute(
+        "UPDATE users SET unread_messages_count = "
+        "(SELECT COALESCE(SUM(p.unread_count), 0) FROM conversation_participants p "
+        "WHERE p.user_id = users.id)"
+    )
@@ -0,0 +1,42 @@
+"""Add per-conversation read cursors and unread counters
+
+Revision ID: f1a6c3e8d027
+Revises: e2c7d94a1b08
+Create Date: 2026-10-18 14:27:52.913804
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a6c3e8d027'
+down_revision = 'e2c7d94a1b08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('conversation_participants', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_read_message_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('unread_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_messages_count', sa.Integer(), server_default='0', nullable=False))
+
+    # There was no read state before, so start every thread as read
+    # instead of flooding existing users with unread badges.
+    op.execute(
+        "UPDATE conversation_participants SET last_read_message_id = "
+        "(SELECT c.last_message_id FROM conversations c "
+        "WHERE c.id = conversation_participants.conversation_id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('unread_messages_count')
+
+    with op.batch_alter_table('conversation_participants', schema=None) as batch_op:
+        batch_op.drop_column('unread_count')
+        batch_op.drop_column('last_read_message_id')
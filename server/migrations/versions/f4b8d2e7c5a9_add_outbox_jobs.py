@@ -0,0 +1,37 @@
+"""Add outbox jobs table
+
+Revision ID: f4b8d2e7c5a9
+Revises: e6a1c4f9b2d7
+Create Date: 2026-10-18 20:16:38.730912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b8d2e7c5a9'
+down_revision = 'e6a1c4f9b2d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'outbox_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=200), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('status', sa.String(length=10), server_default='pending', nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('run_after', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_outbox_jobs_status_run_after_id', 'outbox_jobs', ['status', 'run_after', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_outbox_jobs_status_run_after_id', table_name='outbox_jobs')
+    op.drop_table('outbox_jobs')
@@ -2,7 +2,7 @@ from datetime import datetime
 
 from extensions import db
 
-from werkzeug.security import generate_password_hash, check_password_hash
+from hashing import hash_password, needs_rehash, verify_password
 
 
 class Role(db.Model):
@@ -38,11 +38,28 @@ class User(db.Model):
     bio = db.Column(db.Text)
     location = db.Column(db.String(100))
     profile_image_url = db.Column(db.String(255))
+    # Denormalized counters maintained by the follow handlers (see counters.py)
+    followers_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    following_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Bumped to revoke outstanding session claims (see session_claims.py)
+    token_version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    # Sum of the user's per-conversation unread counts (see conversations.py)
+    unread_messages_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Ranking for expert listings, refreshed by `refresh-engagement` (see engagement.py)
+    engagement_score = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
 
     role_obj = db.relationship("Role", backref="users")
 
+    __table_args__ = (
+        # Most-followed users (suggestion fallback)
+        db.Index("ix_users_followers_count_id", "followers_count", "id"),
+        # Expert listings, optionally narrowed to one location
+        db.Index("ix_users_role_id_engagement_score_id", "role_id", "engagement_score", "id"),
+        db.Index("ix_users_role_id_location_engagement_score_id", "role_id", "location", "engagement_score", "id"),
+    )
+
     def set_role_by_name(self, role_name: str) -> None:
         """
         Assign a Role by name.
@@ -57,6 +74,7 @@ class User(db.Model):
         self.role_id = role.id
         # Keep legacy column in sync for existing code paths.
         self.role = role_name
+        self.invalidate_sessions()
 
     posts = db.relationship("Post", backref="author", lazy=True)
     sent_messages = db.relationship("Message", foreign_keys="Message.sender_id", backref="sender")
@@ -69,13 +87,33 @@ class User(db.Model):
         # Fallback for legacy rows/code paths prior to role_id backfill.
         return self.role == "admin"
     
+    def invalidate_sessions(self) -> None:
+        """Revoke session claims issued before this change.
+
+        No-op for users that have not been saved yet.
+        """
+        if self.id is not None:
+            self.token_version = (self.token_version or 0) + 1
+
     def set_password(self, password: str) -> None:
         """Hash password using Werkzeug for secure storage."""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
+        self.invalidate_sessions()
 
     def check_password(self, password: str) -> bool:
         """Verify password against stored hash."""
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def rehash_password_if_needed(self, password: str) -> bool:
+        """Re-hash a just-verified password if its stored parameters are outdated.
+
+        Unlike set_password(), this keeps existing sessions valid.
+        Returns True if the hash was replaced.
+        """
+        if not needs_rehash(self.password_hash):
+            return False
+        self.password_hash = hash_password(password)
+        return True
 
     def to_dict(self, include_email=False) -> dict:
         data = {
@@ -85,6 +123,8 @@ class User(db.Model):
             "location": self.location,
             "profile_image_url": self.profile_image_url,
             "role": self.role,
+            "followers_count": self.followers_count,
+            "following_count": self.following_count,
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
         if include_email:
@@ -102,8 +142,12 @@ class Community(db.Model):
     description = db.Column(db.Text)
     image_url = db.Column(db.String(255))
     created_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    # Denormalized counters maintained by the join/leave and post handlers
+    members_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    posts_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    creator = db.relationship("User", foreign_keys=[created_by])
     members = db.relationship("CommunityMembership", backref="community", cascade="all, delete-orphan")
     posts = db.relationship("Post", backref="community", lazy=True)
     messages = db.relationship("Message", backref="community", lazy=True)
@@ -114,6 +158,8 @@ class Community(db.Model):
             "description": self.description, 
             "image_url": self.image_url, 
             "created_by": self.created_by, 
+            "members_count": self.members_count,
+            "posts_count": self.posts_count,
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
     def __repr__(self):
@@ -128,6 +174,11 @@ class CommunityMembership(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     user = db.relationship("User", backref="community_memberships")
+
+    __table_args__ = (
+        db.Index("ix_community_memberships_community_id_user_id", "community_id", "user_id", unique=True),
+        db.Index("ix_community_memberships_user_id", "user_id"),
+    )
      
     def to_dict(self): 
         return {
@@ -144,6 +195,9 @@ class Post(db.Model):
     community_id = db.Column(db.Integer, db.ForeignKey("communities.id"))
     title = db.Column(db.String(255))
     content = db.Column(db.Text, nullable=False)
+    # Denormalized counters maintained by the like/comment handlers
+    likes_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    comments_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
 
@@ -151,6 +205,12 @@ class Post(db.Model):
     likes = db.relationship("Like", backref="post", cascade="all, delete-orphan")
     comments = db.relationship("Comment", backref="post", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index("ix_posts_created_at_id", "created_at", "id"),
+        db.Index("ix_posts_community_id_created_at_id", "community_id", "created_at", "id"),
+        db.Index("ix_posts_author_id", "author_id"),
+    )
+
     def to_dict(self, include_relations=True): 
         data = { 
             "id": self.id, 
@@ -158,13 +218,13 @@ class Post(db.Model):
             "community_id": self.community_id,
             "title": self.title, 
             "content": self.content,
+            "likes_count": self.likes_count,
+            "comments_count": self.comments_count,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None, 
         }
         if include_relations:
             data["images"] = [img.to_dict() for img in self.images] 
-            data["likes_count"] = len(self.likes)
-            data["comments_count"] = len(self.comments)
         return data
     
     def __repr__(self):
@@ -176,14 +236,35 @@ class PostImage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), nullable=False)
     image_url = db.Column(db.String(255), nullable=False)
+    # Set for uploaded images (see media.py); NULL for client-supplied URLs
+    content_hash = db.Column(db.String(64))
+    mime_type = db.Column(db.String(50))
+    size_bytes = db.Column(db.Integer)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    # [{"url", "width", "height"}] WebP renditions, once generated
+    variants = db.Column(db.JSON)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index("ix_post_images_post_id", "post_id"),
+    )
+
     def to_dict(self): 
-        return { "id": self.id, 
+        data = { "id": self.id, 
                 "post_id": self.post_id,
                 "image_url": self.image_url, 
                 "created_at": self.created_at.isoformat() if self.created_at else None,
         }
+        if self.content_hash is not None:
+            data.update({
+                "mime_type": self.mime_type,
+                "size_bytes": self.size_bytes,
+                "width": self.width,
+                "height": self.height,
+                "variants": self.variants or [],
+            })
+        return data
 
 class Like(db.Model):
     __tablename__ = "likes"
@@ -197,6 +278,7 @@ class Like(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint("user_id", "post_id", name="unique_user_post_like"),
+        db.Index("ix_likes_post_id", "post_id"),
     )
     
     def to_dict(self): 
@@ -217,6 +299,11 @@ class Comment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     user = db.relationship("User", backref="comments")
+
+    __table_args__ = (
+        db.Index("ix_comments_post_id", "post_id"),
+        db.Index("ix_comments_user_id", "user_id"),
+    )
     
     def to_dict(self): 
         return { 
@@ -241,6 +328,8 @@ class Follow(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint("follower_id", "followed_id", name="unique_follow"),
+        db.Index("ix_follows_followed_id_created_at_id", "followed_id", "created_at", "id"),
+        db.Index("ix_follows_follower_id_created_at_id", "follower_id", "created_at", "id"),
     )
     
     def to_dict(self): 
@@ -258,16 +347,235 @@ class Message(db.Model):
     sender_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     receiver_id = db.Column(db.Integer, db.ForeignKey("users.id"))
     community_id = db.Column(db.Integer, db.ForeignKey("communities.id"))
+    conversation_id = db.Column(db.Integer, db.ForeignKey("conversations.id"))
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index("ix_messages_sender_id_receiver_id_created_at_id", "sender_id", "receiver_id", "created_at", "id"),
+        db.Index("ix_messages_receiver_id_created_at_id", "receiver_id", "created_at", "id"),
+        db.Index("ix_messages_community_id_created_at_id", "community_id", "created_at", "id"),
+        db.Index("ix_messages_conversation_id_id", "conversation_id", "id"),
+    )
+
     def to_dict(self): 
         return { 
             "id": self.id, 
             "sender_id": self.sender_id, 
             "receiver_id": self.receiver_id, 
             "community_id": self.community_id, 
+            "conversation_id": self.conversation_id,
             "content": self.content, 
             "created_at": self.created_at.isoformat() if self.created_at else None,
         }
-    
\ No newline at end of file
+    
+
+
+class Conversation(db.Model):
+    """A message thread: one per user pair and one per community channel.
+
+    Direct threads store the pair as (user_a_id, user_b_id) with
+    user_a_id <= user_b_id so each pair maps to exactly one row.
+    """
+    __tablename__ = "conversations"
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # direct | community
+    user_a_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    user_b_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    community_id = db.Column(db.Integer, db.ForeignKey("communities.id", ondelete="CASCADE"))
+    last_message_id = db.Column(db.Integer, db.ForeignKey("messages.id", ondelete="SET NULL", use_alter=True))
+    last_message_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    last_message = db.relationship("Message", foreign_keys=[last_message_id], post_update=True)
+
+    __table_args__ = (
+        db.UniqueConstraint("user_a_id", "user_b_id", name="unique_conversation_users"),
+        db.UniqueConstraint("community_id", name="unique_conversation_community"),
+    )
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "participant_ids": [self.user_a_id, self.user_b_id] if self.kind == "direct" else None,
+            "community_id": self.community_id,
+            "last_message": self.last_message.to_dict() if self.last_message else None,
+            "last_message_at": self.last_message_at.isoformat() if self.last_message_at else None,
+        }
+
+
+class ConversationParticipant(db.Model):
+    """One user's membership in a conversation.
+
+    For direct threads `last_message_at` mirrors the conversation's so a
+    user's direct threads are a single range read on (user_id,
+    last_message_at); it stays NULL for community channels, whose recency
+    is read from the conversation (see conversations.py). `last_read_message_id`
+    is the user's read cursor and `unread_count` the number of other
+    people's messages after it, kept in step by the message handlers.
+    """
+    __tablename__ = "conversation_participants"
+
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    last_message_at = db.Column(db.DateTime)
+    last_read_message_id = db.Column(db.Integer)
+    unread_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    conversation = db.relationship("Conversation")
+
+    __table_args__ = (
+        db.UniqueConstraint("conversation_id", "user_id", name="unique_conversation_participant"),
+        db.Index(
+            "ix_conversation_participants_user_id_last_message_at",
+            "user_id", "last_message_at", "conversation_id",
+        ),
+    )
+
+
+class TimelineEntry(db.Model):
+    """A post delivered to one user's home feed (fan-out-on-write).
+
+    `created_at` copies the post's timestamp so the feed is a single range
+    read on (user_id, created_at, post_id) without touching `posts` to sort.
+    """
+    __tablename__ = "timeline_entries"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    post = db.relationship("Post")
+
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "post_id", name="unique_timeline_user_post"),
+        db.Index("ix_timeline_entries_user_id_created_at_post_id", "user_id", "created_at", "post_id"),
+        db.Index("ix_timeline_entries_post_id", "post_id"),
+    )
+
+
+class PostTrendingScore(db.Model):
+    """Time-decayed engagement of a recently liked or commented post.
+
+    Maintained by `refresh-trending` (see trending.py); `community_id`
+    copies the post's so per-community rankings are one index range read.
+    """
+    __tablename__ = "post_trending_scores"
+
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    community_id = db.Column(db.Integer, db.ForeignKey("communities.id", ondelete="CASCADE"))
+    score = db.Column(db.Float, nullable=False, default=0, server_default="0")
+    last_engaged_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_post_trending_scores_score_post_id", "score", "post_id"),
+        db.Index("ix_post_trending_scores_community_id_score_post_id", "community_id", "score", "post_id"),
+    )
+
+
+class Notification(db.Model):
+    """Events of one kind on one target within one time window, coalesced
+    into a single row (see notifications.py)."""
+    __tablename__ = "notifications"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # like | comment | follow | message
+    # Post (like, comment), conversation (message) or the recipient (follow)
+    target_id = db.Column(db.Integer, nullable=False)
+    window_start = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    last_actor_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="SET NULL"))
+    last_event_at = db.Column(db.DateTime, nullable=False)
+    read_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    last_actor = db.relationship("User", foreign_keys=[last_actor_id])
+
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "kind", "target_id", "window_start", name="unique_notification_window"),
+        db.Index("ix_notifications_user_id_last_event_at_id", "user_id", "last_event_at", "id"),
+        db.Index("ix_notifications_user_id_read_at", "user_id", "read_at"),
+    )
+
+    def to_dict(self):
+        actor = self.last_actor
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "target_id": self.target_id,
+            "count": self.count,
+            "last_actor": {
+                "id": actor.id,
+                "username": actor.username,
+                "profile_image_url": actor.profile_image_url,
+            } if actor is not None else None,
+            "read": self.read_at is not None,
+            "last_event_at": self.last_event_at.isoformat(),
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class UploadSession(db.Model):
+    """A resumable image upload (see uploads.py); the bytes received so far
+    are in its part file, whose size is the upload's offset."""
+    __tablename__ = "upload_sessions"
+
+    id = db.Column(db.String(32), primary_key=True)  # random token
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id", ondelete="CASCADE"), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    # Set once completed, so a repeated completion returns the same image
+    image_id = db.Column(db.Integer, db.ForeignKey("post_images.id", ondelete="SET NULL"))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_upload_sessions_user_id_expires_at", "user_id", "expires_at"),
+        db.Index("ix_upload_sessions_expires_at", "expires_at"),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "post_id": self.post_id,
+            "size": self.size,
+            "image_id": self.image_id,
+            "expires_at": self.expires_at.isoformat(),
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class OutboxJob(db.Model):
+    """A side effect queued in the same transaction as its cause (see outbox.py)."""
+    __tablename__ = "outbox_jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(200), nullable=False)  # subscriber's module.name
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default="pending", server_default="pending")  # pending | dead
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_outbox_jobs_status_run_after_id", "status", "run_after", "id"),
+    )
+
+
+class JobState(db.Model):
+    """Resume position of an incremental background job.
+
+    `position` is the highest source row id the job `name` has processed.
+    """
+    __tablename__ = "job_state"
+
+    name = db.Column(db.String(64), primary_key=True)
+    position = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
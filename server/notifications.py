@@ -0,0 +1,118 @@
+"""
+Aggregated notifications for likes, comments, follows and direct messages.
+
+Notifications are built by outbox subscribers (see outbox.py), off the
+request path of the like/comment/follow/message handlers. Instead of one
+row per event, events of one kind on one target inside the same
+`NOTIFICATION_WINDOW_SECONDS` bucket are coalesced into one row by a
+single upsert on (user_id, kind, target_id, window_start): the count goes
+up, the latest actor and time are replaced and the row becomes unread
+again. A viral post therefore adds one row per window ("12 people liked
+your post"), not one per like.
+
+Coalescing is by event, not by distinct actor, so liking, unliking and
+liking again counts twice; a job re-run after a lost lease can likewise
+count one event twice.
+"""
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select, update
+
+from extensions import db
+from outbox import subscriber
+from upsert import insert_or_update
+
+
+def _window_start(now: datetime) -> datetime:
+    seconds = current_app.config.get("NOTIFICATION_WINDOW_SECONDS", 3600)
+    epoch = datetime(1970, 1, 1)
+    elapsed = (now - epoch).total_seconds()
+    return epoch + timedelta(seconds=elapsed - elapsed % seconds)
+
+
+def notify(user_id: int, kind: str, target_id: int, actor_id: int) -> None:
+    """Record one event for `user_id`, merged into the current window's row.
+
+    Users are not notified of their own actions. Joins the caller's transaction.
+    """
+    from models import Notification
+
+    if user_id == actor_id:
+        return
+    now = datetime.utcnow()
+    insert_or_update(
+        Notification,
+        {
+            "user_id": user_id,
+            "kind": kind,
+            "target_id": target_id,
+            "window_start": _window_start(now),
+            "count": 1,
+            "last_actor_id": actor_id,
+            "last_event_at": now,
+            "read_at": None,
+            "created_at": now,
+        },
+        ["user_id", "kind", "target_id", "window_start"],
+        {
+            "count": Notification.count + 1,
+            "last_actor_id": actor_id,
+            "last_event_at": now,
+            "read_at": None,
+        },
+    )
+
+
+def unread_count(user_id: int) -> int:
+    from models import Notification
+
+    return db.session.scalar(
+        select(func.count()).where(Notification.user_id == user_id, Notification.read_at.is_(None))
+    )
+
+
+def mark_read(user_id: int, ids=None) -> int:
+    """Mark `user_id`'s notifications (only `ids`, if given) read. Returns how many changed."""
+    from models import Notification
+
+    stmt = update(Notification).where(Notification.user_id == user_id, Notification.read_at.is_(None))
+    if ids is not None:
+        stmt = stmt.where(Notification.id.in_(ids))
+    return db.session.execute(
+        stmt.values(read_at=datetime.utcnow()).execution_options(synchronize_session=False)
+    ).rowcount
+
+
+@subscriber("post.liked")
+def notify_like(like_id: int, post_id: int, user_id: int) -> None:
+    from models import Post
+
+    author_id = db.session.scalar(select(Post.author_id).where(Post.id == post_id))
+    if author_id is not None:
+        notify(author_id, "like", post_id, user_id)
+
+
+@subscriber("comment.created")
+def notify_comment(comment_id: int, post_id: int, user_id: int) -> None:
+    from models import Post
+
+    author_id = db.session.scalar(select(Post.author_id).where(Post.id == post_id))
+    if author_id is not None:
+        notify(author_id, "comment", post_id, user_id)
+
+
+@subscriber("user.followed")
+def notify_follow(follow_id: int, follower_id: int, followed_id: int) -> None:
+    notify(followed_id, "follow", followed_id, follower_id)
+
+
+@subscriber("message.sent")
+def notify_message(message_id: int) -> None:
+    """Direct messages only; community channels have their own unread counts."""
+    from models import Message
+
+    message = db.session.get(Message, message_id)
+    if message is not None and message.receiver_id is not None:
+        notify(message.receiver_id, "message", message.conversation_id, message.sender_id)
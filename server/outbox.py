@@ -0,0 +1,234 @@
+"""
+Transactional outbox and background job runner.
+
+Write handlers call `emit("post.created", post_id=...)` before committing.
+For every function subscribed to the event with `@subscriber(...)` this
+adds an `OutboxJob` row to the same transaction, so a job exists if and
+only if the change that caused it was committed, and nothing is lost when
+a process dies after responding. Events nobody subscribes to write
+nothing.
+
+Runners claim ready jobs in batches with one `UPDATE ... WHERE id IN
+(SELECT ... FOR UPDATE SKIP LOCKED) RETURNING`, which also pushes each
+job's `run_after` out by `OUTBOX_LEASE_SECONDS`: concurrent runners never
+wait on or take each other's jobs, and a job whose runner crashed becomes
+ready again once its lease expires. (SQLite has no SKIP LOCKED; its
+single writer lock makes the claim atomic anyway.) A job's side effects
+and its deletion commit together. A failed job is retried with
+exponential backoff and marked `dead` after `OUTBOX_MAX_ATTEMPTS`.
+Delivery is at least once, so subscribers must be idempotent.
+
+Runners are daemon threads in each web process (`OUTBOX_WORKER_THREADS`,
+started by the first request) and/or a dedicated worker process:
+  flask --app app:create_app outbox-worker --threads 4
+  flask --app app:create_app outbox-status
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import signal
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, select, update
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+# Retry delay after the nth failure: RETRY_BASE_SECONDS * 2 ** (n - 1), capped, with jitter
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 3600
+
+# Event name -> job kinds subscribed to it; job kind -> handler
+_subscribers = defaultdict(list)
+_handlers = {}
+
+
+def subscriber(event: str):
+    """Run the decorated function as a background job for every `event`.
+
+    It is called with the event's payload as keyword arguments.
+    """
+    def decorator(func):
+        kind = f"{func.__module__}.{func.__qualname__}"
+        _handlers[kind] = func
+        if kind not in _subscribers[event]:
+            _subscribers[event].append(kind)
+        return func
+    return decorator
+
+
+def emit(event: str, **payload) -> None:
+    """Queue `event`'s subscribers in the caller's transaction.
+
+    `payload` must be JSON-serializable; pass ids, not ORM objects.
+    """
+    from models import OutboxJob
+
+    for kind in _subscribers.get(event, ()):
+        db.session.add(OutboxJob(kind=kind, payload=payload, run_after=datetime.utcnow()))
+
+
+def retry_delay(attempts: int) -> float:
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class OutboxRunner:
+    """Claims and runs outbox jobs for one application."""
+
+    def __init__(self, app):
+        self.app = app
+        config = app.config
+        self.batch_size = config.get("OUTBOX_BATCH_SIZE", 50)
+        self.poll_interval = config.get("OUTBOX_POLL_INTERVAL", 1.0)
+        self.lease = timedelta(seconds=config.get("OUTBOX_LEASE_SECONDS", 60))
+        self.max_attempts = config.get("OUTBOX_MAX_ATTEMPTS", 8)
+        self.stopping = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def claim(self) -> list:
+        """Lease up to `batch_size` ready jobs and commit the lease."""
+        from models import OutboxJob
+
+        now = datetime.utcnow()
+        ready = (
+            select(OutboxJob.id)
+            .where(OutboxJob.status == "pending", OutboxJob.run_after <= now)
+            .order_by(OutboxJob.run_after, OutboxJob.id)
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        jobs = db.session.execute(
+            update(OutboxJob)
+            .where(OutboxJob.id.in_(ready.scalar_subquery()))
+            .values(run_after=now + self.lease, attempts=OutboxJob.attempts + 1)
+            .returning(OutboxJob.id, OutboxJob.kind, OutboxJob.payload, OutboxJob.attempts)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.session.commit()
+        return jobs
+
+    def run_job(self, job) -> bool:
+        """Run one claimed job; commit its effects and deletion, or schedule a retry."""
+        from models import OutboxJob
+
+        try:
+            handler = _handlers.get(job.kind)
+            if handler is None:
+                raise LookupError(f"no subscriber named {job.kind}")
+            handler(**job.payload)
+            db.session.execute(delete(OutboxJob).where(OutboxJob.id == job.id))
+            db.session.commit()
+            return True
+        except Exception as exc:
+            db.session.rollback()
+            logger.warning("outbox job %s (%s) failed on attempt %s", job.id, job.kind, job.attempts, exc_info=True)
+            values = {"last_error": f"{type(exc).__name__}: {exc}"[:2000]}
+            if job.attempts >= self.max_attempts:
+                values["status"] = "dead"
+            else:
+                values["run_after"] = datetime.utcnow() + timedelta(seconds=retry_delay(job.attempts))
+            db.session.execute(update(OutboxJob).where(OutboxJob.id == job.id).values(values))
+            db.session.commit()
+            return False
+
+    def run_once(self) -> int:
+        """Claim and run one batch. Returns the number of jobs claimed."""
+        with self.app.app_context():
+            try:
+                jobs = self.claim()
+                for job in jobs:
+                    self.run_job(job)
+                return len(jobs)
+            finally:
+                db.session.remove()
+
+    def run(self) -> None:
+        """Process batches until `stopping` is set, sleeping while idle."""
+        while not self.stopping.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception:
+                logger.exception("outbox runner failed, retrying")
+                claimed = 0
+            if claimed < self.batch_size:
+                self.stopping.wait(self.poll_interval)
+
+    def ensure_threads(self, count: int) -> None:
+        """Start `count` daemon runner threads in this process if not running."""
+        if len(self._threads) >= count and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._lock:
+            # Threads don't survive a fork, so (re)start lazily in each worker
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < count:
+                thread = threading.Thread(
+                    target=self.run, name=f"outbox-runner-{len(self._threads)}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def join(self) -> None:
+        for thread in self._threads:
+            thread.join()
+
+
+def queue_stats() -> dict:
+    """Queue depth: pending and ready-to-run jobs, dead jobs, oldest ready job's age."""
+    from models import OutboxJob
+
+    now = datetime.utcnow()
+    pending, ready, oldest = db.session.execute(
+        select(
+            func.count(),
+            func.count().filter(OutboxJob.run_after <= now),
+            func.min(OutboxJob.run_after).filter(OutboxJob.run_after <= now),
+        ).where(OutboxJob.status == "pending")
+    ).one()
+    dead = db.session.scalar(select(func.count()).where(OutboxJob.status == "dead"))
+    return {
+        "pending": pending,
+        "ready": ready,
+        "dead": dead,
+        "oldest_ready_seconds": (now - oldest).total_seconds() if oldest else 0,
+    }
+
+
+def init_outbox(app) -> None:
+    """Start `OUTBOX_WORKER_THREADS` runner threads per process (0 = none)."""
+    runner = app.extensions["outbox_runner"] = OutboxRunner(app)
+    threads = app.config.get("OUTBOX_WORKER_THREADS", 1)
+    if threads > 0:
+        app.before_request(lambda: runner.ensure_threads(threads))
+
+
+@click.command("outbox-worker")
+@click.option("--threads", default=1, show_default=True, help="Runner threads in this process.")
+@with_appcontext
+def outbox_worker_command(threads):
+    """Run outbox jobs until interrupted (SIGINT/SIGTERM finish the current batch)."""
+    runner = current_app.extensions["outbox_runner"]
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: runner.stopping.set())
+    runner.ensure_threads(threads)
+    click.echo(f"Outbox worker running with {threads} thread(s).")
+    while not runner.stopping.wait(1):
+        pass
+    runner.join()
+
+
+@click.command("outbox-status")
+@with_appcontext
+def outbox_status_command():
+    """Print outbox queue depth."""
+    for name, value in queue_stats().items():
+        click.echo(f"{name}: {value}")
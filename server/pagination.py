@@ -0,0 +1,135 @@
+"""
+Keyset (cursor) pagination helpers for list endpoints.
+
+Offset pagination (`Query.paginate`) makes the database walk and discard
+every row before the requested page and issues a `COUNT(*)` on each call.
+Cursor mode instead seeks directly to the last row the client saw using the
+`(created_at, id)` pair, which the composite indexes can serve as a range
+read. Endpoints opt in when the client sends `?cursor=` (empty for the first
+page); old clients keep using `page`/`per_page`.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from threading import Lock
+
+from flask import abort, current_app, request
+from sqlalchemy import tuple_
+
+# Cached totals keyed by (compiled count SQL, params) -> (expires_at, total)
+_total_cache: dict[tuple, tuple[float, int]] = {}
+_total_cache_lock = Lock()
+_TOTAL_CACHE_MAX_ENTRIES = 1024
+
+
+@dataclass
+class CursorPage:
+    items: list
+    next_cursor: str | None
+    total: int | None = None
+
+
+def encode_cursor(created_at: datetime | int, row_id: int) -> str:
+    """Encode a `(created_at, id)` position as an opaque URL-safe token.
+
+    The sort key may also be an integer (e.g. a score).
+    """
+    key = created_at.isoformat() if isinstance(created_at, datetime) else str(created_at)
+    raw = f"{key}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, key_type: type = datetime) -> tuple[datetime | int, int]:
+    """Decode a token produced by `encode_cursor`.
+
+    `key_type` is the sort key's type, `datetime` or `int`.
+    Raises ValueError when the token is malformed.
+    """
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        key = datetime.fromisoformat(created_at) if key_type is datetime else key_type(created_at)
+        return key, int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError("invalid cursor") from exc
+
+
+def cursor_requested() -> bool:
+    """Return True if the client opted into cursor pagination."""
+    return "cursor" in request.args
+
+
+def first_page_requested() -> bool:
+    """Return True for the first page in either pagination mode."""
+    return request.args.get("page", 1, type=int) == 1 and not request.args.get("cursor")
+
+
+def _wants_total() -> bool:
+    return request.args.get("include_total", "").lower() in ("1", "true", "yes")
+
+
+def cached_total(query) -> int:
+    """Count rows for `query`, reusing a recent result for identical queries.
+
+    The TTL is controlled by `PAGINATION_TOTAL_TTL` (seconds, 0 disables).
+    """
+    count_query = query.order_by(None)
+    ttl = current_app.config.get("PAGINATION_TOTAL_TTL", 60)
+    if not ttl:
+        return count_query.count()
+
+    compiled = count_query.statement.compile()
+    key = (str(compiled), tuple(sorted((k, str(v)) for k, v in compiled.params.items())))
+    now = time.monotonic()
+    with _total_cache_lock:
+        hit = _total_cache.get(key)
+        if hit is not None and hit[0] > now:
+            return hit[1]
+
+    total = count_query.count()
+    with _total_cache_lock:
+        if len(_total_cache) >= _TOTAL_CACHE_MAX_ENTRIES:
+            _total_cache.clear()
+        _total_cache[key] = (now + ttl, total)
+    return total
+
+
+def cursor_paginate(query, created_col, id_col, per_page: int, ascending: bool = False) -> CursorPage:
+    """Return one page of `query` ordered by `(created_col, id_col)`.
+
+    `created_col` may be any datetime or integer column (e.g. a score).
+    Reads `cursor` and `include_total` from the request args. An invalid
+    cursor aborts with 400. `total` is only computed when asked for.
+    """
+    token = request.args.get("cursor", "")
+    total = cached_total(query) if _wants_total() else None
+
+    if token:
+        try:
+            created_at, row_id = decode_cursor(token, created_col.type.python_type)
+        except ValueError:
+            abort(400, description="invalid cursor")
+        position = tuple_(created_col, id_col)
+        if ascending:
+            query = query.filter(position > tuple_(created_at, row_id))
+        else:
+            query = query.filter(position < tuple_(created_at, row_id))
+
+    if ascending:
+        query = query.order_by(created_col.asc(), id_col.asc())
+    else:
+        query = query.order_by(created_col.desc(), id_col.desc())
+
+    rows = query.limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page and items:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, created_col.key), getattr(last, id_col.key))
+    return CursorPage(items=items, next_cursor=next_cursor, total=total)
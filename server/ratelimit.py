@@ -0,0 +1,141 @@
+"""
+Rate-limit keys, per-endpoint costs and a shared SQLite store.
+
+Every request draws from one budget (`RATELIMIT_APPLICATION`) keyed
+on the signed-in user, falling back to the client IP for anonymous
+requests, so farmers sharing a carrier NAT don't exhaust each other's
+allowance. Endpoints draw `ENDPOINT_COSTS[endpoint]` units per hit
+(default 1): ranked search, batch lookups, fan-out writes and password
+hashing cost more than reading a post.
+
+Counters must be shared by every worker process or each one enforces
+the full limit on its own. `RATELIMIT_STORAGE_URI` accepts any `limits`
+backend (`redis://`, `memcached://`, `memory://` for a single process)
+plus `sqlite:///<path>`, registered here: a fixed-window store in a
+WAL-mode SQLite file that every worker on one host can share without
+running another service.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+
+from flask import g, request
+from flask_limiter.util import get_remote_address
+from limits.storage import Storage
+
+# Budget units drawn per request; anything not listed costs 1
+ENDPOINT_COSTS = {
+    "auth.register": 5,
+    "auth.login": 5,
+    "search.search_all": 5,
+    "messages.stream": 5,
+    "users.get_users_batch": 3,
+    "posts.get_posts_batch": 3,
+    "communities.get_communities_batch": 3,
+    "posts.create_post": 3,
+    "posts.add_post_image": 5,
+    "posts.complete_upload_session": 5,
+    "posts.home_timeline": 2,
+    "messages.send_message": 2,
+}
+
+
+def rate_limit_key() -> str:
+    """The signed-in user's id, else the client address."""
+    user = g.get("current_user")
+    if user is not None:
+        return f"user:{user.id}"
+    return f"ip:{get_remote_address()}"
+
+
+def request_cost() -> int:
+    return ENDPOINT_COSTS.get(request.endpoint, 1)
+
+
+def is_exempt() -> bool:
+    """Health checks (load balancers, probes) never draw from a budget."""
+    return request.endpoint is not None and request.endpoint.rsplit(".", 1)[-1] == "health"
+
+
+class SQLiteStorage(Storage):
+    """Fixed-window counters in a SQLite file shared across processes.
+
+    Each increment is a single upsert, which SQLite applies atomically under
+    its write lock, so concurrent workers never lose hits. Connections are
+    opened lazily per thread (and therefore per forked worker).
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+    # Expired windows are deleted every this many increments
+    PURGE_EVERY = 1000
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        # Same convention as SQLAlchemy: sqlite:///relative, sqlite:////absolute
+        self.path = uri.split("://", 1)[1][1:] or ":memory:"
+        self.timeout = float(options.get("timeout", 5))
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits "
+                "(key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        (value,) = self._conn.execute(
+            """
+            INSERT INTO rate_limits (key, value, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                value = CASE WHEN expires_at <= ? THEN excluded.value ELSE value + excluded.value END,
+                expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END
+            RETURNING value
+            """,
+            (key, amount, now + expiry, now, now),
+        ).fetchone()
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+        return value
+
+    def get(self, key: str) -> int:
+        row = self._conn.execute(
+            "SELECT value FROM rate_limits WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        row = self._conn.execute(
+            "SELECT expires_at FROM rate_limits WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self) -> bool:
+        try:
+            self._conn.execute("SELECT 1")
+        except sqlite3.Error:
+            return False
+        return True
+
+    def reset(self) -> int | None:
+        return self._conn.execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key: str) -> None:
+        self._conn.execute("DELETE FROM rate_limits WHERE key = ?", (key,))
@@ -10,7 +10,9 @@ def admin_required(view_func):
     Require the authenticated user to have the 'admin' role.
 
     This decorator expects authentication middleware to set `g.current_user`
-    to an instance of `models.User`.
+    to a `session_claims.CurrentUser`; an admin claim is confirmed against
+    the database (token version and role), anything else is refused without
+    a query.
     """
 
     @wraps(view_func)
@@ -0,0 +1,238 @@
+"""
+Real-time message delivery.
+
+New and deleted `Message` rows are published to channels (`user:<id>` for
+both sides of a direct conversation, `community:<id>` for community
+channels) and pushed to clients over Server-Sent Events by
+`GET /api/messages/stream` (or natively async by `asgi.py`).
+
+Backends (`REALTIME_BACKEND`):
+  local     In-process fan-out. Only subscribers in the same server process
+            see an event, so use a single process or the postgres backend.
+  postgres  Events go through `pg_notify` and one LISTEN thread per process
+            fans them out to that process's subscribers.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import text
+
+from extensions import db
+
+logger = logging.getLogger(__name__)
+
+PG_CHANNEL = "agrilink_realtime"
+# NOTIFY payloads are capped at 8000 bytes by Postgres
+PG_PAYLOAD_LIMIT = 7900
+
+
+class Subscription:
+    """A set of channels one stream listens to.
+
+    By default events are buffered in a thread-safe queue read with `get()`.
+    Async servers pass their own `deliver(event)` callback instead.
+    """
+
+    def __init__(self, broker, channels, deliver=None, maxsize: int = 1000):
+        self.broker = broker
+        self.channels = set(channels)
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._deliver = deliver
+
+    def deliver(self, event: dict) -> None:
+        if self._deliver is not None:
+            self._deliver(event)
+            return
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Slow consumer: tell it to resync from history instead of
+            # growing without bound.
+            self.overflowed = True
+
+    def get(self, timeout: float) -> dict | None:
+        """Return the next event, or None if none arrived within `timeout`."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process publish/subscribe broker."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels, deliver=None) -> Subscription:
+        sub = Subscription(self, channels, deliver=deliver)
+        with self._lock:
+            for channel in sub.channels:
+                self._subscribers[channel].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            for channel in sub.channels:
+                self._subscribers[channel].discard(sub)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+    def publish(self, channel: str, event: dict) -> None:
+        self.dispatch(channel, event)
+
+    def dispatch(self, channel: str, event: dict) -> None:
+        with self._lock:
+            targets = list(self._subscribers.get(channel, ()))
+        for sub in targets:
+            sub.deliver(event)
+
+
+class PostgresBroker(LocalBroker):
+    """Broker that relays events between processes with LISTEN/NOTIFY."""
+
+    def __init__(self, engine):
+        super().__init__()
+        self._engine = engine
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def subscribe(self, channels, deliver=None) -> Subscription:
+        self._ensure_listener()
+        return super().subscribe(channels, deliver=deliver)
+
+    def publish(self, channel: str, event: dict) -> None:
+        payload = json.dumps({"channel": channel, "event": event}, default=str)
+        if len(payload.encode()) > PG_PAYLOAD_LIMIT:
+            data = dict(event["data"], content=None, truncated=True)
+            payload = json.dumps({"channel": channel, "event": dict(event, data=data)}, default=str)
+        with self._engine.connect() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                         {"channel": PG_CHANNEL, "payload": payload})
+            conn.commit()
+
+    def _ensure_listener(self) -> None:
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(
+                    target=self._listen, name="realtime-listener", daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self) -> None:
+        backoff = 1
+        while True:
+            try:
+                raw = self._engine.raw_connection()
+                raw.detach()
+                conn = raw.driver_connection
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {PG_CHANNEL}")
+                backoff = 1
+                while True:
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        note = conn.notifies.pop(0)
+                        message = json.loads(note.payload)
+                        self.dispatch(message["channel"], message["event"])
+            except Exception:
+                logger.exception("realtime listener failed, reconnecting in %ss", backoff)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+
+def init_realtime(app) -> None:
+    """Create the broker selected by `REALTIME_BACKEND`."""
+    backend = app.config.get("REALTIME_BACKEND", "local")
+    if backend == "postgres":
+        with app.app_context():
+            broker = PostgresBroker(db.engine)
+    elif backend == "local":
+        broker = LocalBroker()
+    else:
+        raise ValueError(f"Unknown REALTIME_BACKEND '{backend}'")
+    app.extensions["realtime"] = broker
+
+
+def get_broker(app=None):
+    from flask import current_app
+    return (app or current_app).extensions["realtime"]
+
+
+def message_channels(message) -> list[str]:
+    if message.community_id:
+        return [f"community:{message.community_id}"]
+    return sorted({f"user:{message.sender_id}", f"user:{message.receiver_id}"})
+
+
+def stream_channels(user_id: int, community_ids) -> list[str]:
+    return [f"user:{user_id}"] + [f"community:{cid}" for cid in community_ids]
+
+
+def message_event(message, event_type: str = "message") -> tuple[list[str], dict]:
+    """Build `(channels, event)` for a flushed message.
+
+    Build it before commit: a deleted row's attributes are gone afterwards.
+    """
+    data = message.to_dict() if event_type == "message" else {"id": message.id}
+    return message_channels(message), {"type": event_type, "id": message.id, "data": data}
+
+
+def publish_event(channels, event: dict) -> None:
+    """Publish an event after the transaction that produced it committed."""
+    broker = get_broker()
+    for channel in channels:
+        broker.publish(channel, event)
+
+
+def missed_messages(user_id: int, community_ids, after_id: int, limit: int = 100) -> list[dict] | None:
+    """Events for messages on the stream's channels with id > `after_id`.
+
+    Used to catch a reconnecting client up from its `Last-Event-ID`.
+    Returns None if more than `limit` were missed: the stream must then
+    send RESYNC rather than a partial backlog, because the next live
+    event's id would move the client past the rest.
+    """
+    from models import Message
+
+    visible = (Message.sender_id == user_id) | (Message.receiver_id == user_id)
+    if community_ids:
+        visible = visible | Message.community_id.in_(community_ids)
+    rows = (
+        Message.query.filter(Message.id > after_id, visible)
+        .order_by(Message.id.asc())
+        .limit(limit + 1)
+        .all()
+    )
+    if len(rows) > limit:
+        return None
+    return [{"type": "message", "id": m.id, "data": m.to_dict()} for m in rows]
+
+
+def format_event(event: dict) -> str:
+    """Frame an event for the text/event-stream wire format."""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+# WSGI environ key set by asgi.py: the stream route only authenticates and
+# validates, records what to stream here and answers 204
+STREAM_PRECHECK = "agrilink.stream_precheck"
+
+KEEPALIVE = ": keepalive\n\n"
+RESYNC = "event: resync\ndata: {}\n\n"
@@ -1,22 +1,45 @@
-from flask import Blueprint, jsonify, request, session, g
-from extensions import db
+from flask import Blueprint, jsonify, request, g
+from flask_limiter.util import get_remote_address
+
+from extensions import db, limiter
+from hashing import HashingBusy
 from models import User
 from rbac import login_required
+from session_claims import end_session, start_session
 
 bp = Blueprint("auth", __name__, url_prefix="/auth")
 
 # Rate limits for auth endpoints (Flask-Limiter)
 DEFAULT_RATE_LIMIT = "15 per minute"
 LOGIN_RATE_LIMIT = "10 per minute"
+# Per client address, so one host can't spray guesses across many accounts
+# (generous enough for a village behind one carrier NAT)
+LOGIN_IP_RATE_LIMIT = "30 per minute"
 REGISTER_RATE_LIMIT = "5 per minute"
 
 
+def _login_key() -> str:
+    """Key login attempts on the target account, so guessing one user's
+    password is throttled without locking out a whole NAT'd village."""
+    email = (request.get_json(silent=True) or {}).get("email", "")
+    return f"login:{str(email).strip().lower()}"
+
+
+@bp.errorhandler(HashingBusy)
+def hashing_busy(error):
+    """Shed load instead of queueing when every hashing slot is taken."""
+    resp = jsonify({"error": "Service unavailable", "message": "Too many authentication requests, retry shortly"})
+    resp.headers["Retry-After"] = "1"
+    return resp, 503
+
+
 @bp.route("/health", methods=["GET"])
 def health():
     return jsonify({"status": "auth service running"})
 
 
 @bp.post("/register")
+@limiter.limit(REGISTER_RATE_LIMIT, key_func=get_remote_address)
 def register():
     """Register a new user with username, email and password.
     
@@ -47,12 +70,14 @@ def register():
     db.session.add(user)
     db.session.commit()
 
-    session["user_id"] = user.id
+    start_session(user)
 
     return jsonify({"message": "registered", "user": user.to_dict(include_email=True)}), 201
 
 
 @bp.post("/login")
+@limiter.limit(LOGIN_RATE_LIMIT, key_func=_login_key)
+@limiter.limit(LOGIN_IP_RATE_LIMIT, key_func=lambda: f"login-ip:{get_remote_address()}")
 def login():
     """Authenticate user and start session."""
     data = request.get_json() or {}
@@ -66,7 +91,10 @@ def login():
     if not user or not user.check_password(password):
         return jsonify({"error": "invalid credentials"}), 401
 
-    session["user_id"] = user.id
+    if user.rehash_password_if_needed(password):
+        db.session.commit()
+
+    start_session(user)
 
     return jsonify({"message": "logged in", "user": user.to_dict(include_email=True)})
 
@@ -74,7 +102,7 @@ def login():
 @bp.post("/logout")
 def logout():
     """End the current user session."""
-    session.pop("user_id", None)
+    end_session()
     return jsonify({"message": "Logged out"})
 
 
@@ -1,8 +1,18 @@
 from flask import Blueprint, jsonify, request, g
+from sqlalchemy import func, select
 
+from batch import fetch_by_ids, requested_ids
+from cache import cache_tags, cached, invalidate, skip_cache
+from conditional import conditional
+from conversations import add_participant, remove_participant
+from counters import bump
+from expansion import apply_shape, only_default_relations, requested_shape, serialize
 from extensions import db
 from models import Community, CommunityMembership, Post
+from pagination import cursor_paginate, cursor_requested, first_page_requested
 from rbac import login_required, admin_required
+from timeline import backfill, prune
+from upsert import insert_once, row_exists
 
 bp = Blueprint("communities", __name__, url_prefix="/communities")
 
@@ -14,28 +24,55 @@ def health():
 
 @bp.get("")
 @login_required
+@cached()
 def list_communities():
     """List all communities with pagination.
     
     Query params:
         page: Page number (default: 1)
         per_page: Items per page (default: 20, max: 100)
+        fields: Comma-separated community fields to return (default: all)
+        expand: Relations to embed: creator
+
+    Supports conditional GETs (ETag / Last-Modified) when nothing is expanded.
     """
     page = request.args.get("page", 1, type=int)
-    per_page = min(request.args.get("per_page", 20, type=int), 100)
-    
-    pagination = Community.query.order_by(Community.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
-    communities = [c.to_dict() for c in pagination.items]
-    
-    return jsonify({
-        "communities": communities,
-        "total": pagination.total,
-        "page": pagination.page,
-        "pages": pagination.pages,
-        "per_page": per_page
-    })
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+    shape = requested_shape(Community)
+
+    def build():
+        pagination = apply_shape(Community.query, shape).order_by(Community.created_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        cache_tags("community-list", *[f"community:{c.id}" for c in pagination.items])
+        communities = [serialize(c, shape) for c in pagination.items]
+
+        return jsonify({
+            "communities": communities,
+            "total": pagination.total,
+            "page": pagination.page,
+            "pages": pagination.pages,
+            "per_page": per_page
+        })
+
+    if not only_default_relations(shape):
+        skip_cache()
+        return build()
+    if not first_page_requested():
+        skip_cache()
+    # Communities are never edited in place: creates and deletes move the
+    # aggregate, and counter changes the counters of the page's own rows
+    # (sums over the table would miss offsetting changes in two rows)
+    total, max_id, last_created = db.session.execute(
+        select(func.count(Community.id), func.max(Community.id), func.max(Community.created_at))
+    ).one()
+    rows = db.session.execute(
+        select(Community.id, Community.members_count, Community.posts_count)
+        .order_by(Community.created_at.desc())
+        .offset((max(page, 1) - 1) * per_page).limit(per_page)
+    ).all()
+    version = (total, max_id, last_created, tuple(tuple(row) for row in rows))
+    return conditional(version, build, last_modified=last_created)
 
 
 @bp.post("")
@@ -61,7 +98,10 @@ def create_community():
 
     membership = CommunityMembership(user_id=g.current_user.id, community_id=community.id)
     db.session.add(membership)
+    bump(Community.members_count, community.id)
+    add_participant(community.id, g.current_user.id)
     db.session.commit()
+    invalidate("community-list")
 
     return jsonify(community.to_dict()), 201
 
@@ -69,19 +109,28 @@ def create_community():
 @bp.post("/<int:community_id>/join")
 @login_required
 def join_community(community_id):
-    """Join an existing community as a member."""
-    community = Community.query.get_or_404(community_id)
-    existing = CommunityMembership.query.filter_by(
-        user_id=g.current_user.id,
-        community_id=community.id
-    ).first()
-    if existing:
-        return jsonify({"error": "already a member"}), 400
+    """Join an existing community as a member.
 
-    membership = CommunityMembership(user_id=g.current_user.id, community_id=community.id)
-    db.session.add(membership)
+    Idempotent: joining again returns the existing membership (200).
+    """
+    membership = insert_once(
+        CommunityMembership,
+        {"user_id": g.current_user.id, "community_id": community_id},
+        row_exists(Community, id=community_id),
+    )
+    if membership is None:
+        membership = CommunityMembership.query.filter_by(
+            user_id=g.current_user.id, community_id=community_id
+        ).first_or_404()
+        return jsonify(membership.to_dict())
+
+    body = membership.to_dict()
+    bump(Community.members_count, community_id)
+    add_participant(community_id, g.current_user.id)
+    backfill(g.current_user.id, community_id=community_id)
     db.session.commit()
-    return jsonify(membership.to_dict()), 201
+    invalidate(f"community:{community_id}")
+    return jsonify(body), 201
 
 
 @bp.delete("/<int:community_id>/leave")
@@ -96,46 +145,110 @@ def leave_community(community_id):
     if not membership:
         return jsonify({"error": "not a member"}), 400
 
+    bump(Community.members_count, community.id, -1)
     db.session.delete(membership)
+    db.session.flush()
+    prune(g.current_user.id, community_id=community.id)
+    remove_participant(community.id, g.current_user.id)
     db.session.commit()
+    invalidate(f"community:{community.id}")
     return jsonify({"message": "left community"})
 
 
+@bp.get("/batch")
+@login_required
+def get_communities_batch():
+    """Look up several communities at once.
+
+    Query params:
+        ids: Comma-separated community ids (max BATCH_MAX_IDS); order is preserved
+        fields, expand: As for `list_communities`
+    """
+    shape = requested_shape(Community)
+    communities, missing = fetch_by_ids(apply_shape(Community.query, shape), Community, requested_ids())
+    return jsonify({
+        "communities": [serialize(c, shape) for c in communities],
+        "missing": missing
+    })
+
+
 @bp.get("/<int:community_id>/members")
 @login_required
 def community_members(community_id):
-    """Get all members of a community with pagination."""
+    """Get all members of a community with pagination.
+
+    Query params:
+        page: Page number (default: 1)
+        per_page: Items per page (default: 20, max: 100)
+        fields: Comma-separated membership fields to return (default: all)
+        expand: Relations to embed: user, community
+
+    Supports conditional GETs (ETag / Last-Modified) when nothing is expanded.
+    """
     page = request.args.get("page", 1, type=int)
-    per_page = min(request.args.get("per_page", 20, type=int), 100)
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+    shape = requested_shape(CommunityMembership)
     
     Community.query.get_or_404(community_id)
-    pagination = CommunityMembership.query.filter_by(community_id=community_id).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
-    members = [m.to_dict() for m in pagination.items]
-    
-    return jsonify({
-        "members": members,
-        "total": pagination.total,
-        "page": pagination.page,
-        "pages": pagination.pages,
-        "per_page": per_page
-    })
+
+    def build():
+        query = apply_shape(CommunityMembership.query.filter_by(community_id=community_id), shape)
+        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+        members = [serialize(m, shape) for m in pagination.items]
+
+        return jsonify({
+            "members": members,
+            "total": pagination.total,
+            "page": pagination.page,
+            "pages": pagination.pages,
+            "per_page": per_page
+        })
+
+    if not only_default_relations(shape):
+        return build()
+    # Memberships are insert/delete only: any change moves count or max id
+    version = db.session.execute(
+        select(
+            func.count(CommunityMembership.id), func.max(CommunityMembership.id),
+            func.max(CommunityMembership.created_at),
+        ).where(CommunityMembership.community_id == community_id)
+    ).one()
+    return conditional(tuple(version), build, last_modified=version[2])
 
 
 @bp.get("/<int:community_id>/posts")
 @login_required
+@cached()
 def community_posts(community_id):
-    """Get all posts in a community with pagination."""
+    """Get all posts in a community with pagination.
+
+    Supports `cursor`/`include_total` keyset pagination and `fields`/`expand`
+    like `list_posts`.
+    """
     page = request.args.get("page", 1, type=int)
-    per_page = min(request.args.get("per_page", 20, type=int), 100)
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+    shape = requested_shape(Post)
     
     Community.query.get_or_404(community_id)
-    pagination = Post.query.filter_by(community_id=community_id) \
-        .order_by(Post.created_at.desc()) \
+    query = apply_shape(Post.query.filter_by(community_id=community_id), shape)
+    if not (first_page_requested() and only_default_relations(shape)):
+        skip_cache()
+
+    if cursor_requested():
+        result = cursor_paginate(query, Post.created_at, Post.id, per_page)
+        cache_tags(f"community:{community_id}:posts", *[f"post:{p.id}" for p in result.items])
+        return jsonify({
+            "posts": [serialize(p, shape) for p in result.items],
+            "next_cursor": result.next_cursor,
+            "total": result.total,
+            "per_page": per_page
+        })
+
+    pagination = query.order_by(Post.created_at.desc()) \
         .paginate(page=page, per_page=per_page, error_out=False)
     
-    posts = [p.to_dict() for p in pagination.items]
+    cache_tags(f"community:{community_id}:posts", *[f"post:{p.id}" for p in pagination.items])
+    posts = [serialize(p, shape) for p in pagination.items]
     
     return jsonify({
         "posts": posts,
@@ -150,7 +263,12 @@ def community_posts(community_id):
 @admin_required
 def delete_community(community_id):
     community = Community.query.get_or_404(community_id)
+    # Deleting detaches its posts (community_id -> NULL), changing each one
+    post_tags = [f"post:{post_id}" for (post_id,) in
+                 db.session.query(Post.id).filter_by(community_id=community_id)]
     db.session.delete(community)
     db.session.commit()
+    invalidate("community-list", f"community:{community_id}", f"community:{community_id}:posts",
+               "posts", *post_tags)
     return jsonify({"message": "community deleted"})
 
@@ -0,0 +1,27 @@
+import os
+
+from flask import Blueprint, abort, send_file
+
+from media import NAME, blob_path
+
+bp = Blueprint("media", __name__, url_prefix="/media")
+
+# Names are content hashes, so a URL's bytes never change
+MAX_AGE = 365 * 24 * 3600
+
+
+@bp.get("/<name>")
+def get_media(name):
+    """Serve an uploaded image or variant (supports Range and conditional requests).
+
+    Public: names are unguessable content hashes, like the post URLs they appear in.
+    """
+    if not NAME.match(name):
+        abort(404)
+    path = blob_path(name)
+    if not os.path.isfile(path):
+        abort(404)
+    resp = send_file(path, conditional=True, etag=True, max_age=MAX_AGE)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    return resp
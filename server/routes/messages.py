@@ -1,8 +1,21 @@
-from flask import Blueprint, jsonify, request, g
+from flask import Blueprint, Response, current_app, jsonify, request, g
+from sqlalchemy import func, select
 
+from cache import cache_tags, cached, invalidate, skip_cache
+from conditional import conditional
+from conversations import (
+    forget_message, list_threads, mark_read, participant_for, record_message, total_unread, unread_counts,
+)
+from expansion import apply_shape, only_default_relations, requested_shape, serialize
 from extensions import db
-from models import Message, Community, User
+from models import Message, Community, Conversation, ConversationParticipant, User
+from outbox import emit
+from pagination import cursor_paginate, cursor_requested, decode_cursor
 from rbac import login_required
+from realtime import (
+    KEEPALIVE, RESYNC, STREAM_PRECHECK, format_event, get_broker, message_event, missed_messages,
+    publish_event, stream_channels,
+)
 
 bp = Blueprint("messages", __name__, url_prefix="/messages")
 
@@ -43,7 +56,14 @@ def send_message():
         content=content,
     )
     db.session.add(msg)
+    db.session.flush()
+    record_message(msg)
+    emit("message.sent", message_id=msg.id)
+    channels, event = message_event(msg)
     db.session.commit()
+    publish_event(channels, event)
+    if community_id:
+        invalidate(f"community:{community_id}:messages")
     return jsonify(msg.to_dict()), 201
 
 
@@ -55,32 +75,185 @@ def delete_message(message_id):
     if message.sender_id != g.current_user.id:
         return jsonify({"error": "forbidden"}), 403
     
+    channels, event = message_event(message, "delete")
+    forget_message(message)
+    community_id = message.community_id
     db.session.delete(message)
     db.session.commit()
+    publish_event(channels, event)
+    if community_id:
+        invalidate(f"community:{community_id}:messages")
     return jsonify({"message": "message deleted"})
 
 
-@bp.get("/user/<int:user_id>")
+@bp.get("/conversations")
 @login_required
-def conversation_with_user(user_id):
-    """Get all messages exchanged with a specific user with pagination.
+def list_conversations():
+    """List the current user's message threads, most recent first.
+
+    Covers direct conversations and the channels of joined communities that
+    have messages. Cursor-paginated on (last_message_at, conversation id).
     
     Query params:
-        page: Page number (default: 1)
+        cursor: `next_cursor` from the previous page ('' or omitted for the first)
         per_page: Items per page (default: 20, max: 100)
     """
-    page = request.args.get("page", 1, type=int)
-    per_page = min(request.args.get("per_page", 20, type=int), 100)
-    
-    User.query.get_or_404(user_id)
-    pagination = Message.query.filter(
-        ((Message.sender_id == g.current_user.id) & (Message.receiver_id == user_id)) |
-        ((Message.sender_id == user_id) & (Message.receiver_id == g.current_user.id))
-    ).order_by(Message.created_at.asc()).paginate(
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+    token = request.args.get("cursor", "")
+    position = None
+    if token:
+        try:
+            position = decode_cursor(token)
+        except ValueError:
+            return jsonify({"error": "invalid cursor"}), 400
+    items, next_cursor = list_threads(g.current_user.id, per_page, position)
+    # The other side's read cursor for direct threads, for "seen" markers
+    direct_ids = [p.conversation_id for p in items if p.conversation.kind == "direct"]
+    peer_reads = dict(
+        db.session.query(ConversationParticipant.conversation_id, ConversationParticipant.last_read_message_id)
+        .filter(
+            ConversationParticipant.conversation_id.in_(direct_ids),
+            ConversationParticipant.user_id != g.current_user.id,
+        )
+        .all()
+    ) if direct_ids else {}
+
+    unread = unread_counts(items)
+    conversations = []
+    for p in items:
+        conversation = p.conversation.to_dict()
+        conversation["unread_count"] = unread[p.conversation_id]
+        conversation["last_read_message_id"] = p.last_read_message_id
+        conversation["peer_last_read_message_id"] = peer_reads.get(p.conversation_id)
+        conversations.append(conversation)
+    return jsonify({
+        "conversations": conversations,
+        "next_cursor": next_cursor,
+        "per_page": per_page
+    })
+
+
+@bp.post("/conversations/<int:conversation_id>/read")
+@login_required
+def mark_conversation_read(conversation_id):
+    """Mark a conversation read up to a message.
+
+    JSON body (optional):
+        message_id: Last message read (default: the conversation's latest)
+    """
+    participant = participant_for(conversation_id, g.current_user.id)
+    if participant is None:
+        return jsonify({"error": "conversation not found"}), 404
+
+    data = request.get_json(silent=True) or {}
+    latest = participant.conversation.last_message_id or 0
+    up_to_id = data.get("message_id", latest)
+    if not isinstance(up_to_id, int) or isinstance(up_to_id, bool):
+        return jsonify({"error": "message_id must be an integer"}), 400
+
+    # Never move past the latest message, or later ones would arrive read
+    mark_read(participant, min(up_to_id, latest))
+    db.session.commit()
+    return jsonify({
+        "conversation_id": conversation_id,
+        "last_read_message_id": participant.last_read_message_id,
+        "unread_count": unread_counts([participant])[conversation_id],
+    })
+
+
+@bp.get("/unread")
+@login_required
+def unread_count():
+    """Total unread messages across the current user's conversations (app badge).
+
+    Each community channel counts at most 100.
+    """
+    return jsonify({"unread_count": total_unread(g.current_user.id)})
+
+
+@bp.get("/stream")
+@login_required
+def stream():
+    """Server-Sent Events stream of new and deleted messages.
+
+    Always includes the current user's direct messages; add community
+    channels with repeated `community_id` query params. Reconnecting clients
+    send `Last-Event-ID` to receive messages they missed; if more than 100
+    were missed (or the client falls too far behind) the stream sends a
+    `resync` event and closes, and the client reloads from the REST API.
+
+    Each open stream holds a worker thread under WSGI; use the async
+    entry point (`asgi.py`) for large numbers of idle connections. It runs
+    this view first, with the app's usual request hooks (rate limits,
+    CORS, sessions), as a pre-check that answers 204 instead of streaming.
+    """
+    community_ids = request.args.getlist("community_id", type=int)
+    for community_id in community_ids:
+        Community.query.get_or_404(community_id)
+
+    precheck = request.environ.get(STREAM_PRECHECK)
+    if precheck is not None:
+        precheck.update(
+            user_id=g.current_user.id,
+            community_ids=community_ids,
+            last_event_id=request.headers.get("Last-Event-ID", type=int),
+        )
+        return Response(status=204)
+
+    # Subscribe before reading the backlog so nothing falls in between
+    sub = get_broker().subscribe(stream_channels(g.current_user.id, community_ids))
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+    backlog = []
+    if last_event_id is not None:
+        backlog = missed_messages(g.current_user.id, community_ids, last_event_id)
+    # Don't pin a pooled connection for the lifetime of the stream
+    db.session.remove()
+    heartbeat = current_app.config.get("REALTIME_HEARTBEAT", 15)
+
+    def events():
+        try:
+            yield "retry: 3000\n\n"
+            if backlog is None:
+                yield RESYNC
+                return
+            sent_up_to = last_event_id or 0
+            for event in backlog:
+                sent_up_to = event["id"]
+                yield format_event(event)
+            while True:
+                event = sub.get(timeout=heartbeat)
+                if sub.overflowed:
+                    yield RESYNC
+                    return
+                if event is None:
+                    yield KEEPALIVE
+                elif event["type"] != "message" or event["id"] > sent_up_to:
+                    yield format_event(event)
+        finally:
+            sub.close()
+
+    return Response(events(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+
+def _message_page(query, shape, page, per_page):
+    """Serialize one page of a message history query (offset or cursor mode)."""
+    if cursor_requested():
+        result = cursor_paginate(query, Message.created_at, Message.id, per_page, ascending=True)
+        return jsonify({
+            "messages": [serialize(m, shape) for m in result.items],
+            "next_cursor": result.next_cursor,
+            "total": result.total,
+            "per_page": per_page
+        })
+
+    pagination = query.order_by(Message.created_at.asc(), Message.id.asc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
-    messages = [m.to_dict() for m in pagination.items]
+    messages = [serialize(m, shape) for m in pagination.items]
     
     return jsonify({
         "messages": messages,
@@ -91,30 +264,94 @@ def conversation_with_user(user_id):
     })
 
 
+def _thread_version(*criteria):
+    """`(version, last_modified)` of the conversation matching `criteria`.
+
+    Messages are insert/delete only, so the thread's last message id plus
+    its message count (an index-only count on conversation_id) changes
+    whenever the history does.
+    """
+    count = (
+        select(func.count(Message.id))
+        .where(Message.conversation_id == Conversation.id)
+        .scalar_subquery()
+    )
+    row = db.session.execute(
+        select(Conversation.last_message_id, Conversation.last_message_at, count).where(*criteria)
+    ).first()
+    if row is None:
+        return (None, 0), None
+    return (row[0], row[2]), row[1]
+
+
+@bp.get("/user/<int:user_id>")
+@login_required
+def conversation_with_user(user_id):
+    """Get all messages exchanged with a specific user with pagination.
+    
+    Query params:
+        page: Page number (default: 1)
+        per_page: Items per page (default: 20, max: 100)
+        cursor: Opt into keyset pagination ('' for the oldest page)
+        include_total: In cursor mode, also return the (cached) total
+        fields: Comma-separated message fields to return (default: all)
+        expand: Relations to embed: sender, receiver, community
+
+    Supports conditional GETs (ETag / Last-Modified) when nothing is expanded.
+    """
+    page = request.args.get("page", 1, type=int)
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+    shape = requested_shape(Message)
+    
+    User.query.get_or_404(user_id)
+
+    def build():
+        # Two index range reads merged by (created_at, id) instead of an OR
+        # that forces the database to sort the whole conversation.
+        query = Message.query.filter_by(sender_id=g.current_user.id, receiver_id=user_id)
+        if user_id != g.current_user.id:
+            query = query.union_all(
+                Message.query.filter_by(sender_id=user_id, receiver_id=g.current_user.id)
+            )
+        return _message_page(apply_shape(query, shape), shape, page, per_page)
+
+    if not only_default_relations(shape):
+        return build()
+    user_a_id, user_b_id = sorted((g.current_user.id, user_id))
+    version, last_modified = _thread_version(
+        Conversation.user_a_id == user_a_id, Conversation.user_b_id == user_b_id
+    )
+    return conditional(version, build, last_modified=last_modified)
+
+
 @bp.get("/community/<int:community_id>")
 @login_required
+@cached()
 def community_messages(community_id):
     """Get all messages in a community channel with pagination.
     
     Query params:
         page: Page number (default: 1)
         per_page: Items per page (default: 20, max: 100)
+        cursor: Opt into keyset pagination ('' for the oldest page)
+        include_total: In cursor mode, also return the (cached) total
+        fields, expand: As for `conversation_with_user`
+
+    Supports conditional GETs (ETag / Last-Modified) when nothing is expanded.
     """
     page = request.args.get("page", 1, type=int)
-    per_page = min(request.args.get("per_page", 20, type=int), 100)
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+    shape = requested_shape(Message)
     
     Community.query.get_or_404(community_id)
-    pagination = Message.query.filter_by(community_id=community_id) \
-        .order_by(Message.created_at.asc()) \
-        .paginate(page=page, per_page=per_page, error_out=False)
-    
-    messages = [m.to_dict() for m in pagination.items]
-    
-    return jsonify({
-        "messages": messages,
-        "total": pagination.total,
-        "page": pagination.page,
-        "pages": pagination.pages,
-        "per_page": per_page
-    })
 
+    def build():
+        cache_tags(f"community:{community_id}:messages")
+        query = apply_shape(Message.query.filter_by(community_id=community_id), shape)
+        return _message_page(query, shape, page, per_page)
+
+    if not only_default_relations(shape):
+        skip_cache()
+        return build()
+    version, last_modified = _thread_version(Conversation.community_id == community_id)
+    return conditional(version, build, last_modified=last_modified)
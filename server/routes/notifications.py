@@ -0,0 +1,62 @@
+from flask import Blueprint, jsonify, request, g
+from sqlalchemy.orm import joinedload
+
+from extensions import db
+from models import Notification
+from notifications import mark_read, unread_count
+from pagination import cursor_paginate
+from rbac import login_required
+
+bp = Blueprint("notifications", __name__, url_prefix="/notifications")
+
+
+@bp.route("/health", methods=["GET"])
+def health():
+    return jsonify({"status": "notifications service running"})
+
+
+@bp.get("")
+@login_required
+def list_notifications():
+    """The current user's notifications, most recent activity first.
+
+    Query params:
+        cursor: `next_cursor` from the previous page ('' or omitted for the first)
+        per_page: Items per page (default: 20, max: 100)
+    """
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+    query = Notification.query.filter_by(user_id=g.current_user.id).options(joinedload(Notification.last_actor))
+    result = cursor_paginate(query, Notification.last_event_at, Notification.id, per_page)
+    return jsonify({
+        "notifications": [n.to_dict() for n in result.items],
+        "next_cursor": result.next_cursor,
+        "unread_count": unread_count(g.current_user.id),
+        "per_page": per_page
+    })
+
+
+@bp.get("/unread")
+@login_required
+def get_unread_count():
+    """Number of unread notifications (app badge)."""
+    return jsonify({"unread_count": unread_count(g.current_user.id)})
+
+
+@bp.post("/read")
+@login_required
+def mark_notifications_read():
+    """Mark notifications read.
+
+    JSON body (optional):
+        ids: Notification ids to mark (default: all of the current user's)
+    """
+    data = request.get_json(silent=True) or {}
+    ids = data.get("ids")
+    if ids is not None and (
+        not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)
+    ):
+        return jsonify({"error": "ids must be a list of integers"}), 400
+
+    mark_read(g.current_user.id, ids)
+    db.session.commit()
+    return jsonify({"unread_count": unread_count(g.current_user.id)})
@@ -1,12 +1,45 @@
-from flask import Blueprint, jsonify, request, g
+from datetime import datetime
 
+from flask import Blueprint, abort, current_app, jsonify, request, url_for, g
+from sqlalchemy import func, select
+
+from batch import fetch_by_ids, requested_ids
+from cache import cache_tags, cached, invalidate, skip_cache
+from conditional import conditional, latest
+from counters import bump, bump_later
+from expansion import apply_shape, only_default_relations, requested_shape, serialize
 from extensions import db
-from models import Post, Comment, Like, PostImage
+from media import InvalidImage, parse_upload, store_upload
+from models import Community, Post, Comment, Like, PostImage, PostTrendingScore, UploadSession
+from outbox import emit
+from pagination import cursor_paginate, cursor_requested, decode_cursor, first_page_requested
 from rbac import login_required, admin_required
+from timeline import fan_out_post, home_feed, remove_post
+from trending import forget_post
+from uploads import (
+    MAX_ACTIVE_UPLOADS,
+    UploadConflict,
+    active_uploads,
+    append_chunk,
+    complete_upload,
+    discard_upload,
+    open_upload,
+    received_bytes,
+    touch_upload,
+)
+from upsert import insert_once, row_exists
 
 bp = Blueprint("posts", __name__, url_prefix="/posts")
 
 
+def _list_tags(post) -> list[str]:
+    """Cache tags for the lists `post` appears in (create/delete)."""
+    tags = ["posts", f"post:{post.id}"]
+    if post.community_id:
+        tags += [f"community:{post.community_id}", f"community:{post.community_id}:posts"]
+    return tags
+
+
 @bp.route("/health", methods=["GET"])
 def health():
     return jsonify({"status": "posts service running"})
@@ -14,20 +47,40 @@ def health():
 
 @bp.get("")
 @login_required
+@cached()
 def list_posts():
     """List all posts with pagination.
     
     Query params:
         page: Page number (default: 1)
         per_page: Items per page (default: 20, max: 100)
+        cursor: Opt into keyset pagination ('' for the first page)
+        include_total: In cursor mode, also return the (cached) total
+        fields: Comma-separated post fields to return (default: all)
+        expand: Relations to embed: author, community, images (default: images)
     """
     page = request.args.get("page", 1, type=int)
-    per_page = min(request.args.get("per_page", 20, type=int), 100)
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+    shape = requested_shape(Post)
+    query = apply_shape(Post.query, shape)
+    if not (first_page_requested() and only_default_relations(shape)):
+        skip_cache()
+
+    if cursor_requested():
+        result = cursor_paginate(query, Post.created_at, Post.id, per_page)
+        cache_tags("posts", *[f"post:{p.id}" for p in result.items])
+        return jsonify({
+            "posts": [serialize(p, shape) for p in result.items],
+            "next_cursor": result.next_cursor,
+            "total": result.total,
+            "per_page": per_page
+        })
     
-    pagination = Post.query.order_by(Post.created_at.desc()).paginate(
+    pagination = query.order_by(Post.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
-    posts = [p.to_dict() for p in pagination.items]
+    cache_tags("posts", *[f"post:{p.id}" for p in pagination.items])
+    posts = [serialize(p, shape) for p in pagination.items]
     
     return jsonify({
         "posts": posts,
@@ -38,6 +91,77 @@ def list_posts():
     })
 
 
+@bp.get("/feed")
+@login_required
+def home_timeline():
+    """Home feed: posts from followed users, joined communities and oneself.
+    
+    Query params:
+        cursor: `next_cursor` from the previous page (omit for the newest)
+        per_page: Items per page (default: 20, max: 100)
+        fields, expand: As for `list_posts`
+    """
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+    shape = requested_shape(Post)
+    token = request.args.get("cursor", "")
+    position = None
+    if token:
+        try:
+            position = decode_cursor(token)
+        except ValueError:
+            return jsonify({"error": "invalid cursor"}), 400
+
+    posts, next_cursor = home_feed(
+        g.current_user.id, per_page, position, shape_query=lambda q: apply_shape(q, shape)
+    )
+    return jsonify({
+        "posts": [serialize(p, shape) for p in posts],
+        "next_cursor": next_cursor,
+        "per_page": per_page
+    })
+
+
+@bp.get("/trending")
+@login_required
+@cached()
+def trending_posts():
+    """Posts with the most recent engagement, hottest first.
+
+    Ranked by the materialized score in `post_trending_scores` (see
+    trending.py), so only posts liked or commented on in the last
+    `TRENDING_WINDOW_DAYS` appear.
+
+    Query params:
+        community_id: Only posts in this community
+        page: Page number (default: 1)
+        per_page: Items per page (default: 20, max: 100)
+        fields, expand: As for `list_posts`
+    """
+    page = request.args.get("page", 1, type=int)
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+    community_id = request.args.get("community_id", type=int)
+    shape = requested_shape(Post)
+    if not (first_page_requested() and only_default_relations(shape)):
+        skip_cache()
+
+    query = apply_shape(Post.query, shape).join(PostTrendingScore, PostTrendingScore.post_id == Post.id)
+    if community_id is not None:
+        Community.query.get_or_404(community_id)
+        query = query.filter(PostTrendingScore.community_id == community_id)
+
+    pagination = query.order_by(PostTrendingScore.score.desc(), PostTrendingScore.post_id.desc()) \
+        .paginate(page=page, per_page=per_page, error_out=False)
+    cache_tags("trending", *[f"post:{p.id}" for p in pagination.items])
+
+    return jsonify({
+        "posts": [serialize(p, shape) for p in pagination.items],
+        "total": pagination.total,
+        "page": pagination.page,
+        "pages": pagination.pages,
+        "per_page": per_page
+    })
+
+
 @bp.post("")
 @login_required
 def create_post():
@@ -57,15 +181,60 @@ def create_post():
         community_id=community_id,
     )
     db.session.add(post)
+    if community_id:
+        bump(Community.posts_count, community_id)
+    db.session.flush()
+    fan_out_post(post)
     db.session.commit()
+    invalidate(*_list_tags(post))
     return jsonify(post.to_dict()), 201
 
 
+@bp.get("/batch")
+@login_required
+def get_posts_batch():
+    """Look up several posts at once.
+
+    Query params:
+        ids: Comma-separated post ids (max BATCH_MAX_IDS); order is preserved
+        fields, expand: As for `list_posts`
+    """
+    shape = requested_shape(Post)
+    posts, missing = fetch_by_ids(apply_shape(Post.query, shape), Post, requested_ids())
+    return jsonify({
+        "posts": [serialize(p, shape) for p in posts],
+        "missing": missing
+    })
+
+
 @bp.get("/<int:post_id>")
 @login_required
+@cached()
 def get_post(post_id):
-    post = Post.query.get_or_404(post_id)
-    return jsonify(post.to_dict())
+    """Get one post. Accepts `fields` and `expand` like `list_posts`.
+
+    Supports conditional GETs (ETag / Last-Modified).
+    """
+    shape = requested_shape(Post)
+
+    def build():
+        post = apply_shape(Post.query, shape).filter_by(id=post_id).first_or_404()
+        cache_tags(f"post:{post_id}")
+        return jsonify(serialize(post, shape))
+
+    if not only_default_relations(shape):
+        skip_cache()
+        return build()
+
+    images = select(func.count(PostImage.id), func.max(PostImage.id)).where(PostImage.post_id == post_id).subquery()
+    version = db.session.execute(
+        select(
+            Post.created_at, Post.updated_at, Post.likes_count, Post.comments_count, *images.c
+        ).join_from(Post, images, db.true()).where(Post.id == post_id)
+    ).first()
+    if version is None:
+        abort(404)
+    return conditional(tuple(version), build, last_modified=latest(version.created_at, version.updated_at))
 
 
 @bp.patch("/<int:post_id>")
@@ -79,6 +248,7 @@ def update_post(post_id):
     post.title = data.get("title", post.title)
     post.content = data.get("content", post.content)
     db.session.commit()
+    invalidate(f"post:{post.id}")
     return jsonify(post.to_dict())
 
 
@@ -89,29 +259,186 @@ def delete_post(post_id):
     if post.author_id != g.current_user.id and not g.current_user.is_admin():
         return jsonify({"error": "forbidden"}), 403
 
+    if post.community_id:
+        bump(Community.posts_count, post.community_id, -1)
+    remove_post(post.id)
+    forget_post(post.id)
+    tags = _list_tags(post)
     db.session.delete(post)
     db.session.commit()
+    invalidate(*tags)
     return jsonify({"message": "post deleted"})
 
 
+def _add_stored_image(post_id, stored):
+    """Add a PostImage for a file saved by store_upload and queue its variants."""
+    img = PostImage(
+        post_id=post_id,
+        image_url=stored["url"],
+        content_hash=stored["content_hash"],
+        mime_type=stored["mime_type"],
+        size_bytes=stored["size_bytes"],
+        width=stored["width"],
+        height=stored["height"],
+    )
+    db.session.add(img)
+    db.session.flush()
+    emit("post_image.uploaded", image_id=img.id)
+    return img
+
+
 @bp.post("/<int:post_id>/images")
 @login_required
 def add_post_image(post_id):
+    """Attach an image to a post.
+
+    Either a multipart upload with the file in the `image` field (stored and
+    resized server-side, see media.py) or JSON {"image_url": ...} for an
+    image hosted elsewhere.
+    """
+    post = Post.query.get_or_404(post_id)
+    if post.author_id != g.current_user.id and not g.current_user.is_admin():
+        return jsonify({"error": "forbidden"}), 403
+
+    if request.mimetype == "multipart/form-data":
+        upload = parse_upload(request)
+        if upload is None:
+            return jsonify({"error": "image file is required"}), 400
+        try:
+            stored = store_upload(upload.name, upload.sha256.hexdigest(), upload.size)
+        except InvalidImage as exc:
+            return jsonify({"error": str(exc)}), 400
+        img = _add_stored_image(post.id, stored)
+    else:
+        data = request.get_json() or {}
+        image_url = data.get("image_url")
+        if not image_url:
+            return jsonify({"error": "image_url is required"}), 400
+        img = PostImage(post_id=post.id, image_url=image_url)
+        db.session.add(img)
+    db.session.commit()
+    invalidate(f"post:{post.id}")
+    return jsonify(img.to_dict()), 201
+
+
+def _get_upload(upload_id):
+    """The current user's unexpired upload session, else 404."""
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != g.current_user.id or upload.expires_at <= datetime.utcnow():
+        abort(404)
+    return upload
+
+
+@bp.post("/<int:post_id>/uploads")
+@login_required
+def create_upload(post_id):
+    """Start a resumable image upload for a post (see uploads.py).
+
+    JSON body:
+        size: Total file size in bytes
+    """
     post = Post.query.get_or_404(post_id)
     if post.author_id != g.current_user.id and not g.current_user.is_admin():
         return jsonify({"error": "forbidden"}), 403
 
     data = request.get_json() or {}
-    image_url = data.get("image_url")
-    if not image_url:
-        return jsonify({"error": "image_url is required"}), 400
+    size = data.get("size")
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        return jsonify({"error": "size must be a positive integer"}), 400
+    if size > current_app.config.get("MEDIA_MAX_UPLOAD_BYTES", 10 * 1024 * 1024):
+        abort(413)
+    if active_uploads(g.current_user.id) >= MAX_ACTIVE_UPLOADS:
+        return jsonify({"error": "too many uploads in progress"}), 409
+
+    upload = open_upload(g.current_user.id, post.id, size)
+    db.session.commit()
+    resp = jsonify({**upload.to_dict(), "offset": 0})
+    resp.headers["Location"] = url_for("posts.get_upload", upload_id=upload.id)
+    return resp, 201
 
-    img = PostImage(post_id=post.id, image_url=image_url)
-    db.session.add(img)
+
+@bp.get("/uploads/<upload_id>")
+@login_required
+def get_upload(upload_id):
+    """An upload's state; `offset` is where the next chunk must start."""
+    upload = _get_upload(upload_id)
+    offset = upload.size if upload.image_id is not None else received_bytes(upload.id)
+    if offset is None:
+        abort(404)
+    return jsonify({**upload.to_dict(), "offset": offset})
+
+
+@bp.put("/uploads/<upload_id>")
+@login_required
+def put_upload_chunk(upload_id):
+    """Append the request body to an upload.
+
+    Headers:
+        Upload-Offset: Byte position of the body in the file; must equal the
+            upload's current offset (409 with `offset` otherwise)
+    """
+    offset = request.headers.get("Upload-Offset", type=int)
+    if offset is None:
+        return jsonify({"error": "Upload-Offset header is required"}), 400
+    upload = _get_upload(upload_id)
+    if upload.image_id is not None:
+        return jsonify({"error": "upload already completed", "offset": upload.size}), 409
+    size = upload.size
+    # Don't hold a database connection while a slow client sends the chunk
+    db.session.rollback()
+
+    try:
+        received = append_chunk(upload_id, size, offset, request.stream, request.content_length)
+    except FileNotFoundError:
+        abort(404)
+    except UploadConflict as exc:
+        return jsonify({"error": str(exc), "offset": exc.offset}), 409
+    touch_upload(upload_id)
+    db.session.commit()
+    return jsonify({"id": upload_id, "size": size, "offset": received})
+
+
+@bp.post("/uploads/<upload_id>/complete")
+@login_required
+def complete_upload_session(upload_id):
+    """Turn a fully received upload into an image on its post.
+
+    Completing again returns the same image (200), for clients that lost
+    the first response.
+    """
+    upload = _get_upload(upload_id)
+    if upload.image_id is not None:
+        return jsonify(PostImage.query.get_or_404(upload.image_id).to_dict())
+    post = Post.query.get_or_404(upload.post_id)
+
+    try:
+        stored = complete_upload(upload.id, upload.size)
+    except FileNotFoundError:
+        abort(404)
+    except UploadConflict as exc:
+        return jsonify({"error": str(exc), "offset": exc.offset}), 409
+    except InvalidImage as exc:
+        db.session.delete(upload)
+        db.session.commit()
+        return jsonify({"error": str(exc)}), 400
+    img = _add_stored_image(post.id, stored)
+    upload.image_id = img.id
     db.session.commit()
+    invalidate(f"post:{post.id}")
     return jsonify(img.to_dict()), 201
 
 
+@bp.delete("/uploads/<upload_id>")
+@login_required
+def cancel_upload(upload_id):
+    """Abandon an upload and free its space."""
+    upload = _get_upload(upload_id)
+    db.session.delete(upload)
+    db.session.commit()
+    discard_upload(upload_id)
+    return jsonify({"message": "upload cancelled"})
+
+
 @bp.post("/<int:post_id>/comments")
 @login_required
 def add_comment(post_id):
@@ -128,7 +455,11 @@ def add_comment(post_id):
         content=content,
     )
     db.session.add(comment)
+    bump(Post.comments_count, post.id)
+    db.session.flush()
+    emit("comment.created", comment_id=comment.id, post_id=post.id, user_id=comment.user_id)
     db.session.commit()
+    invalidate(f"post:{post.id}")
     return jsonify(comment.to_dict()), 201
 
 
@@ -139,33 +470,44 @@ def delete_comment(comment_id):
     if comment.user_id != g.current_user.id and not g.current_user.is_admin():
         return jsonify({"error": "forbidden"}), 403
 
+    bump(Post.comments_count, comment.post_id, -1)
+    post_id = comment.post_id
     db.session.delete(comment)
     db.session.commit()
+    invalidate(f"post:{post_id}")
     return jsonify({"message": "comment deleted"})
 
 
 @bp.post("/<int:post_id>/like")
 @login_required
 def like_post(post_id):
-    post = Post.query.get_or_404(post_id)
-    existing = Like.query.filter_by(user_id=g.current_user.id, post_id=post.id).first()
-    if existing:
-        return jsonify({"error": "already liked"}), 400
-
-    like = Like(user_id=g.current_user.id, post_id=post.id)
-    db.session.add(like)
+    """Like a post. Idempotent: liking again returns the existing like (200)."""
+    like = insert_once(Like, {"user_id": g.current_user.id, "post_id": post_id}, row_exists(Post, id=post_id))
+    if like is None:
+        like = Like.query.filter_by(user_id=g.current_user.id, post_id=post_id).first_or_404()
+        return jsonify(like.to_dict())
+
+    body = like.to_dict()
+    bump_later(Post.likes_count, post_id, tags=[f"post:{post_id}"])
+    emit("post.liked", like_id=like.id, post_id=post_id, user_id=like.user_id)
     db.session.commit()
-    return jsonify(like.to_dict()), 201
+    invalidate(f"post:{post_id}")
+    return jsonify(body), 201
 
 
 @bp.delete("/<int:post_id>/like")
 @login_required
 def unlike_post(post_id):
-    like = Like.query.filter_by(user_id=g.current_user.id, post_id=post_id).first()
-    if not like:
+    unliked = db.session.execute(
+        db.delete(Like)
+        .where(Like.user_id == g.current_user.id, Like.post_id == post_id)
+        .returning(Like.id)
+    ).first()
+    if not unliked:
         return jsonify({"error": "not liked"}), 400
 
-    db.session.delete(like)
+    bump_later(Post.likes_count, post_id, -1, tags=[f"post:{post_id}"])
     db.session.commit()
+    invalidate(f"post:{post_id}")
     return jsonify({"message": "unliked"})
 
@@ -0,0 +1,64 @@
+from flask import Blueprint, jsonify, request, g
+
+from database import statement_timeout
+from extensions import db
+from models import Community, ConversationParticipant, Message, Post, User
+from rbac import login_required
+from search import query_terms, search
+
+bp = Blueprint("search", __name__, url_prefix="/search")
+
+# Ranking a very common term can scan a large share of the index; give up
+# sooner than the default rather than tie up a connection
+SEARCH_STATEMENT_TIMEOUT_MS = 2000
+
+
+@bp.route("/health", methods=["GET"])
+def health():
+    return jsonify({"status": "search service running"})
+
+
+@bp.get("")
+@login_required
+@statement_timeout(SEARCH_STATEMENT_TIMEOUT_MS)
+def search_all():
+    """Full-text search, ranked by relevance.
+
+    Query params:
+        q: Search text (required); the last word also matches as a prefix on SQLite
+        type: posts | communities | users | messages (default: posts)
+        cursor: `next_cursor` from the previous page ('' or omitted for the first)
+        per_page: Items per page (default: 20, max: 100)
+
+    Message search only covers conversations the current user belongs to.
+    """
+    kind = request.args.get("type", "posts")
+    terms = query_terms(request.args.get("q", ""))
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+
+    if not terms:
+        return jsonify({"error": "q is required"}), 400
+
+    if kind == "posts":
+        result = search(kind, Post, terms, per_page)
+        items = [p.to_dict() for p in result.items]
+    elif kind == "communities":
+        result = search(kind, Community, terms, per_page)
+        items = [c.to_dict() for c in result.items]
+    elif kind == "users":
+        result = search(kind, User, terms, per_page)
+        items = [u.to_dict() for u in result.items]
+    elif kind == "messages":
+        mine = db.session.query(ConversationParticipant.conversation_id).filter(
+            ConversationParticipant.user_id == g.current_user.id
+        )
+        result = search(kind, Message, terms, per_page, scope=Message.conversation_id.in_(mine))
+        items = [m.to_dict() for m in result.items]
+    else:
+        return jsonify({"error": "type must be one of posts, communities, users, messages"}), 400
+
+    return jsonify({
+        kind: items,
+        "next_cursor": result.next_cursor,
+        "per_page": per_page
+    })
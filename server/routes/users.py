@@ -1,8 +1,19 @@
-from flask import Blueprint, jsonify, request, g
-
+from flask import Blueprint, abort, jsonify, request, g
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import contains_eager
+
+from batch import fetch_by_ids, requested_ids
+from conditional import conditional, latest
+from counters import bump
+from engagement import recompute_scores
 from extensions import db
-from models import User, Follow
+from follow_graph import suggest_users
+from models import Follow, Role, User
+from outbox import emit, queue_stats
+from pagination import cursor_paginate, cursor_requested
 from rbac import admin_required, login_required
+from timeline import backfill, prune
+from upsert import insert_once, row_exists
 
 bp = Blueprint("users", __name__, url_prefix="/users")
 
@@ -15,7 +26,8 @@ def health():
 @bp.route("/admin/health", methods=["GET"])
 @admin_required
 def admin_health():
-    return jsonify({"status": "admin endpoint running"})
+    """Admin status, including background job queue depth (see outbox.py)."""
+    return jsonify({"status": "admin endpoint running", "outbox": queue_stats()})
 
 
 @bp.get("")
@@ -28,7 +40,7 @@ def list_users():
         per_page: Items per page (default: 20, max: 100)
     """
     page = request.args.get("page", 1, type=int)
-    per_page = min(request.args.get("per_page", 20, type=int), 100)
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
     
     pagination = User.query.paginate(page=page, per_page=per_page, error_out=False)
     users = [u.to_dict(include_email=True) for u in pagination.items]
@@ -45,24 +57,43 @@ def list_users():
 @bp.get("/experts")
 @login_required
 def list_experts():
-    """List all expert users with pagination.
-    
-    TODO: Add dedicated 'expert' role to roles table and filter by role_id.
-    Current implementation returns all users for MVP.
-    
+    """List users with the 'expert' role, highest engagement score first.
+
+    The score is precomputed (see engagement.py), so each page is one range
+    read on ix_users_role_id_[location_]engagement_score_id.
+
     Query params:
+        location: Only experts whose location matches exactly
         page: Page number (default: 1)
         per_page: Items per page (default: 20, max: 100)
+        cursor: Opt into keyset pagination ('' for the first page)
+        include_total: In cursor mode, also return the (cached) total
     """
     page = request.args.get("page", 1, type=int)
-    per_page = min(request.args.get("per_page", 20, type=int), 100)
-    
-    # FIXME: Replace with role-based filtering when expert role is added to roles table
-    pagination = User.query.paginate(page=page, per_page=per_page, error_out=False)
-    experts = [u.to_dict() for u in pagination.items]
-    
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+
+    query = User.query.join(Role, Role.id == User.role_id).filter(Role.name == "expert")
+    location = request.args.get("location", "").strip()
+    if location:
+        query = query.filter(User.location == location)
+
+    def serialize(users):
+        return [dict(u.to_dict(), engagement_score=u.engagement_score) for u in users]
+
+    if cursor_requested():
+        result = cursor_paginate(query, User.engagement_score, User.id, per_page)
+        return jsonify({
+            "experts": serialize(result.items),
+            "next_cursor": result.next_cursor,
+            "total": result.total,
+            "per_page": per_page
+        })
+
+    pagination = query.order_by(User.engagement_score.desc(), User.id.desc()) \
+        .paginate(page=page, per_page=per_page, error_out=False)
+
     return jsonify({
-        "experts": experts,
+        "experts": serialize(pagination.items),
         "total": pagination.total,
         "page": pagination.page,
         "pages": pagination.pages,
@@ -78,10 +109,24 @@ def user_inbox():
     Query params:
         page: Page number (default: 1)
         per_page: Items per page (default: 20, max: 100)
+        cursor: Opt into keyset pagination ('' for the newest page)
+        include_total: In cursor mode, also return the (cached) total
     """
     from models import Message
     page = request.args.get("page", 1, type=int)
-    per_page = min(request.args.get("per_page", 20, type=int), 100)
+    per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+
+    if cursor_requested():
+        result = cursor_paginate(
+            Message.query.filter_by(receiver_id=g.current_user.id),
+            Message.created_at, Message.id, per_page
+        )
+        return jsonify({
+            "messages": [m.to_dict() for m in result.items],
+            "next_cursor": result.next_cursor,
+            "total": result.total,
+            "per_page": per_page
+        })
     
     pagination = Message.query.filter_by(receiver_id=g.current_user.id) \
         .order_by(Message.created_at.desc()) \
@@ -98,11 +143,102 @@ def user_inbox():
     })
 
 
+@bp.get("/batch")
+@login_required
+def get_users_batch():
+    """Look up several users at once.
+
+    Query params:
+        ids: Comma-separated user ids (max BATCH_MAX_IDS); order is preserved
+    """
+    users, missing = fetch_by_ids(User.query, User, requested_ids())
+    show_email = g.current_user.is_admin()
+    return jsonify({
+        "users": [u.to_dict(include_email=show_email or u.id == g.current_user.id) for u in users],
+        "missing": missing
+    })
+
+
+@bp.get("/relationships")
+@login_required
+def get_relationships():
+    """Follow state between the current user and several others, e.g. to
+    render follow buttons for every author on a feed page.
+
+    Query params:
+        ids: Comma-separated user ids (max BATCH_MAX_IDS); order is preserved
+    """
+    ids = requested_ids()
+    me = g.current_user.id
+    # Two range reads on the unique (follower_id, followed_id) index and
+    # ix_follows_followed_id_created_at_id instead of one OR
+    edges = db.session.execute(union_all(
+        select(Follow.follower_id, Follow.followed_id)
+        .where(Follow.follower_id == me, Follow.followed_id.in_(ids)),
+        select(Follow.follower_id, Follow.followed_id)
+        .where(Follow.followed_id == me, Follow.follower_id.in_(ids)),
+    )).all()
+    following = {followed for follower, followed in edges if follower == me}
+    followed_by = {follower for follower, followed in edges if followed == me}
+    return jsonify({
+        "relationships": [
+            {"id": i, "following": i in following, "followed_by": i in followed_by} for i in ids
+        ]
+    })
+
+
+@bp.get("/suggestions")
+@login_required
+def get_suggestions():
+    """People you may know: users followed by the people you follow.
+
+    Query params:
+        limit: Number of suggestions (default: 20, max: 100)
+
+    Ranked by how many of the people you follow follow them
+    (`mutual_follows`); topped up with the most-followed users you don't
+    follow yet when that gives too few.
+    """
+    limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+    ranked, following = suggest_users(g.current_user.id, limit)
+    mutual = dict(ranked)
+    users, _missing = fetch_by_ids(User.query, User, list(mutual))
+
+    if len(users) < limit:
+        excluded = {g.current_user.id, *following, *mutual}
+        popular = (
+            User.query.order_by(User.followers_count.desc(), User.id.desc())
+            .limit(limit + len(excluded))
+            .all()
+        )
+        users += [u for u in popular if u.id not in excluded][:limit - len(users)]
+
+    return jsonify({
+        "users": [dict(u.to_dict(), mutual_follows=mutual.get(u.id, 0)) for u in users]
+    })
+
+
 @bp.get("/<int:user_id>")
 @login_required
 def get_user(user_id):
-    user = User.query.get_or_404(user_id)
-    return jsonify(user.to_dict(include_email=(g.current_user.is_admin() or g.current_user.id == user_id)))
+    """Get a user's profile. Supports conditional GETs (ETag / Last-Modified)."""
+    include_email = g.current_user.is_admin() or g.current_user.id == user_id
+    version = db.session.execute(
+        select(User.created_at, User.updated_at, User.followers_count, User.following_count)
+        .where(User.id == user_id)
+    ).first()
+    if version is None:
+        abort(404)
+
+    def build():
+        user = User.query.get_or_404(user_id)
+        return jsonify(user.to_dict(include_email=include_email))
+
+    return conditional(
+        tuple(version), build,
+        last_modified=latest(version.created_at, version.updated_at),
+        vary=(include_email,),
+    )
 
 
 @bp.patch("/<int:user_id>")
@@ -130,26 +266,49 @@ def delete_user(user_id):
     return jsonify({"message": "user deleted"})
 
 
+@bp.put("/<int:user_id>/role")
+@admin_required
+def set_user_role(user_id):
+    """Assign a role (e.g. promote a user to 'expert').
+
+    Body: {"role": "<role name>"}. Revokes the user's outstanding sessions.
+    """
+    user = User.query.get_or_404(user_id)
+    data = request.get_json() or {}
+    try:
+        user.set_role_by_name(data.get("role") or "")
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    # Rank a new expert right away rather than after the next full refresh
+    recompute_scores([user.id])
+    db.session.commit()
+    return jsonify(user.to_dict(include_email=True))
+
+
 @bp.post("/<int:user_id>/follow")
 @login_required
 def follow_user(user_id):
-    """Follow another user by their ID."""
+    """Follow another user by their ID.
+
+    Idempotent: following again returns the existing follow (200).
+    """
     if g.current_user.id == user_id:
         return jsonify({"error": "cannot follow yourself"}), 400
 
-    target = User.query.get_or_404(user_id)
-
-    existing = Follow.query.filter_by(
-        follower_id=g.current_user.id,
-        followed_id=target.id
-    ).first()
-    if existing:
-        return jsonify({"error": "already following"}), 400
-
-    follow = Follow(follower_id=g.current_user.id, followed_id=target.id)
-    db.session.add(follow)
+    follow = insert_once(
+        Follow, {"follower_id": g.current_user.id, "followed_id": user_id}, row_exists(User, id=user_id)
+    )
+    if follow is None:
+        follow = Follow.query.filter_by(follower_id=g.current_user.id, followed_id=user_id).first_or_404()
+        return jsonify({"message": "already following", "follow": follow.to_dict()})
+
+    body = {"message": "followed", "follow": follow.to_dict()}
+    bump(User.followers_count, user_id)
+    bump(User.following_count, g.current_user.id)
+    backfill(g.current_user.id, author_id=user_id)
+    emit("user.followed", follow_id=follow.id, follower_id=g.current_user.id, followed_id=user_id)
     db.session.commit()
-    return jsonify({"message": "followed", "follow": follow.to_dict()}), 201
+    return jsonify(body), 201
 
 
 @bp.delete("/<int:user_id>/follow")
@@ -163,7 +322,11 @@ def unfollow_user(user_id):
     if not follow:
         return jsonify({"error": "not following"}), 400
 
+    bump(User.followers_count, user_id, -1)
+    bump(User.following_count, g.current_user.id, -1)
     db.session.delete(follow)
+    db.session.flush()
+    prune(g.current_user.id, author_id=user_id)
     db.session.commit()
     return jsonify({"message": "unfollowed"})
 
@@ -171,13 +334,55 @@ def unfollow_user(user_id):
 @bp.get("/<int:user_id>/followers")
 @login_required
 def get_followers(user_id):
-    followers = Follow.query.filter_by(followed_id=user_id).all()
-    return jsonify([f.to_dict() for f in followers])
+    """Users following `user_id`, most recent first.
+
+    Query params:
+        cursor: Opt into keyset pagination ('' for the newest page)
+        per_page: In cursor mode, items per page (default: 20, max: 100)
+        include_total: In cursor mode, also return the (cached) total
+
+    Without `cursor` the whole list is returned as a bare array, as before
+    pagination; clients should move to cursor mode.
+    """
+    query = (
+        Follow.query.filter_by(followed_id=user_id)
+        .join(Follow.follower).options(contains_eager(Follow.follower))
+    )
+    return _follow_list(query, "followers", lambda f: f.follower)
 
 
 @bp.get("/<int:user_id>/following")
 @login_required
 def get_following(user_id):
-    following = Follow.query.filter_by(follower_id=user_id).all()
-    return jsonify([f.to_dict() for f in following])
+    """Users `user_id` follows, most recently followed first.
+
+    Query params: as for `get_followers`.
+    """
+    query = (
+        Follow.query.filter_by(follower_id=user_id)
+        .join(Follow.followed).options(contains_eager(Follow.followed))
+    )
+    return _follow_list(query, "following", lambda f: f.followed)
 
+
+def _follow_list(query, key, other):
+    """Serialize follows with the other side's profile.
+
+    Cursor mode returns one page as an object under `key`; without a cursor
+    the response is the full bare list these routes returned before
+    pagination, so existing clients still see every follow.
+    """
+    def serialize(follows):
+        return [dict(f.to_dict(), user=other(f).to_dict()) for f in follows]
+
+    if cursor_requested():
+        per_page = max(1, min(request.args.get("per_page", 20, type=int), 100))
+        result = cursor_paginate(query, Follow.created_at, Follow.id, per_page)
+        return jsonify({
+            key: serialize(result.items),
+            "next_cursor": result.next_cursor,
+            "total": result.total,
+            "per_page": per_page
+        })
+
+    return jsonify(serialize(query.order_by(Follow.created_at.desc(), Follow.id.desc()).all()))
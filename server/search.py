@@ -0,0 +1,196 @@
+"""
+Full-text search over posts, communities, users and messages.
+
+Two backends, chosen by the database dialect:
+  postgresql  Weighted `tsvector` columns generated from the indexed text
+              (`search_vector`, GIN-indexed), queried with `to_tsquery`
+              and ranked by `ts_rank`.
+  sqlite      External-content FTS5 tables (`<table>_fts`) kept in step by
+              triggers, queried with MATCH and ranked by `bm25`.
+
+Both are created by migration `a8d3f5c2e914` and, for `db.create_all()`
+(tests, local SQLite), by the metadata hooks registered in `init_search`.
+Results are ordered by score then id and paginated with an opaque
+`(score, id)` cursor instead of an OFFSET over the ranked set. bm25 scores
+depend on corpus statistics, so on SQLite a page boundary can shift
+slightly if rows are indexed between requests.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import re
+from dataclasses import dataclass
+
+from flask import abort, request
+from sqlalchemy import DDL, Float, cast, column, event, func, literal_column, select, table, tuple_
+
+from extensions import db
+
+PG_LANGUAGE = "english"
+
+# kind -> (table, [(column, weight), ...]); weights are Postgres A-D labels
+INDEXED = {
+    "posts": ("posts", [("title", "A"), ("content", "B")]),
+    "communities": ("communities", [("name", "A"), ("description", "B")]),
+    "users": ("users", [("username", "A"), ("bio", "B")]),
+    "messages": ("messages", [("content", "A")]),
+}
+# bm25() column weights matching the Postgres labels
+_BM25_WEIGHTS = {"A": 10.0, "B": 1.0}
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def _pg_ddl(table_name: str, columns) -> list[str]:
+    vector = " || ".join(
+        f"setweight(to_tsvector('{PG_LANGUAGE}', coalesce({name}, '')), '{weight}')"
+        for name, weight in columns
+    )
+    return [
+        f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({vector}) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{table_name}_search_vector ON {table_name} USING GIN (search_vector)",
+    ]
+
+
+def _sqlite_ddl(table_name: str, columns) -> list[str]:
+    fts = f"{table_name}_fts"
+    names = [name for name, _weight in columns]
+    cols = ", ".join(names)
+    new_values = ", ".join(f"new.{name}" for name in names)
+    old_values = ", ".join(f"old.{name}" for name in names)
+    delete = f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values});"
+    insert = f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, "
+        f"content='{table_name}', content_rowid='id', tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN {delete} END",
+        # Only text edits reindex; counter bumps leave the index alone
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table_name} "
+        f"BEGIN {delete} {insert} END",
+    ]
+
+
+def _install(target, connection, **kw) -> None:
+    dialect = connection.dialect.name
+    for table_name, columns in INDEXED.values():
+        if dialect == "postgresql":
+            statements = _pg_ddl(table_name, columns)
+        elif dialect == "sqlite":
+            statements = _sqlite_ddl(table_name, columns)
+        else:
+            return
+        for statement in statements:
+            connection.execute(DDL(statement))
+
+
+def _uninstall(target, connection, **kw) -> None:
+    if connection.dialect.name == "sqlite":
+        for table_name, _columns in INDEXED.values():
+            connection.execute(DDL(f"DROP TABLE IF EXISTS {table_name}_fts"))
+
+
+def init_search(app) -> None:
+    """Have `db.create_all()` / `db.drop_all()` manage the search indexes."""
+    if not event.contains(db.metadata, "after_create", _install):
+        event.listen(db.metadata, "after_create", _install)
+        event.listen(db.metadata, "before_drop", _uninstall)
+
+
+@dataclass
+class SearchPage:
+    items: list
+    next_cursor: str | None
+
+
+def _encode_position(score: float, row_id: int) -> str:
+    raw = f"{score!r}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_position(token: str) -> tuple[float, int]:
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        score, row_id = raw.rsplit("|", 1)
+        return float(score), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError("invalid cursor") from exc
+
+
+def query_terms(text: str) -> list[str]:
+    """Split user input into plain word tokens (no search operators)."""
+    return _TOKEN.findall(text or "")
+
+
+def _pg_tsquery(terms: list[str]):
+    """AND of the terms with the last one as a prefix, like the FTS5 query.
+
+    Terms are `\w+` tokens, so they carry no tsquery syntax of their own,
+    and words such as "or" stay words (websearch_to_tsquery would read
+    them as operators).
+    """
+    return func.to_tsquery(PG_LANGUAGE, " & ".join(terms) + ":*")
+
+
+def _matches(kind: str, terms: list[str]):
+    """Subquery of `(id, score)` for rows matching every term, higher score first."""
+    table_name, columns = INDEXED[kind]
+    if db.engine.dialect.name == "postgresql":
+        source = table(table_name, column("id"), column("search_vector"))
+        tsquery = _pg_tsquery(terms)
+        # ts_rank() is float4; as double precision the score round-trips
+        # exactly through the cursor, so ties aren't skipped or repeated
+        rank = cast(func.ts_rank(source.c.search_vector, tsquery), Float)
+        return (
+            select(source.c.id, rank.label("score"))
+            .where(source.c.search_vector.op("@@")(tsquery))
+            .subquery()
+        )
+
+    fts = f"{table_name}_fts"
+    # Quote every term so user input can't use FTS5 syntax; the last term
+    # is a prefix match for search-as-you-type.
+    match = " ".join(f'"{term}"' for term in terms) + "*"
+    weights = [literal_column(str(_BM25_WEIGHTS[weight])) for _name, weight in columns]
+    source = table(fts, column("rowid"))
+    return (
+        select(
+            source.c.rowid.label("id"),
+            # bm25() is lower-is-better; negate so both backends sort descending
+            (-func.bm25(literal_column(fts), *weights)).label("score"),
+        )
+        .where(literal_column(fts).op("MATCH")(match))
+        .subquery()
+    )
+
+
+def search(kind: str, model, terms: list[str], per_page: int, scope=None) -> SearchPage:
+    """Return one ranked page of `model` rows matching `terms`.
+
+    `scope` is an optional extra filter on `model` (e.g. visibility).
+    Reads `cursor` from the request args; an invalid cursor aborts with 400.
+    """
+    hits = _matches(kind, terms)
+    query = db.session.query(model, hits.c.score).join(hits, hits.c.id == model.id)
+    if scope is not None:
+        query = query.filter(scope)
+
+    token = request.args.get("cursor", "")
+    if token:
+        try:
+            score, row_id = _decode_position(token)
+        except ValueError:
+            abort(400, description="invalid cursor")
+        query = query.filter(tuple_(hits.c.score, hits.c.id) < tuple_(score, row_id))
+
+    rows = query.order_by(hits.c.score.desc(), hits.c.id.desc()).limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page and items:
+        last, last_score = items[-1]
+        next_cursor = _encode_position(last_score, last.id)
+    return SearchPage(items=[row for row, _score in items], next_cursor=next_cursor)
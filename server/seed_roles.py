@@ -12,7 +12,7 @@ from models import Role
 
 
 def seed_default_roles() -> None:
-    for role_name in ("user", "admin"):
+    for role_name in ("user", "admin", "expert"):
         exists = Role.query.filter_by(name=role_name).first()
         if exists is None:
             db.session.add(Role(name=role_name))
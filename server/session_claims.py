@@ -0,0 +1,106 @@
+"""
+Signed session claims and lazy current-user loading.
+
+The Flask session cookie is signed with SECRET_KEY, so it can carry the
+claims needed to authorize a request (user id, role, token version)
+without reading the `users` table. `g.current_user` is a `CurrentUser`
+proxy that answers `id` from those claims and only loads the ORM row
+when a handler touches any other attribute.
+
+Claims are re-checked against the database at most every
+`SESSION_CLAIMS_TTL` seconds. Bumping `User.token_version` (role changes,
+password changes) invalidates outstanding sessions at their next check,
+or immediately if a handler hydrates the user. The admin role is never
+taken from the claims alone: `is_admin()` hydrates the user when the
+claim says admin, so a demoted or deleted admin loses access at once.
+Regular users, whose claim already denies it, pay no query.
+"""
+
+from __future__ import annotations
+
+import time
+
+from flask import abort, current_app, session
+
+from extensions import db
+
+CLAIM_KEYS = ("user_id", "role", "token_version", "claims_at")
+
+
+def _role_name(user) -> str:
+    return user.role_obj.name if user.role_obj is not None else user.role
+
+
+def start_session(user) -> None:
+    """Write fresh claims for `user` into the session."""
+    session["user_id"] = user.id
+    session["role"] = _role_name(user)
+    session["token_version"] = user.token_version
+    session["claims_at"] = int(time.time())
+
+
+def end_session() -> None:
+    for key in CLAIM_KEYS:
+        session.pop(key, None)
+
+
+class CurrentUser:
+    """Stand-in for the authenticated `models.User`, hydrated on demand."""
+
+    def __init__(self, user_id: int, role: str, token_version: int, user=None):
+        self.id = user_id
+        self._role = role
+        self._token_version = token_version
+        self._user = user
+
+    def is_admin(self) -> bool:
+        """Return True if the user is an admin.
+
+        A non-admin claim is trusted; an admin claim is confirmed against
+        the user's row (one primary-key lookup, then cached on the proxy).
+        """
+        if self._role != "admin":
+            return False
+        return _role_name(self._get_current_object()) == "admin"
+
+    def _get_current_object(self):
+        if self._user is None:
+            from models import User
+            user = db.session.get(User, self.id)
+            if user is None or user.token_version != self._token_version:
+                end_session()
+                abort(401)
+            self._user = user
+        return self._user
+
+    def __getattr__(self, name):
+        return getattr(self._get_current_object(), name)
+
+    def __repr__(self):
+        return f"<CurrentUser {self.id}>"
+
+
+def load_session_user() -> CurrentUser | None:
+    """Build the current-user proxy from session claims.
+
+    Sessions without a version claim (issued before claims existed) or with
+    claims older than `SESSION_CLAIMS_TTL` are revalidated against the
+    database and refreshed; revoked ones are cleared.
+    """
+    user_id = session.get("user_id")
+    if user_id is None:
+        return None
+
+    ttl = current_app.config.get("SESSION_CLAIMS_TTL", 300)
+    claims_at = session.get("claims_at")
+    if "token_version" in session and claims_at is not None and time.time() - claims_at < ttl:
+        return CurrentUser(user_id, session.get("role"), session["token_version"])
+
+    from models import User
+    user = db.session.get(User, user_id)
+    expected_version = session.get("token_version", user.token_version if user else None)
+    if user is None or user.token_version != expected_version:
+        end_session()
+        return None
+    start_session(user)
+    return CurrentUser(user.id, session["role"], user.token_version, user=user)
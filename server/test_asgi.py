@@ -0,0 +1,87 @@
+"""The native ASGI message stream runs the Flask request hooks first."""
+
+import asyncio
+
+import pytest
+
+from app import create_app
+from asgi import STREAM_PATH, create_asgi_app
+from conftest import TestConfig, register
+from extensions import db
+
+
+class StreamConfig(TestConfig):
+    FRONTEND_ORIGINS = ["https://app.example"]
+    REALTIME_HEARTBEAT = 0.05
+    RATELIMIT_ENABLED = True
+    RATELIMIT_STORAGE_URI = "memory://"
+
+
+@pytest.fixture
+def stream_app():
+    app = create_app(StreamConfig)
+    with app.app_context():
+        from seed_roles import seed_default_roles
+        db.create_all()
+        seed_default_roles()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def open_stream(app, headers=(), disconnect_after=0.3):
+    """Run one stream request; returns (status, headers, body)."""
+    scope = {
+        "type": "http", "method": "GET", "path": STREAM_PATH, "root_path": "", "query_string": b"",
+        "http_version": "1.1", "scheme": "http", "server": ("testserver", 80), "client": ("10.0.0.1", 5000),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+    }
+    messages = []
+
+    async def receive():
+        await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(create_asgi_app(app)(scope, receive, send))
+    start = messages[0]
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body.decode()
+
+
+def session_cookie(app, client):
+    name = app.config["SESSION_COOKIE_NAME"]
+    return ("Cookie", f"{name}={client.get_cookie(name).value}")
+
+
+def test_stream_requires_a_session(stream_app):
+    status, _headers, body = open_stream(stream_app)
+    assert status == 401
+    assert "Unauthorized" in body
+
+
+def test_stream_applies_cors_and_replays_the_backlog(stream_app):
+    client = stream_app.test_client()
+    other = register(client, "grower")
+    client.post("/api/auth/logout")
+    register(client, "farmer")
+    client.post("/api/messages", json={"content": "hello", "receiver_id": other})
+
+    status, headers, body = open_stream(
+        stream_app, [session_cookie(stream_app, client), ("Origin", "https://app.example"), ("Last-Event-ID", "0")]
+    )
+    assert status == 200
+    assert headers["content-type"].startswith("text/event-stream")
+    assert headers["access-control-allow-origin"] == "https://app.example"
+    assert "event: message" in body and '"content": "hello"' in body
+    assert ": keepalive" in body
+
+
+def test_stream_is_rate_limited(stream_app):
+    statuses = []
+    while 429 not in statuses and len(statuses) < 500:
+        statuses.append(open_stream(stream_app, disconnect_after=0)[0])
+    assert statuses[-1] == 429
+    assert set(statuses[:-1]) == {401}
@@ -0,0 +1,50 @@
+"""Multi-get `/batch` endpoints."""
+
+from conftest import register
+from extensions import db
+from models import User
+
+
+def login(client, username):
+    resp = client.post("/api/auth/login", json={"email": f"{username}@example.com", "password": "secret123"})
+    assert resp.status_code == 200, resp.get_json()
+
+
+def test_posts_come_back_in_request_order_with_missing_ids(client):
+    register(client, "farmer")
+    ids = [client.post("/api/posts", json={"content": f"post {i}"}).get_json()["id"] for i in range(3)]
+
+    resp = client.get(f"/api/posts/batch?ids={ids[2]},999,{ids[0]}&ids={ids[1]},{ids[2]}")
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert [post["id"] for post in body["posts"]] == [ids[2], ids[0], ids[1]]
+    assert body["missing"] == [999]
+
+
+def test_batch_size_and_id_validation(client, app):
+    register(client, "farmer")
+    app.config["BATCH_MAX_IDS"] = 3
+    assert client.get("/api/posts/batch?ids=1,2,3").status_code == 200
+    resp = client.get("/api/users/batch?ids=1,2,3,4")
+    assert resp.status_code == 400
+    assert "at most 3 ids" in resp.get_json()["message"]
+    assert client.get("/api/posts/batch?ids=").status_code == 400
+    assert client.get("/api/posts/batch?ids=1,two").status_code == 400
+
+
+def test_user_emails_only_for_self_or_admin(client):
+    me = register(client, "farmer")
+    other = register(client, "neighbour")
+    login(client, "farmer")
+
+    users = client.get(f"/api/users/batch?ids={other},{me},404").get_json()
+    assert [u["id"] for u in users["users"]] == [other, me]
+    assert users["missing"] == [404]
+    assert "email" not in users["users"][0]
+    assert users["users"][1]["email"] == "farmer@example.com"
+
+    db.session.get(User, me).set_role_by_name("admin")
+    db.session.commit()
+    login(client, "farmer")
+    users = client.get(f"/api/users/batch?ids={other},{me}").get_json()["users"]
+    assert [u["email"] for u in users] == ["neighbour@example.com", "farmer@example.com"]
@@ -0,0 +1,78 @@
+"""Response cache invalidation and filesystem backend housekeeping."""
+
+import os
+import time
+
+from flask import Response
+
+from cache import FileSystemBackend, MemoryBackend, ResponseCache, invalidate
+from conftest import register
+
+
+def test_writes_invalidate_cached_post(client):
+    register(client, "farmer")
+    post = client.post("/api/posts", json={"content": "Rust on leaves"}).get_json()["id"]
+
+    assert client.get(f"/api/posts/{post}").headers["X-Cache"] == "MISS"
+    assert client.get(f"/api/posts/{post}").headers["X-Cache"] == "HIT"
+
+    client.post(f"/api/posts/{post}/like")
+    resp = client.get(f"/api/posts/{post}")
+    assert resp.headers["X-Cache"] == "MISS"
+    assert resp.get_json()["likes_count"] == 1
+
+
+def test_filesystem_invalidation_reaches_other_processes(tmp_path):
+    # Two backends over one directory stand in for two worker processes
+    web = ResponseCache(FileSystemBackend(str(tmp_path)), default_ttl=60)
+    worker = ResponseCache(FileSystemBackend(str(tmp_path)), default_ttl=60)
+
+    web.store("resp:post", Response("v1"), {"post:1"}, web.now())
+    assert web.lookup("resp:post") is not None
+
+    worker.invalidate("post:1")
+    assert web.lookup("resp:post") is None
+
+
+def test_write_during_rendering_is_not_cached(app, client, monkeypatch):
+    register(client, "farmer")
+    post = client.post("/api/posts", json={"content": "Rust on leaves"}).get_json()["id"]
+
+    # A like commits after the view read the post but before it was stored
+    from models import Post
+    to_dict = Post.to_dict
+
+    def racing_to_dict(self, *args, **kwargs):
+        body = to_dict(self, *args, **kwargs)
+        invalidate(f"post:{post}")
+        return body
+
+    monkeypatch.setattr(Post, "to_dict", racing_to_dict)
+    assert client.get(f"/api/posts/{post}").headers["X-Cache"] == "MISS"
+    monkeypatch.undo()
+    assert client.get(f"/api/posts/{post}").headers["X-Cache"] == "MISS"
+    assert client.get(f"/api/posts/{post}").headers["X-Cache"] == "HIT"
+
+
+def test_entry_read_before_an_invalidation_is_dropped():
+    cache = ResponseCache(MemoryBackend(), default_ttl=60)
+    started = cache.now()
+    cache.invalidate("post:1")
+    cache.store("resp:post", Response("stale"), {"post:1"}, started)
+    assert cache.lookup("resp:post") is None
+
+    cache.store("resp:post", Response("fresh"), {"post:1"}, cache.now())
+    assert cache.lookup("resp:post")["body"] == b"fresh"
+
+
+def test_filesystem_purge_drops_only_expired_files(tmp_path):
+    backend = FileSystemBackend(str(tmp_path))
+    backend.set("fresh", 1, ttl=60)
+    backend.set("stale", 2, ttl=60)
+    stale = backend._file("stale")
+    past = time.time() - backend.PURGE_GRACE - 1
+    os.utime(stale, (past, past))
+
+    assert backend.purge() == 1
+    assert not os.path.exists(stale)
+    assert backend.get("fresh") == 1
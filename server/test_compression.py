@@ -0,0 +1,79 @@
+"""Accept-Encoding negotiation and response compression."""
+
+import gzip
+import json
+
+import pytest
+from flask import Response, jsonify
+
+import compression
+
+BIG = {"rows": ["maize rust on leaves"] * 200}
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    # A stand-in second codec, so preferences don't depend on optional packages
+    monkeypatch.setattr(compression, "available_codecs", lambda: {
+        "gzip": compression._gzip,
+        "br": lambda data, config: b"br:" + data,
+    })
+
+    @app.get("/test/big")
+    def big():
+        return jsonify(BIG)
+
+    @app.get("/test/small")
+    def small():
+        return jsonify({"ok": True})
+
+    @app.get("/test/stream")
+    def stream():
+        return Response((f"data: {i}\n\n" for i in range(500)), mimetype="text/event-stream")
+
+    @app.get("/test/stream-json")
+    def stream_json():
+        return Response((b"[]" for _ in range(1)), mimetype="application/json")
+
+    return app.test_client()
+
+
+def get(client, path, accept):
+    return client.get(path, headers={"Accept-Encoding": accept} if accept is not None else {})
+
+
+@pytest.mark.parametrize("accept, encoding", [
+    ("gzip", "gzip"),
+    ("gzip, br", "br"),  # equal weights: COMPRESS_ALGORITHMS order
+    ("br;q=0.5, gzip", "gzip"),
+    ("*", "br"),
+    ("gzip;q=0, br;q=0", None),
+    ("identity", None),
+    ("deflate, compress", None),
+    (None, None),
+])
+def test_encoding_negotiation(client, accept, encoding):
+    resp = get(client, "/test/big", accept)
+    assert resp.headers.get("Content-Encoding") == encoding
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    if encoding == "gzip":
+        assert json.loads(gzip.decompress(resp.get_data())) == BIG
+    elif encoding is None:
+        assert resp.get_json() == BIG
+
+
+def test_small_bodies_are_sent_uncompressed(client, app):
+    resp = get(client, "/test/small", "gzip")
+    assert "Content-Encoding" not in resp.headers
+    assert "Accept-Encoding" in resp.headers["Vary"]
+
+    app.config["COMPRESS_MIN_SIZE"] = 1
+    assert get(client, "/test/small", "gzip").headers["Content-Encoding"] == "gzip"
+
+
+def test_streamed_responses_are_not_buffered(client):
+    for path in ("/test/stream", "/test/stream-json"):
+        resp = get(client, path, "gzip")
+        assert "Content-Encoding" not in resp.headers
+        assert "Accept-Encoding" not in resp.headers.get("Vary", "")
+    assert get(client, "/test/stream", "gzip").get_data().startswith(b"data: 0\n\n")
@@ -0,0 +1,71 @@
+"""Conditional GETs: 304s while unchanged, new validators after writes."""
+
+from conftest import register
+
+
+def login(client, username):
+    resp = client.post("/api/auth/login", json={"email": f"{username}@example.com", "password": "secret123"})
+    assert resp.status_code == 200, resp.get_json()
+
+
+def revalidate(client, path, etag):
+    return client.get(path, headers={"If-None-Match": etag})
+
+
+def test_unchanged_post_is_not_modified(client):
+    register(client, "author")
+    post_id = client.post("/api/posts", json={"content": "maize"}).get_json()["id"]
+    first = client.get(f"/api/posts/{post_id}")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Last-Modified"]
+
+    resp = revalidate(client, f"/api/posts/{post_id}", etag)
+    assert resp.status_code == 304
+    assert resp.data == b""
+    assert resp.headers["ETag"] == etag
+
+    since = client.get(f"/api/posts/{post_id}", headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert since.status_code == 304
+
+    client.post(f"/api/posts/{post_id}/like")
+    resp = revalidate(client, f"/api/posts/{post_id}", etag)
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    assert resp.get_json()["likes_count"] == 1
+
+
+def test_community_list_changes_with_offsetting_counters(client):
+    register(client, "a")
+    first = client.post("/api/communities", json={"name": "Maize"}).get_json()["id"]
+    register(client, "b")
+    second = client.post("/api/communities", json={"name": "Beans"}).get_json()["id"]
+    register(client, "c")
+    assert client.post(f"/api/communities/{first}/join").status_code == 201
+    etag = client.get("/api/communities").headers["ETag"]
+    assert revalidate(client, "/api/communities", etag).status_code == 304
+
+    # Total members across communities stays the same
+    assert client.delete(f"/api/communities/{first}/leave").status_code == 200
+    assert client.post(f"/api/communities/{second}/join").status_code == 201
+    resp = revalidate(client, "/api/communities", etag)
+    assert resp.status_code == 200
+    counts = {c["id"]: c["members_count"] for c in resp.get_json()["communities"]}
+    assert counts == {first: 1, second: 2}
+
+
+def test_user_etag_varies_with_email_visibility(client):
+    user_id = register(client, "farmer")
+    own = client.get(f"/api/users/{user_id}")
+    assert own.get_json()["email"] == "farmer@example.com"
+    assert revalidate(client, f"/api/users/{user_id}", own.headers["ETag"]).status_code == 304
+
+    register(client, "neighbour")
+    other = revalidate(client, f"/api/users/{user_id}", own.headers["ETag"])
+    assert other.status_code == 200
+    assert "email" not in other.get_json()
+    assert revalidate(client, f"/api/users/{user_id}", other.headers["ETag"]).status_code == 304
+
+    login(client, "farmer")
+    client.patch(f"/api/users/{user_id}", json={"bio": "Maize and beans"})
+    assert revalidate(client, f"/api/users/{user_id}", own.headers["ETag"]).status_code == 200
@@ -0,0 +1,76 @@
+"""Thread list and unread state for direct and community conversations."""
+
+from conftest import register
+from counters import reconcile_counters
+from extensions import db
+from models import ConversationParticipant, User
+
+
+def test_threads_merge_direct_and_community_by_recency(client):
+    grower = register(client, "grower")
+    client.post("/api/auth/logout")
+    trader = register(client, "trader")
+    client.post("/api/auth/logout")
+    me = register(client, "farmer")
+    maize = client.post("/api/communities", json={"name": "Maize"}).get_json()["id"]
+    beans = client.post("/api/communities", json={"name": "Beans"}).get_json()["id"]
+
+    client.post("/api/messages", json={"content": "a", "receiver_id": grower})
+    client.post("/api/messages", json={"content": "b", "community_id": maize})
+    client.post("/api/messages", json={"content": "c", "receiver_id": trader})
+    client.post("/api/messages", json={"content": "d", "community_id": beans})
+
+    threads, cursor = [], ""
+    while cursor is not None:
+        body = client.get(f"/api/messages/conversations?per_page=1&cursor={cursor}").get_json()
+        threads += [t["last_message"]["content"] for t in body["conversations"]]
+        cursor = body["next_cursor"]
+    assert threads == ["d", "c", "b", "a"]
+
+    # Community sends don't write to members' participant rows
+    channel_rows = ConversationParticipant.query.filter(
+        ConversationParticipant.user_id == me,
+        ConversationParticipant.conversation.has(kind="community"),
+    ).all()
+    assert len(channel_rows) == 2
+    assert all(p.last_message_at is None for p in channel_rows)
+
+
+def login(client, username):
+    client.post("/api/auth/logout")
+    resp = client.post("/api/auth/login", json={"email": f"{username}@example.com", "password": "secret123"})
+    assert resp.status_code == 200, resp.get_json()
+
+
+def test_unread_counts_direct_and_community(client, monkeypatch):
+    import conversations
+
+    monkeypatch.setattr(conversations, "COMMUNITY_UNREAD_CAP", 5)
+    reader = register(client, "reader")
+    client.post("/api/auth/logout")
+    register(client, "writer")
+    community = client.post("/api/communities", json={"name": "Maize"}).get_json()["id"]
+    login(client, "reader")
+    client.post(f"/api/communities/{community}/join")
+    login(client, "writer")
+    for i in range(7):
+        client.post("/api/messages", json={"content": f"c{i}", "community_id": community})
+    for i in range(2):
+        client.post("/api/messages", json={"content": f"d{i}", "receiver_id": reader})
+
+    # Only the direct recipient's counters are written
+    assert db.session.get(User, reader).unread_messages_count == 2
+
+    login(client, "reader")
+    assert client.get("/api/messages/unread").get_json()["unread_count"] == 2 + 5
+    threads = client.get("/api/messages/conversations").get_json()["conversations"]
+    assert {t["kind"]: t["unread_count"] for t in threads} == {"direct": 2, "community": 5}
+
+    channel = next(t for t in threads if t["kind"] == "community")
+    resp = client.post(f"/api/messages/conversations/{channel['id']}/read")
+    assert resp.get_json()["unread_count"] == 0
+    assert client.get("/api/messages/unread").get_json()["unread_count"] == 2
+
+    # Reconciling leaves community channels to the read-time count
+    reconcile_counters()
+    assert db.session.get(User, reader).unread_messages_count == 2
@@ -0,0 +1,28 @@
+"""Incremental engagement score refresh."""
+
+from conftest import register
+from engagement import refresh_engagement
+from extensions import db
+from models import Comment, User
+
+
+def test_refresh_picks_up_rows_committed_below_the_watermark(client):
+    user_id = register(client, "farmer")
+    post_id = client.post("/api/posts", json={"content": "maize"}).get_json()["id"]
+    for text in ("first", "second"):
+        assert client.post(f"/api/posts/{post_id}/comments", json={"content": text}).status_code == 201
+
+    # Comment 1 is still in flight when the job records position 2
+    first = db.session.get(Comment, 1)
+    created_at = first.created_at
+    db.session.delete(first)
+    db.session.commit()
+    refresh_engagement()
+    refresh_engagement()
+    assert db.session.get(User, user_id).engagement_score == 2
+
+    db.session.add(Comment(id=1, user_id=user_id, post_id=post_id, content="first", created_at=created_at))
+    db.session.commit()
+    refresh_engagement()
+    db.session.expire_all()
+    assert db.session.get(User, user_id).engagement_score == 4
@@ -0,0 +1,61 @@
+"""Sparse fieldsets (`?fields=`) and relationship expansion (`?expand=`)."""
+
+from sqlalchemy import event
+
+from conftest import register
+from extensions import db
+
+
+def selects(client, url):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(" ".join(statement.split()))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        resp = client.get(url)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+    assert resp.status_code == 200, resp.get_json()
+    return resp.get_json(), statements
+
+
+def test_unknown_fields_and_expansions_are_rejected(client):
+    register(client, "farmer")
+    resp = client.get("/api/posts?fields=id,password")
+    assert resp.status_code == 400
+    assert "unknown field 'password'" in resp.get_json()["message"]
+
+    resp = client.get("/api/posts?expand=likes")
+    assert resp.status_code == 400
+    assert "unknown expansion 'likes'" in resp.get_json()["message"]
+
+
+def test_fields_load_only_the_requested_columns(client):
+    register(client, "farmer")
+    client.post("/api/posts", json={"title": "Maize", "content": "a long description"})
+
+    body, statements = selects(client, "/api/posts?fields=id,title&expand=")
+    assert body["posts"] == [{"id": 1, "title": "Maize"}]
+    page = [s for s in statements if "FROM posts" in s and "count(" not in s.lower()]
+    assert page
+    assert all("posts.content" not in s and "posts.likes_count" not in s for s in page)
+
+
+def test_expansions_are_embedded_with_one_query_per_relation(client):
+    register(client, "farmer")
+    community = client.post("/api/communities", json={"name": "Maize growers"}).get_json()["id"]
+    for i in range(3):
+        client.post("/api/posts", json={"content": f"post {i}", "community_id": community})
+
+    body, statements = selects(client, "/api/posts?expand=author,community")
+    assert [post["author"]["username"] for post in body["posts"]] == ["farmer"] * 3
+    assert [post["community"]["name"] for post in body["posts"]] == ["Maize growers"] * 3
+    assert "images" not in body["posts"][0]
+    assert len([s for s in statements if "FROM users" in s and " IN (" in s]) == 1
+    assert len([s for s in statements if "FROM communities" in s and " IN (" in s]) == 1
+
+    body, _ = selects(client, "/api/posts?fields=id&expand=images")
+    assert body["posts"][0] == {"id": 3, "images": []}
@@ -0,0 +1,81 @@
+"""Password hashing: load shedding, the pending-job limit and rehashing."""
+
+import threading
+
+import pytest
+
+import hashing
+from conftest import register
+from extensions import db
+from hashing import HashingBusy
+from models import User
+
+
+@pytest.fixture
+def slots(app, monkeypatch):
+    """Rebuild the hashing slots with room for two jobs and a short wait."""
+    app.config["PASSWORD_HASH_MAX_PENDING"] = 2
+    app.config["PASSWORD_HASH_QUEUE_TIMEOUT"] = 0.05
+    monkeypatch.setattr(hashing, "_slots", None)
+    return hashing._pool()[1]
+
+
+def test_pending_hash_jobs_are_limited(app, slots):
+    started = threading.Semaphore(0)
+    release = threading.Event()
+
+    def slow(value):
+        started.release()
+        release.wait(5)
+        return value
+
+    def run():
+        with app.app_context():
+            results.append(hashing._run(slow, "done"))
+
+    results = []
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for _ in threads:
+        assert started.acquire(timeout=5)
+
+    with pytest.raises(HashingBusy):
+        hashing._run(slow, "third")
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["done", "done"]
+    assert hashing._run(str.upper, "free again") == "FREE AGAIN"
+
+
+def test_busy_hashing_is_a_503(client, slots):
+    register(client, "farmer")
+    for _ in range(2):
+        slots.acquire()
+    try:
+        resp = client.post("/api/auth/login", json={"email": "farmer@example.com", "password": "secret123"})
+    finally:
+        for _ in range(2):
+            slots.release()
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+
+
+def test_login_rehashes_with_new_parameters(client, app):
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+    user_id = register(client, "farmer")
+    old_hash = db.session.get(User, user_id).password_hash
+    assert old_hash.startswith("pbkdf2:sha256:1000$")
+
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:2000"
+    login = {"email": "farmer@example.com", "password": "secret123"}
+    assert client.post("/api/auth/login", json=login).status_code == 200
+    db.session.expire_all()
+    new_hash = db.session.get(User, user_id).password_hash
+    assert new_hash.startswith("pbkdf2:sha256:2000$")
+
+    assert client.post("/api/auth/login", json=login).status_code == 200
+    db.session.expire_all()
+    assert db.session.get(User, user_id).password_hash == new_hash
+    assert client.post("/api/auth/login", json=dict(login, password="wrong")).status_code == 401
@@ -0,0 +1,45 @@
+"""Idempotent likes, follows and joins, and buffered like counts."""
+
+from conftest import register
+from counters import CounterBuffer
+from extensions import db
+from models import Community, Post, User
+
+
+def test_repeated_like_follow_and_join_return_the_existing_row(client):
+    author = register(client, "author")
+    post_id = client.post("/api/posts", json={"content": "maize"}).get_json()["id"]
+    community_id = client.post("/api/communities", json={"name": "Maize growers"}).get_json()["id"]
+    register(client, "fan")
+
+    for path in (f"/api/posts/{post_id}/like", f"/api/users/{author}/follow", f"/api/communities/{community_id}/join"):
+        first = client.post(path)
+        again = client.post(path)
+        assert (first.status_code, again.status_code) == (201, 200), path
+        row = [resp.get_json().get("follow", resp.get_json()) for resp in (first, again)]
+        assert row[0]["id"] == row[1]["id"], path
+
+    db.session.expire_all()
+    assert db.session.get(Post, post_id).likes_count == 1
+    assert db.session.get(User, author).followers_count == 1
+    assert db.session.get(Community, community_id).members_count == 2
+
+    assert client.post("/api/posts/999/like").status_code == 404
+    assert client.post("/api/communities/999/join").status_code == 404
+
+
+def test_like_counts_are_written_when_the_buffer_flushes(app, client, monkeypatch):
+    buffer = CounterBuffer(app, interval=3600)
+    monkeypatch.setitem(app.extensions, "counter_buffer", buffer)
+    register(client, "author")
+    post_id = client.post("/api/posts", json={"content": "maize"}).get_json()["id"]
+    for name in ("a", "b"):
+        register(client, name)
+        client.post(f"/api/posts/{post_id}/like")
+    client.delete(f"/api/posts/{post_id}/like")
+
+    db.session.expire_all()
+    assert db.session.get(Post, post_id).likes_count == 0
+    buffer.flush()
+    db.session.expire_all()
+    assert db.session.get(Post, post_id).likes_count == 1
@@ -0,0 +1,42 @@
+"""The orjson-backed JSON provider matches Flask's default output."""
+
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import FastJSONProvider
+
+
+@dataclass
+class Point:
+    x: int
+    y: int
+
+
+def test_values_serialize_as_with_the_default_provider(app):
+    value = {
+        "aware": datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc),
+        "naive": datetime(2024, 5, 1, 12, 30),
+        "day": date(2024, 5, 1),
+        "price": Decimal("1.10"),
+        "id": uuid.UUID(int=5),
+        "point": Point(1, 2),
+        "text": "mahindi na maharagwe é",
+        "nested": [1, 2.5, None, True],
+    }
+    fast = FastJSONProvider(app).dumps(value)
+    assert json.loads(fast) == json.loads(DefaultJSONProvider(app).dumps(value))
+    assert json.loads(fast)["naive"] == "Wed, 01 May 2024 12:30:00 GMT"
+    assert json.loads(fast)["price"] == "1.10"
+
+
+def test_jsonify_response_round_trips(app):
+    with app.test_request_context():
+        resp = app.json.response({"b": 1, "a": [Decimal("2.5")]})
+    assert resp.mimetype == "application/json"
+    assert resp.get_data().endswith(b"\n")
+    assert app.json.loads(resp.get_data()) == {"a": ["2.5"], "b": 1}
@@ -0,0 +1,41 @@
+"""Notifications coalesce events per target and window."""
+
+from conftest import register
+
+
+def login(client, username):
+    resp = client.post("/api/auth/login", json={"email": f"{username}@example.com", "password": "secret123"})
+    assert resp.status_code == 200, resp.get_json()
+
+
+def run_jobs(app):
+    while app.extensions["outbox_runner"].run_once():
+        pass
+
+
+def test_likes_coalesce_into_one_notification(app, client):
+    register(client, "author")
+    post_id = client.post("/api/posts", json={"content": "maize"}).get_json()["id"]
+    client.post(f"/api/posts/{post_id}/like")  # own like: no notification
+    for name in ("a", "b"):
+        register(client, name)
+        client.post(f"/api/posts/{post_id}/like")
+    run_jobs(app)
+
+    login(client, "author")
+    body = client.get("/api/notifications").get_json()
+    assert [(n["kind"], n["target_id"], n["count"], n["read"]) for n in body["notifications"]] == [
+        ("like", post_id, 2, False)
+    ]
+    assert body["notifications"][0]["last_actor"]["username"] == "b"
+    assert body["unread_count"] == 1
+
+    assert client.post("/api/notifications/read").get_json() == {"unread_count": 0}
+
+    register(client, "c")
+    client.post(f"/api/posts/{post_id}/like")
+    run_jobs(app)
+    login(client, "author")
+    body = client.get("/api/notifications").get_json()
+    assert [(n["count"], n["read"]) for n in body["notifications"]] == [(3, False)]
+    assert body["unread_count"] == 1
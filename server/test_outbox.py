@@ -0,0 +1,86 @@
+"""Outbox delivery, retries and dead-lettering."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select, update
+
+from extensions import db
+from models import OutboxJob
+from outbox import emit, subscriber
+
+calls = []
+failures = {"left": 0}
+
+
+@subscriber("test.happened")
+def record(value):
+    calls.append(value)
+    if failures["left"]:
+        failures["left"] -= 1
+        raise RuntimeError("subscriber failed")
+
+
+@pytest.fixture
+def runner(app):
+    calls.clear()
+    failures["left"] = 0
+    return app.extensions["outbox_runner"]
+
+
+def make_ready():
+    """Skip the retry backoff."""
+    db.session.execute(update(OutboxJob).values(run_after=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+
+
+def only_job():
+    db.session.expire_all()
+    return db.session.scalars(select(OutboxJob)).one()
+
+
+def test_uncommitted_events_queue_nothing(runner):
+    emit("test.happened", value=1)
+    db.session.rollback()
+    emit("nobody.listens", value=1)
+    db.session.commit()
+    assert db.session.scalar(select(func.count()).select_from(OutboxJob)) == 0
+
+
+def test_failed_job_is_retried_then_deleted(runner):
+    failures["left"] = 1
+    emit("test.happened", value=7)
+    db.session.commit()
+
+    assert runner.run_once() == 1
+    job = only_job()
+    assert (job.status, job.attempts) == ("pending", 1)
+    assert "subscriber failed" in job.last_error
+    assert runner.run_once() == 0  # backing off
+
+    make_ready()
+    assert runner.run_once() == 1
+    assert calls == [7, 7]
+    assert db.session.scalar(select(func.count()).select_from(OutboxJob)) == 0
+
+
+def test_job_is_dead_after_max_attempts(runner, monkeypatch):
+    monkeypatch.setattr(runner, "max_attempts", 3)
+    failures["left"] = 10
+    emit("test.happened", value=7)
+    db.session.commit()
+
+    for _ in range(3):
+        make_ready()
+        assert runner.run_once() == 1
+    assert (only_job().status, only_job().attempts) == ("dead", 3)
+    make_ready()
+    assert runner.run_once() == 0
+    assert calls == [7, 7, 7]
+
+
+def test_claimed_job_is_leased(runner):
+    emit("test.happened", value=7)
+    db.session.commit()
+    assert len(runner.claim()) == 1
+    assert runner.claim() == []
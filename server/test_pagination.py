@@ -0,0 +1,36 @@
+"""Cursor pagination edge cases."""
+
+import pytest
+
+from conftest import register
+
+
+@pytest.mark.parametrize("per_page", ["0", "-1"])
+def test_per_page_is_at_least_one(client, per_page):
+    register(client, "farmer")
+    for i in range(3):
+        client.post("/api/posts", json={"content": f"post {i}"})
+
+    resp = client.get(f"/api/posts?cursor=&per_page={per_page}")
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert len(body["posts"]) == 1
+    assert body["next_cursor"]
+
+
+def test_follower_lists_keep_the_full_bare_list_without_a_cursor(client):
+    target = register(client, "expert")
+    for name in ("a", "b", "c"):
+        register(client, name)
+        assert client.post(f"/api/users/{target}/follow").status_code == 201
+
+    legacy = client.get(f"/api/users/{target}/followers?per_page=2").get_json()
+    assert [f["user"]["username"] for f in legacy] == ["c", "b", "a"]
+
+    body = client.get(f"/api/users/{target}/followers?cursor=&per_page=2").get_json()
+    assert [f["user"]["username"] for f in body["followers"]] == ["c", "b"]
+    assert body["next_cursor"]
+
+    me = client.get("/api/auth/me").get_json()["user"]["id"]
+    following = client.get(f"/api/users/{me}/following").get_json()
+    assert [f["user"]["id"] for f in following] == [target]
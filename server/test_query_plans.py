@@ -0,0 +1,115 @@
+"""
+Query-plan regression tests.
+
+Each hot route is exercised through the test client while its SELECTs are
+captured, then every captured statement is run through SQLite's
+`EXPLAIN QUERY PLAN`. A full table scan or a temp B-tree for ORDER BY
+(a filesort) means an index is missing or a query stopped matching one.
+"""
+
+import re
+
+import pytest
+from sqlalchemy import event
+
+from conftest import register
+from extensions import db
+
+
+@pytest.fixture
+def seeded(client):
+    other = register(client, "grower")
+    client.post("/api/auth/logout")
+    me = register(client, "farmer")
+    community = client.post("/api/communities", json={"name": "Maize"}).get_json()["id"]
+    post = client.post("/api/posts", json={"content": "Rust on leaves", "community_id": community}).get_json()["id"]
+    client.post(f"/api/posts/{post}/comments", json={"content": "Try copper spray"})
+    client.post("/api/messages", json={"content": "hi", "receiver_id": other})
+    client.post("/api/messages", json={"content": "hello all", "community_id": community})
+    return {"me": me, "other": other, "community": community, "post": post}
+
+
+def captured_selects(client, method, url, **kwargs):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        resp = client.open(url, method=method, **kwargs)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+    assert resp.status_code < 400, (url, resp.get_json())
+    return statements
+
+
+def plan_problems(statement, parameters):
+    tables = set(db.metadata.tables)
+    rows = db.session.connection().exec_driver_sql(
+        "EXPLAIN QUERY PLAN " + statement, parameters
+    ).fetchall()
+    problems = []
+    for row in rows:
+        detail = row[-1]
+        scan = re.match(r"SCAN (\w+)", detail)
+        if scan and scan.group(1) in tables and "USING" not in detail:
+            problems.append(detail)
+        if "USE TEMP B-TREE FOR ORDER BY" in detail:
+            problems.append(detail)
+    return problems
+
+
+ROUTES = [
+    ("GET", "/api/posts"),
+    ("GET", "/api/posts?cursor="),
+    ("GET", "/api/posts?expand=author,community,images&fields=id,title"),
+    ("GET", "/api/posts/{post}"),
+    ("GET", "/api/posts/batch?ids={post},{post}"),
+    ("GET", "/api/users/batch?ids={other},{me}"),
+    ("GET", "/api/communities/batch?ids={community}"),
+    ("GET", "/api/posts/feed"),
+    ("GET", "/api/posts/trending"),
+    ("GET", "/api/posts/trending?community_id={community}"),
+    ("GET", "/api/communities/{community}/posts"),
+    ("GET", "/api/communities/{community}/posts?cursor="),
+    ("GET", "/api/communities/{community}/members"),
+    ("GET", "/api/messages/user/{other}"),
+    ("GET", "/api/messages/user/{other}?cursor="),
+    ("GET", "/api/messages/community/{community}"),
+    ("GET", "/api/messages/community/{community}?cursor="),
+    ("GET", "/api/messages/conversations"),
+    ("GET", "/api/messages/conversations?cursor="),
+    ("GET", "/api/messages/unread"),
+    ("GET", "/api/users/inbox"),
+    ("GET", "/api/users/inbox?cursor="),
+    ("GET", "/api/users/{other}/followers"),
+    ("GET", "/api/users/{me}/following"),
+    ("GET", "/api/users/{other}/followers?cursor=&include_total=1"),
+    ("GET", "/api/users/relationships?ids={other},{me}"),
+    ("GET", "/api/users/suggestions"),
+    ("GET", "/api/notifications"),
+    ("GET", "/api/notifications/unread"),
+    ("GET", "/api/users/experts"),
+    ("GET", "/api/users/experts?location=Nakuru&cursor="),
+    ("POST", "/api/posts/{post}/like"),
+    ("DELETE", "/api/posts/{post}/like"),
+    ("POST", "/api/users/{other}/follow"),
+    ("DELETE", "/api/users/{other}/follow"),
+    ("DELETE", "/api/communities/{community}/leave"),
+    ("POST", "/api/communities/{community}/join"),
+]
+
+
+def test_hot_routes_use_indexes(client, seeded):
+    failures = {}
+    for method, template in ROUTES:
+        url = template.format(**seeded)
+        for statement, parameters in captured_selects(client, method, url):
+            problems = plan_problems(statement, parameters)
+            if problems:
+                failures.setdefault(f"{method} {url}", []).append(
+                    (" ".join(statement.split())[:160], problems)
+                )
+    assert not failures, failures
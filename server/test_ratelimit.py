@@ -0,0 +1,59 @@
+"""Rate limits on the login endpoint."""
+
+import pytest
+
+from app import create_app
+from conftest import TestConfig
+from extensions import db
+
+
+class LimitedConfig(TestConfig):
+    RATELIMIT_ENABLED = True
+    RATELIMIT_STORAGE_URI = "memory://"
+
+
+@pytest.fixture
+def limited_client():
+    app = create_app(LimitedConfig)
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+def attempt(client, email, ip):
+    return client.post(
+        "/api/auth/login",
+        json={"email": email, "password": "wrong-password"},
+        environ_base={"REMOTE_ADDR": ip},
+    ).status_code
+
+
+def test_login_limited_per_account(limited_client):
+    codes = [attempt(limited_client, "victim@example.com", f"10.0.0.{i}") for i in range(11)]
+    assert codes[:10] == [401] * 10
+    assert codes[10] == 429
+
+
+def test_login_limited_per_address(limited_client):
+    codes = [attempt(limited_client, f"user{i}@example.com", "10.0.0.1") for i in range(31)]
+    assert codes[:30] == [401] * 30
+    assert codes[30] == 429
+    # Other addresses are unaffected
+    assert attempt(limited_client, "someone@example.com", "10.0.0.2") == 401
+
+
+def test_sqlite_storage_with_limits_strategies(tmp_path):
+    from limits import parse
+    from limits.strategies import FixedWindowRateLimiter
+
+    from ratelimit import SQLiteStorage
+
+    storage = SQLiteStorage(f"sqlite:///{tmp_path}/limits.db")
+    limiter = FixedWindowRateLimiter(storage)
+    limit = parse("2 per minute")
+    assert [limiter.hit(limit, "user:1") for _ in range(3)] == [True, True, False]
+    assert limiter.hit(limit, "user:2")
+    assert limiter.hit(parse("10 per minute"), "user:3", cost=5)
+    assert not limiter.hit(parse("10 per minute"), "user:3", cost=6)
@@ -0,0 +1,50 @@
+"""Admin checks must follow role changes immediately, not after the claims TTL."""
+
+from conftest import register
+from extensions import db
+from models import User
+
+
+def login(client, username):
+    resp = client.post("/api/auth/login", json={"email": f"{username}@example.com", "password": "secret123"})
+    assert resp.status_code == 200, resp.get_json()
+
+
+def make_admin(client, username):
+    user_id = register(client, username)
+    user = db.session.get(User, user_id)
+    user.set_role_by_name("admin")
+    db.session.commit()
+    login(client, username)
+    return user_id
+
+
+def test_admin_route_allows_admin(client):
+    make_admin(client, "boss")
+    assert client.get("/api/users/admin/health").status_code == 200
+
+
+def test_demoted_admin_loses_access_immediately(client):
+    user_id = make_admin(client, "boss")
+
+    user = db.session.get(User, user_id)
+    user.set_role_by_name("user")
+    db.session.commit()
+    db.session.remove()
+
+    assert client.get("/api/users/admin/health").status_code in (401, 403)
+
+
+def test_deleted_admin_loses_access_immediately(client):
+    user_id = make_admin(client, "boss")
+
+    db.session.delete(db.session.get(User, user_id))
+    db.session.commit()
+    db.session.remove()
+
+    assert client.get("/api/users/admin/health").status_code == 401
+
+
+def test_regular_user_is_refused(client):
+    register(client, "farmer")
+    assert client.get("/api/users/admin/health").status_code == 403
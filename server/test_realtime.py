@@ -0,0 +1,40 @@
+"""Message stream catch-up after a reconnect."""
+
+from conftest import register
+
+
+def first_event(client, last_event_id):
+    """Read the stream up to its first event (the stream itself never ends)."""
+    resp = client.get("/api/messages/stream", headers={"Last-Event-ID": str(last_event_id)}, buffered=False)
+    try:
+        for chunk in resp.response:
+            chunk = chunk if isinstance(chunk, str) else chunk.decode()
+            if "event: " in chunk:
+                return chunk
+    finally:
+        resp.close()
+
+
+def send_messages(client, receiver_id, count):
+    for i in range(count):
+        assert client.post("/api/messages", json={"content": f"m{i}", "receiver_id": receiver_id}).status_code == 201
+
+
+def test_small_backlog_is_replayed(client):
+    other = register(client, "grower")
+    client.post("/api/auth/logout")
+    register(client, "farmer")
+    send_messages(client, other, 3)
+
+    event = first_event(client, 0)
+    assert "event: message" in event
+    assert '"content": "m0"' in event
+
+
+def test_backlog_over_limit_sends_resync(client):
+    other = register(client, "grower")
+    client.post("/api/auth/logout")
+    register(client, "farmer")
+    send_messages(client, other, 101)
+
+    assert "event: resync" in first_event(client, 0)
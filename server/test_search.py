@@ -0,0 +1,36 @@
+"""Ranked search pagination."""
+
+from sqlalchemy.dialects import postgresql
+
+from conftest import register
+from search import _pg_tsquery, query_terms
+
+
+def test_cursor_pages_through_tied_scores(client):
+    register(client, "farmer")
+    # Identical documents rank identically, so only the id breaks ties
+    created = {client.post("/api/posts", json={"content": "maize rust on leaves"}).get_json()["id"] for _ in range(5)}
+    client.post("/api/posts", json={"content": "maize rust on leaves and stems, maize everywhere"})
+
+    seen, cursor = [], ""
+    while cursor is not None:
+        body = client.get(f"/api/search?q=rust&type=posts&per_page=2&cursor={cursor}").get_json()
+        seen += [post["id"] for post in body["posts"]]
+        cursor = body["next_cursor"]
+
+    assert len(seen) == len(set(seen)) == 6
+    assert created <= set(seen)
+
+
+def test_operator_words_are_plain_terms(client):
+    register(client, "farmer")
+    client.post("/api/posts", json={"content": "maize beans"})
+    both = client.post("/api/posts", json={"content": "maize or beans"}).get_json()["id"]
+
+    body = client.get("/api/search?q=maize or bean&type=posts").get_json()
+    assert [post["id"] for post in body["posts"]] == [both]
+
+    tsquery = _pg_tsquery(query_terms('maize OR -beans "rust'))
+    compiled = tsquery.compile(dialect=postgresql.dialect())
+    assert str(compiled).startswith("to_tsquery(")
+    assert list(compiled.params.values()) == ["english", "maize & OR & beans & rust:*"]
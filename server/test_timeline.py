@@ -0,0 +1,90 @@
+"""Home timeline fan-out, backfill, pruning and the fan-out-on-read fallback."""
+
+from sqlalchemy import select
+
+from conftest import register
+from extensions import db
+from models import TimelineEntry
+
+
+def login(client, username):
+    resp = client.post("/api/auth/login", json={"email": f"{username}@example.com", "password": "secret123"})
+    assert resp.status_code == 200, resp.get_json()
+
+
+def run_jobs(app):
+    while app.extensions["outbox_runner"].run_once():
+        pass
+
+
+def feed(client):
+    resp = client.get("/api/posts/feed")
+    assert resp.status_code == 200
+    return [post["content"] for post in resp.get_json()["posts"]]
+
+
+def delivered(user_id):
+    db.session.expire_all()
+    return db.session.scalars(select(TimelineEntry.post_id).where(TimelineEntry.user_id == user_id)).all()
+
+
+def test_post_reaches_followers_through_the_outbox(app, client):
+    author = register(client, "author")
+    register(client, "reader")
+    client.post(f"/api/users/{author}/follow")
+
+    login(client, "author")
+    client.post("/api/posts", json={"content": "new maize variety"})
+    assert feed(client) == ["new maize variety"]
+
+    login(client, "reader")
+    assert feed(client) == []
+    run_jobs(app)
+    assert feed(client) == ["new maize variety"]
+
+
+def test_follow_and_join_backfill_then_unfollow_and_leave_prune(app, client):
+    author = register(client, "author")
+    client.post("/api/posts", json={"content": "own post"})
+    community = client.post("/api/communities", json={"name": "Maize"}).get_json()["id"]
+    client.post("/api/posts", json={"content": "community post", "community_id": community})
+    register(client, "other")
+    client.post(f"/api/communities/{community}/join")
+    client.post("/api/posts", json={"content": "other's community post", "community_id": community})
+    run_jobs(app)
+
+    register(client, "reader")
+    assert feed(client) == []
+    client.post(f"/api/users/{author}/follow")
+    assert feed(client) == ["community post", "own post"]
+    client.post(f"/api/communities/{community}/join")
+    assert feed(client) == ["other's community post", "community post", "own post"]
+
+    # Still following the author, so their community post stays
+    client.delete(f"/api/communities/{community}/leave")
+    assert feed(client) == ["community post", "own post"]
+    client.delete(f"/api/users/{author}/follow")
+    assert feed(client) == []
+
+
+def test_large_audiences_are_merged_at_read_time(app, client):
+    app.config["TIMELINE_FANOUT_LIMIT"] = 0
+    author = register(client, "author")
+    reader = register(client, "reader")
+    client.post(f"/api/users/{author}/follow")
+
+    login(client, "author")
+    client.post("/api/posts", json={"content": "first"})
+    client.post("/api/posts", json={"content": "second"})
+    run_jobs(app)
+
+    login(client, "reader")
+    client.post("/api/posts", json={"content": "mine"})
+    assert delivered(reader) == [3]
+    assert feed(client) == ["mine", "second", "first"]
+
+    first = client.get("/api/posts/feed?per_page=2").get_json()
+    assert [post["content"] for post in first["posts"]] == ["mine", "second"]
+    rest = client.get(f"/api/posts/feed?per_page=2&cursor={first['next_cursor']}").get_json()
+    assert [post["content"] for post in rest["posts"]] == ["first"]
+    assert rest["next_cursor"] is None
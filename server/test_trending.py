@@ -0,0 +1,41 @@
+"""Trending score refresh."""
+
+from datetime import datetime
+
+import pytest
+
+from conftest import register
+from extensions import db
+from models import Like, PostTrendingScore
+from trending import refresh_trending
+
+
+def test_full_refresh_counts_likes_committed_below_the_position(client):
+    register(client, "author")
+    post_id = client.post("/api/posts", json={"content": "maize"}).get_json()["id"]
+    for name in ("a", "b", "c"):
+        register(client, name)
+        assert client.post(f"/api/posts/{post_id}/like").status_code == 201
+    now = datetime.utcnow()
+
+    def score():
+        db.session.expire_all()
+        return db.session.get(PostTrendingScore, post_id).score
+
+    # Like 2 is still in flight when the job records position 3
+    second = db.session.get(Like, 2)
+    user_id, created_at = second.user_id, second.created_at
+    db.session.delete(second)
+    db.session.commit()
+    refresh_trending(now)
+    two_likes = score()
+
+    db.session.add(Like(id=2, user_id=user_id, post_id=post_id, created_at=created_at))
+    db.session.commit()
+    refresh_trending(now)
+    assert score() == two_likes
+
+    refresh_trending(now, full=True)
+    assert score() == pytest.approx(two_likes * 3 / 2)
+    refresh_trending(now, full=True)
+    assert score() == pytest.approx(two_likes * 3 / 2)
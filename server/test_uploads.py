@@ -0,0 +1,132 @@
+"""Resumable image uploads."""
+
+import io
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from PIL import Image
+from werkzeug.exceptions import RequestEntityTooLarge
+
+import uploads
+from conftest import register
+from extensions import db
+from media import media_root
+from models import UploadSession
+from uploads import UploadConflict, append_chunk, collect_garbage, part_path
+
+
+def png_bytes():
+    buf = io.BytesIO()
+    Image.new("RGB", (8, 8), "green").save(buf, "PNG")
+    return buf.getvalue()
+
+
+def start_upload(client, size, post_id=None):
+    if post_id is None:
+        register(client, "farmer")
+        post_id = client.post("/api/posts", json={"content": "maize"}).get_json()["id"]
+    resp = client.post(f"/api/posts/{post_id}/uploads", json={"size": size})
+    assert resp.status_code == 201
+    return resp.get_json()["id"]
+
+
+def put_chunk(client, upload_id, offset, data):
+    return client.put(f"/api/posts/uploads/{upload_id}", data=data, headers={"Upload-Offset": str(offset)})
+
+
+def test_upload_resumes_at_the_received_offset(client):
+    data = png_bytes()
+    upload_id = start_upload(client, len(data))
+
+    assert put_chunk(client, upload_id, 0, data[:10]).get_json()["offset"] == 10
+    resp = put_chunk(client, upload_id, 0, data[:10])
+    assert resp.status_code == 409
+    assert resp.get_json()["offset"] == 10
+    assert client.get(f"/api/posts/uploads/{upload_id}").get_json()["offset"] == 10
+
+    assert put_chunk(client, upload_id, 10, data[10:]).get_json()["offset"] == len(data)
+    first = client.post(f"/api/posts/uploads/{upload_id}/complete")
+    assert first.status_code == 201
+    again = client.post(f"/api/posts/uploads/{upload_id}/complete")
+    assert again.status_code == 200
+    assert again.get_json()["id"] == first.get_json()["id"]
+    assert put_chunk(client, upload_id, len(data), b"x").status_code == 409
+
+
+def test_complete_with_missing_bytes_is_a_conflict(client):
+    upload_id = start_upload(client, 100)
+    put_chunk(client, upload_id, 0, b"x" * 40)
+    resp = client.post(f"/api/posts/uploads/{upload_id}/complete")
+    assert resp.status_code == 409
+    assert resp.get_json()["offset"] == 40
+
+
+def test_oversized_chunk_is_discarded(client):
+    upload_id = start_upload(client, 100)
+    put_chunk(client, upload_id, 0, b"x" * 40)
+    assert put_chunk(client, upload_id, 40, b"x" * 61).status_code == 413
+
+    # Without a Content-Length the overrun is only seen while reading
+    with pytest.raises(RequestEntityTooLarge):
+        append_chunk(upload_id, 100, 40, io.BytesIO(b"x" * 61), None)
+    assert os.path.getsize(part_path(upload_id)) == 40
+    assert client.get(f"/api/posts/uploads/{upload_id}").get_json()["offset"] == 40
+
+
+def test_concurrent_chunk_is_a_conflict(client):
+    upload_id = start_upload(client, 100)
+    with uploads._locked(upload_id):
+        with pytest.raises(UploadConflict):
+            append_chunk(upload_id, 100, 0, io.BytesIO(b"x" * 10), 10)
+    assert os.path.getsize(part_path(upload_id)) == 0
+
+
+def test_invalid_image_ends_the_upload(client):
+    upload_id = start_upload(client, 50)
+    put_chunk(client, upload_id, 0, b"x" * 50)
+    assert client.post(f"/api/posts/uploads/{upload_id}/complete").status_code == 400
+    assert not os.path.exists(part_path(upload_id))
+    assert client.get(f"/api/posts/uploads/{upload_id}").status_code == 404
+
+
+def test_cancel_discards_the_part_file(client):
+    upload_id = start_upload(client, 50)
+    assert client.delete(f"/api/posts/uploads/{upload_id}").status_code == 200
+    assert not os.path.exists(part_path(upload_id))
+    assert client.get(f"/api/posts/uploads/{upload_id}").status_code == 404
+
+
+@pytest.fixture
+def far_from_utc(monkeypatch):
+    """Run in a local time zone well away from UTC."""
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_collect_garbage(client, app, far_from_utc):
+    expired = start_upload(client, 50)
+    live = start_upload(client, 50, db.session.get(UploadSession, expired).post_id)
+    db.session.get(UploadSession, expired).expires_at = datetime.utcnow() - timedelta(minutes=1)
+    db.session.commit()
+
+    tmp = os.path.join(media_root(), "tmp")
+    os.makedirs(tmp, exist_ok=True)
+    ttl = app.config["UPLOAD_SESSION_TTL_HOURS"] * 3600
+    stale, fresh = os.path.join(tmp, "stale"), os.path.join(tmp, "fresh")
+    for path, age in ((stale, ttl + 3600), (fresh, ttl - 3600), (part_path(live), ttl + 3600)):
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        os.utime(path, (time.time() - age, time.time() - age))
+
+    assert collect_garbage() == (1, 1)
+    assert db.session.get(UploadSession, expired) is None
+    assert not os.path.exists(part_path(expired))
+    assert not os.path.exists(stale)
+    assert os.path.exists(fresh)
+    assert os.path.exists(part_path(live))
+    os.unlink(fresh)
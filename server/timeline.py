@@ -0,0 +1,192 @@
+"""
+Personalized home timeline.
+
+Posts are fanned out on write: when a post is created, one `TimelineEntry`
+row is inserted for the author in the same transaction as the post, and an
+outbox job (see outbox.py) then inserts one for every follower of the
+author and every member of the post's community, off the request path.
+The home feed is then a single range read on
+`timeline_entries(user_id, created_at, post_id)`.
+
+Accounts and communities whose audience exceeds `TIMELINE_FANOUT_LIMIT`
+are not fanned out (one post would mean millions of inserts); their posts
+are pulled at read time and merged into the page instead.
+"""
+
+from __future__ import annotations
+
+from flask import current_app
+from sqlalchemy import delete, exists, insert, literal, or_, select, tuple_, union
+
+from extensions import db
+from outbox import emit, subscriber
+from pagination import encode_cursor
+
+
+def _fanout_limit() -> int:
+    return current_app.config.get("TIMELINE_FANOUT_LIMIT", 10000)
+
+
+def fan_out_post(post) -> None:
+    """Deliver a newly flushed post to its author now and its audience in the background."""
+    from models import TimelineEntry
+
+    db.session.add(TimelineEntry(user_id=post.author_id, post_id=post.id, created_at=post.created_at))
+    emit("post.created", post_id=post.id)
+
+
+@subscriber("post.created")
+def deliver_post(post_id: int) -> None:
+    """Insert timeline entries for a post's followers and community members.
+
+    Skips users who already have the post (e.g. through a backfill), so a
+    retried job inserts nothing twice.
+    """
+    from models import Community, CommunityMembership, Follow, Post, TimelineEntry, User
+
+    post = db.session.get(Post, post_id)
+    if post is None:
+        return  # deleted before delivery
+    limit = _fanout_limit()
+    audiences = []
+
+    author = db.session.get(User, post.author_id)
+    if author is not None and author.followers_count <= limit:
+        audiences.append(
+            select(Follow.follower_id.label("user_id")).where(Follow.followed_id == post.author_id)
+        )
+    if post.community_id:
+        community = db.session.get(Community, post.community_id)
+        if community is not None and community.members_count <= limit:
+            audiences.append(
+                select(CommunityMembership.user_id)
+                .where(CommunityMembership.community_id == post.community_id)
+            )
+    if not audiences:
+        return
+
+    recipients = union(*audiences).subquery()
+    already_delivered = exists().where(
+        TimelineEntry.user_id == recipients.c.user_id, TimelineEntry.post_id == post.id
+    )
+    db.session.execute(
+        insert(TimelineEntry).from_select(
+            ["user_id", "post_id", "created_at"],
+            select(
+                recipients.c.user_id,
+                literal(post.id),
+                literal(post.created_at, db.DateTime),
+            ).where(~already_delivered),
+        )
+    )
+
+
+def backfill(user_id: int, author_id: int | None = None, community_id: int | None = None) -> None:
+    """Copy recent posts of a newly followed user or joined community into a timeline."""
+    from models import Post, TimelineEntry
+
+    source = Post.author_id == author_id if author_id is not None else Post.community_id == community_id
+    already_delivered = exists().where(
+        TimelineEntry.user_id == user_id, TimelineEntry.post_id == Post.id
+    )
+    recent = (
+        select(literal(user_id), Post.id, Post.created_at)
+        .where(source, ~already_delivered)
+        .order_by(Post.created_at.desc(), Post.id.desc())
+        .limit(current_app.config.get("TIMELINE_BACKFILL_SIZE", 50))
+    )
+    db.session.execute(
+        insert(TimelineEntry).from_select(["user_id", "post_id", "created_at"], recent)
+    )
+
+
+def prune(user_id: int, author_id: int | None = None, community_id: int | None = None) -> None:
+    """Drop entries that only reached a timeline through an ended follow or membership."""
+    from models import CommunityMembership, Follow, Post, TimelineEntry
+
+    if author_id is not None:
+        still_member = select(CommunityMembership.community_id).where(
+            CommunityMembership.user_id == user_id
+        )
+        stale = select(Post.id).where(
+            Post.author_id == author_id,
+            or_(Post.community_id.is_(None), Post.community_id.not_in(still_member)),
+        )
+    else:
+        still_following = select(Follow.followed_id).where(Follow.follower_id == user_id)
+        stale = select(Post.id).where(
+            Post.community_id == community_id,
+            Post.author_id != user_id,
+            Post.author_id.not_in(still_following),
+        )
+    db.session.execute(
+        delete(TimelineEntry).where(
+            TimelineEntry.user_id == user_id, TimelineEntry.post_id.in_(stale)
+        )
+    )
+
+
+def remove_post(post_id: int) -> None:
+    """Delete a post's entries from every timeline."""
+    from models import TimelineEntry
+
+    db.session.execute(delete(TimelineEntry).where(TimelineEntry.post_id == post_id))
+
+
+def home_feed(user_id: int, per_page: int, position=None, shape_query=None) -> tuple[list, str | None]:
+    """Return `(posts, next_cursor)` for a user's home feed.
+
+    `position` is a decoded `(created_at, post_id)` cursor or None for the
+    newest page. `shape_query(query)` may add loader options to the query
+    that loads the page's posts.
+    """
+    from models import Community, CommunityMembership, Follow, Post, TimelineEntry, User
+
+    limit = _fanout_limit()
+
+    entries = (
+        select(TimelineEntry.created_at, TimelineEntry.post_id)
+        .where(TimelineEntry.user_id == user_id)
+        .order_by(TimelineEntry.created_at.desc(), TimelineEntry.post_id.desc())
+        .limit(per_page + 1)
+    )
+    if position is not None:
+        entries = entries.where(
+            tuple_(TimelineEntry.created_at, TimelineEntry.post_id) < tuple_(*position)
+        )
+    keys = set(db.session.execute(entries).all())
+
+    # Fan-out-on-read fallback for audiences too large to fan out on write
+    big_authors = db.session.scalars(
+        select(User.id)
+        .join(Follow, Follow.followed_id == User.id)
+        .where(Follow.follower_id == user_id, User.followers_count > limit)
+    ).all()
+    big_communities = db.session.scalars(
+        select(Community.id)
+        .join(CommunityMembership, CommunityMembership.community_id == Community.id)
+        .where(CommunityMembership.user_id == user_id, Community.members_count > limit)
+    ).all()
+    if big_authors or big_communities:
+        pulled = (
+            select(Post.created_at, Post.id)
+            .where(or_(Post.author_id.in_(big_authors), Post.community_id.in_(big_communities)))
+            .order_by(Post.created_at.desc(), Post.id.desc())
+            .limit(per_page + 1)
+        )
+        if position is not None:
+            pulled = pulled.where(tuple_(Post.created_at, Post.id) < tuple_(*position))
+        keys.update(db.session.execute(pulled).all())
+
+    ordered = sorted(keys, reverse=True)[:per_page + 1]
+    page = ordered[:per_page]
+    query = Post.query.filter(Post.id.in_([post_id for _, post_id in page]))
+    if shape_query is not None:
+        query = shape_query(query)
+    posts_by_id = {p.id: p for p in query}
+    posts = [posts_by_id[post_id] for _, post_id in page if post_id in posts_by_id]
+
+    next_cursor = None
+    if len(ordered) > per_page and page:
+        next_cursor = encode_cursor(*page[-1])
+    return posts, next_cursor
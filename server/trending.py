@@ -0,0 +1,174 @@
+"""
+Materialized trending scores for posts.
+
+A post's trending score is its likes and comments with exponential time
+decay: each one is worth `LIKE_WEIGHT` / `COMMENT_WEIGHT` when it happens
+and half as much every `TRENDING_HALF_LIFE_HOURS`. Decaying every stored
+score as time passes would rewrite the whole table; instead each event is
+stored as `weight * 2 ** ((event_time - epoch) / half_life)` for a fixed
+epoch. That is the decayed value scaled by a factor shared by every post,
+so ordering by the stored score is ordering by the decayed one, and a new
+like only ever adds to one row. When the exponents grow large the epoch
+is moved forward and all scores scaled down in one UPDATE.
+
+`refresh-trending` applies likes and comments newer than its recorded
+positions (see `job_state`), counting only those from the last
+`TRENDING_WINDOW_DAYS`, and deletes posts with no engagement in that
+window, so `post_trending_scores` stays small and
+`GET /api/posts/trending` is one index range read. Unlikes and deleted
+comments are not subtracted; they decay away like everything else.
+
+Scores are added to, so a run cannot re-read rows below its positions
+without counting them twice. On Postgres an id is assigned at insert but
+visible only at commit, so a like from a transaction that commits after a
+later one's can land below a position already recorded and be missed.
+`--full` rebuilds every score from the window's likes and comments;
+schedule it daily so such stragglers are counted within a day.
+
+Usage (from Agrilink/server):
+  flask --app app:create_app refresh-trending          # e.g. every few minutes
+  flask --app app:create_app refresh-trending --full   # e.g. nightly
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, insert, select, update
+
+from cache import invalidate
+from extensions import db
+
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 3.0
+
+# Move the epoch forward once scores reach 2 ** this
+REBASE_AFTER_HALF_LIVES = 64
+
+# Posts written per statement
+BATCH_SIZE = 500
+
+_EPOCH_JOB = "trending:epoch"
+
+
+def _timestamp(value: datetime) -> float:
+    """Seconds since 1970 for the app's naive UTC datetimes."""
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+def forget_post(post_id: int) -> None:
+    """Drop a deleted post's score. Joins the caller's transaction."""
+    from models import PostTrendingScore
+
+    db.session.execute(delete(PostTrendingScore).where(PostTrendingScore.post_id == post_id))
+
+
+def _rebase(epoch_state, new_epoch: float, half_life: float) -> None:
+    from models import PostTrendingScore
+
+    factor = 2 ** ((epoch_state.position - new_epoch) / half_life)
+    db.session.execute(update(PostTrendingScore).values(score=PostTrendingScore.score * factor))
+    epoch_state.position = int(new_epoch)
+
+
+def _apply(deltas: dict, last_engaged: dict) -> None:
+    """Add `deltas` to the stored scores, creating rows for new posts."""
+    from models import Post, PostTrendingScore
+
+    post_ids = sorted(deltas)
+    for start in range(0, len(post_ids), BATCH_SIZE):
+        batch = post_ids[start:start + BATCH_SIZE]
+        communities = dict(db.session.execute(select(Post.id, Post.community_id).where(Post.id.in_(batch))).all())
+        existing = {
+            post_id: (score, last)
+            for post_id, score, last in db.session.execute(
+                select(PostTrendingScore.post_id, PostTrendingScore.score, PostTrendingScore.last_engaged_at)
+                .where(PostTrendingScore.post_id.in_(batch))
+            )
+        }
+        inserts, updates = [], []
+        for post_id in batch:
+            if post_id not in communities:
+                continue  # deleted since it was liked
+            row = {
+                "post_id": post_id,
+                "community_id": communities[post_id],
+                "score": deltas[post_id],
+                "last_engaged_at": last_engaged[post_id],
+            }
+            if post_id in existing:
+                score, last = existing[post_id]
+                row["score"] += score
+                row["last_engaged_at"] = max(last, row["last_engaged_at"])
+                updates.append(row)
+            else:
+                inserts.append(row)
+        if inserts:
+            db.session.execute(insert(PostTrendingScore), inserts)
+        if updates:
+            db.session.execute(update(PostTrendingScore), updates)
+
+
+def refresh_trending(now: datetime | None = None, full: bool = False) -> int:
+    """Fold new likes and comments into the trending scores and commit.
+
+    With `full`, discard the stored scores and rebuild them from every like
+    and comment in the window. Returns the number of posts whose score
+    changed.
+    """
+    from models import Comment, JobState, Like, PostTrendingScore
+
+    now = now or datetime.utcnow()
+    config = current_app.config
+    half_life = config.get("TRENDING_HALF_LIFE_HOURS", 24) * 3600
+    cutoff = now - timedelta(days=config.get("TRENDING_WINDOW_DAYS", 7))
+    sources = [("trending:likes", Like, LIKE_WEIGHT), ("trending:comments", Comment, COMMENT_WEIGHT)]
+
+    states = {
+        state.name: state
+        for state in JobState.query.filter(JobState.name.in_([_EPOCH_JOB] + [name for name, _, _ in sources]))
+    }
+    epoch_state = states.get(_EPOCH_JOB)
+    if epoch_state is None:
+        epoch_state = JobState(name=_EPOCH_JOB, position=int(_timestamp(cutoff)))
+        db.session.add(epoch_state)
+    if full:
+        db.session.execute(delete(PostTrendingScore))
+        epoch_state.position = int(_timestamp(cutoff))
+    elif (_timestamp(now) - epoch_state.position) / half_life > REBASE_AFTER_HALF_LIVES:
+        _rebase(epoch_state, _timestamp(cutoff), half_life)
+    epoch = epoch_state.position
+
+    deltas = defaultdict(float)
+    last_engaged = {}
+    for name, model, weight in sources:
+        state = states.get(name) or JobState(name=name, position=0)
+        low = 0 if full else state.position
+        high = db.session.scalar(select(func.coalesce(func.max(model.id), 0)))
+        if high > low:
+            rows = db.session.execute(
+                select(model.post_id, model.created_at)
+                .where(model.id > low, model.id <= high, model.created_at >= cutoff)
+            )
+            for post_id, created_at in rows:
+                deltas[post_id] += weight * 2 ** ((_timestamp(created_at) - epoch) / half_life)
+                last_engaged[post_id] = max(created_at, last_engaged.get(post_id, created_at))
+        state.position = high
+        db.session.add(state)
+
+    _apply(deltas, last_engaged)
+    db.session.execute(delete(PostTrendingScore).where(PostTrendingScore.last_engaged_at < cutoff))
+    db.session.commit()
+    invalidate("trending")
+    return len(deltas)
+
+
+@click.command("refresh-trending")
+@click.option("--full", is_flag=True, help="Rebuild every score instead of adding new likes and comments.")
+@with_appcontext
+def refresh_trending_command(full):
+    """Update trending post scores from new likes and comments."""
+    changed = refresh_trending(full=full)
+    click.echo(f"Trending scores updated for {changed} posts.")
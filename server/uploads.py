@@ -0,0 +1,231 @@
+"""
+Resumable image uploads for slow and unreliable connections.
+
+A one-shot multipart upload that drops at 80% on 2G has to start over. A
+resumable upload instead opens a session for the file's total size and
+sends the bytes in any number of pieces:
+
+  POST   /api/posts/<id>/uploads            {"size": n} -> session, offset 0
+  PUT    /api/posts/uploads/<upload_id>     Upload-Offset: k, body = bytes from k
+  GET    /api/posts/uploads/<upload_id>     -> offset received so far
+  POST   /api/posts/uploads/<upload_id>/complete -> the PostImage
+
+Bytes are appended to `MEDIA_ROOT/uploads/<upload_id>.part` as they are
+read, so a chunk cut off by a dropped connection still counts up to its
+last received byte: the client asks for the offset and resumes there,
+re-sending nothing. The part file's size is the offset. A chunk must
+start exactly at it (409 with the current offset otherwise), and an
+exclusive lock on the file while a chunk is written keeps duplicated or
+retried requests from interleaving. The route closes its database
+transaction before reading a chunk, so a slow client holds no connection.
+
+Completing hashes the file and hands it to `media.store_upload`, the same
+validation and content-addressed storage as a one-shot upload. The
+session then remembers its image, so a client that lost the response can
+complete again and get the same image back.
+
+Sessions expire `UPLOAD_SESSION_TTL_HOURS` after their last chunk.
+`gc-uploads` deletes expired sessions, their part files and temporary
+files left by interrupted one-shot uploads; schedule it hourly:
+  flask --app app:create_app gc-uploads
+"""
+
+from __future__ import annotations
+
+import fcntl
+import os
+import secrets
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, select, update
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from extensions import db
+from media import hash_file, media_root, store_upload
+
+# Open sessions allowed per user, so abandoned ones can't fill the disk
+MAX_ACTIVE_UPLOADS = 10
+BLOCK_SIZE = 64 * 1024
+
+
+class UploadConflict(Exception):
+    """The request doesn't match the upload's state; `offset` is where it stands."""
+
+    def __init__(self, message: str, offset: int):
+        super().__init__(message)
+        self.offset = offset
+
+
+def _ttl() -> timedelta:
+    return timedelta(hours=current_app.config.get("UPLOAD_SESSION_TTL_HOURS", 24))
+
+
+def part_path(upload_id: str) -> str:
+    return os.path.join(media_root(), "uploads", f"{upload_id}.part")
+
+
+def received_bytes(upload_id: str) -> int | None:
+    """Bytes received so far, or None if the part file is gone."""
+    try:
+        return os.stat(part_path(upload_id)).st_size
+    except FileNotFoundError:
+        return None
+
+
+def active_uploads(user_id: int) -> int:
+    from models import UploadSession
+
+    return db.session.scalar(
+        select(func.count()).where(
+            UploadSession.user_id == user_id,
+            UploadSession.image_id.is_(None),
+            UploadSession.expires_at > datetime.utcnow(),
+        )
+    )
+
+
+def open_upload(user_id: int, post_id: int, size: int):
+    """Create a session and its empty part file. Joins the caller's transaction."""
+    from models import UploadSession
+
+    upload = UploadSession(
+        id=secrets.token_hex(16),
+        user_id=user_id,
+        post_id=post_id,
+        size=size,
+        expires_at=datetime.utcnow() + _ttl(),
+    )
+    path = part_path(upload.id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "xb").close()
+    db.session.add(upload)
+    return upload
+
+
+def touch_upload(upload_id: str) -> None:
+    """Push the session's expiry out by the TTL after a chunk."""
+    from models import UploadSession
+
+    db.session.execute(
+        update(UploadSession)
+        .where(UploadSession.id == upload_id)
+        .values(expires_at=datetime.utcnow() + _ttl())
+    )
+
+
+@contextmanager
+def _locked(upload_id: str):
+    """Open the part file for writing under an exclusive, non-blocking lock.
+
+    Raises FileNotFoundError if it is gone and UploadConflict if another
+    request holds it.
+    """
+    with open(part_path(upload_id), "r+b") as fh:
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadConflict("another request is writing this upload", os.fstat(fh.fileno()).st_size) from None
+        yield fh
+
+
+def append_chunk(upload_id: str, size: int, offset: int, stream, content_length: int | None) -> int:
+    """Append `stream` to the upload at `offset`; returns the new offset.
+
+    Bytes read before the client disconnects are kept. A chunk running past
+    the declared size is discarded whole (RequestEntityTooLarge).
+    """
+    with _locked(upload_id) as fh:
+        start = os.fstat(fh.fileno()).st_size
+        if offset != start:
+            raise UploadConflict(f"upload is at offset {start}", start)
+        remaining = size - start
+        if content_length is not None and content_length > remaining:
+            raise RequestEntityTooLarge()
+        fh.seek(start)
+        written = 0
+        while True:
+            # One byte past the remainder detects an oversized chunk without a length
+            block = stream.read(min(BLOCK_SIZE, remaining - written + 1))
+            if not block:
+                break
+            if written + len(block) > remaining:
+                fh.truncate(start)
+                raise RequestEntityTooLarge()
+            fh.write(block)
+            written += len(block)
+        return start + written
+
+
+def complete_upload(upload_id: str, size: int) -> dict:
+    """Validate and store a fully received upload (see media.store_upload).
+
+    Raises UploadConflict if bytes are missing and InvalidImage if the file
+    is not an accepted image; the part file is consumed either way.
+    """
+    with _locked(upload_id) as fh:
+        received = os.fstat(fh.fileno()).st_size
+        if received != size:
+            raise UploadConflict(f"{size - received} bytes missing", received)
+        path = part_path(upload_id)
+        return store_upload(path, hash_file(path), size)
+
+
+def discard_upload(upload_id: str) -> None:
+    try:
+        os.unlink(part_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+
+def collect_garbage(now: datetime | None = None) -> tuple[int, int]:
+    """Delete expired sessions and stray files older than the session TTL.
+
+    Returns (sessions deleted, files deleted).
+    """
+    from models import UploadSession
+
+    now = now or datetime.utcnow()
+    expired = db.session.scalars(select(UploadSession.id).where(UploadSession.expires_at <= now)).all()
+    for upload_id in expired:
+        discard_upload(upload_id)
+    if expired:
+        db.session.execute(delete(UploadSession).where(UploadSession.id.in_(expired)))
+    db.session.commit()
+
+    # Part files whose session was never committed, and the spools of
+    # one-shot uploads whose request died
+    # File times are epoch seconds; `now` is naive UTC, which .timestamp()
+    # would read as local time
+    cutoff = (now - _ttl() - datetime(1970, 1, 1)).total_seconds()
+    stale = []
+    for subdir in ("uploads", "tmp"):
+        directory = os.path.join(media_root(), subdir)
+        if os.path.isdir(directory):
+            with os.scandir(directory) as entries:
+                stale += [entry for entry in entries if entry.is_file() and entry.stat().st_mtime < cutoff]
+    live = set(db.session.scalars(
+        select(UploadSession.id).where(UploadSession.id.in_([
+            entry.name.removesuffix(".part") for entry in stale if entry.name.endswith(".part")
+        ]))
+    ))
+    removed = 0
+    for entry in stale:
+        if entry.name.removesuffix(".part") not in live:
+            try:
+                os.unlink(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return len(expired), removed
+
+
+@click.command("gc-uploads")
+@with_appcontext
+def gc_uploads_command():
+    """Delete expired resumable uploads and stale temporary upload files."""
+    sessions, files = collect_garbage()
+    click.echo(f"Deleted {sessions} expired upload(s) and {files} stale file(s).")
@@ -0,0 +1,90 @@
+"""
+Idempotent single-statement inserts for toggle rows (likes, follows,
+community memberships).
+
+`insert_once` issues one `INSERT ... SELECT ... WHERE <guards>
+ON CONFLICT DO NOTHING RETURNING *`, so the common case (a new like on an
+existing post) costs a single round trip instead of SELECT-then-INSERT,
+and a double tap can never race into a unique-constraint error: the
+losing statement simply inserts nothing. Guards fold existence checks
+(e.g. "the post exists") into the same statement; when nothing is
+returned the caller looks up the existing row to tell a repeat from a
+missing parent.
+
+`insert_or_update` is the accumulating variant (`ON CONFLICT DO UPDATE`),
+for rows that coalesce repeated events such as notifications.
+
+Postgres and SQLite use their native `ON CONFLICT`; other dialects fall
+back to a savepoint around a plain insert.
+"""
+
+from __future__ import annotations
+
+from sqlalchemy import exists, literal, select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+
+
+def _dialect_insert(model):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(model)
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(model)
+    return None
+
+
+def insert_once(model, values: dict, *guards):
+    """Insert a `model` row with `values` unless it already exists.
+
+    Returns the new ORM object, or None when a unique constraint already
+    holds an equal row or any of `guards` (SQL boolean expressions) is
+    false. The insert joins the caller's transaction.
+    """
+    stmt = _dialect_insert(model)
+    if stmt is None:
+        if guards and not db.session.scalar(select(*guards)):
+            return None
+        try:
+            with db.session.begin_nested():
+                row = model(**values)
+                db.session.add(row)
+        except IntegrityError:
+            return None
+        return row
+
+    source = select(*[literal(value).label(name) for name, value in values.items()])
+    if guards:
+        source = source.where(*guards)
+    stmt = stmt.from_select(list(values), source).on_conflict_do_nothing().returning(model)
+    return db.session.scalars(stmt).first()
+
+
+def insert_or_update(model, values: dict, conflict_columns: list[str], updates: dict) -> None:
+    """Insert a `model` row with `values`, or apply `updates` to the row that
+    already holds the same `conflict_columns` (a unique constraint).
+
+    `updates` maps column names to values or SQL expressions over the
+    existing row (e.g. `Model.count + 1`). Joins the caller's transaction.
+    """
+    stmt = _dialect_insert(model)
+    if stmt is not None:
+        db.session.execute(
+            stmt.values(values).on_conflict_do_update(index_elements=conflict_columns, set_=updates)
+        )
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(model.__table__.insert().values(values))
+    except IntegrityError:
+        key = [getattr(model, name) == values[name] for name in conflict_columns]
+        db.session.execute(update(model).where(*key).values(updates))
+
+
+def row_exists(model, **key):
+    """Guard for `insert_once`: a `model` row matching `key` exists."""
+    return exists().where(*[getattr(model, name) == value for name, value in key.items()])
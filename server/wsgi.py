@@ -0,0 +1,13 @@
+"""
+WSGI entry point for production servers.
+
+Usage (from Agrilink/server):
+  gunicorn -c gunicorn.conf.py wsgi:app
+
+See gunicorn.conf.py for worker sizing. `asgi.py` is the alternative
+when many clients hold message streams open.
+"""
+
+from app import create_app
+
+app = create_app()